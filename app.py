@@ -1,6 +1,8 @@
 from gevent import monkey
 monkey.patch_all()
-from flask import jsonify
+import click
+from flask import jsonify, Response, stream_with_context
+from werkzeug.exceptions import Conflict
 
 from banana.events import JobCompletedEvent
 from banana.routes.movies import *
@@ -8,27 +10,85 @@ from banana.routes.unmatched import *
 from banana.routes.media import *
 from banana.routes.sources import *
 from banana.routes.matches import *
+from banana.routes.metrics import *
 
-from banana.core import app, db, socket, getLogger
+from banana.core import app, db, socket, getLogger, Config
 
-from banana.core.jobs import ThreadPoolJobExecutor
-from banana.media.jobs import FileSystemScanJob, JobTypes
+from banana.core.jobs import ThreadPoolJobExecutor, SimpleJobExecutor
+from banana.media.checkpoint import ScanCheckpoint
+from banana.media.jobs import FileSystemScanJob, FileSystemWatchJob, JobTypes
+from banana.media.item import ProcessedMediaItems
+from banana.media.nameformatter import NameFormatter
+from banana.media.planning import MatchPlanner, StreamedPlanOutput
+from banana.media.sources.tmdb import tmdb_reference
 
 logger = getLogger(__name__)
 
 db.create_all()
 
+# load reference data (TMDB genres, image configuration) before the first request needs it
+tmdb_reference.warmup()
+
 
 def process_movies():
     ThreadPoolJobExecutor().submit(FileSystemScanJob())
 
 
+def watch_movies():
+    ThreadPoolJobExecutor().submit(FileSystemWatchJob())
+
+
+if Config.media_watch():
+    watch_movies()
+
+
 @app.route('/api/scans')
 def scans():
     process_movies()
     return jsonify({"status": "OK"})
 
 
+@app.route('/api/scans/plan')
+def plan_scan():
+    """
+    Streams a match plan (a dry-run of a scan) of all scan roots as JSON lines.
+    """
+    output = StreamedPlanOutput()
+    ThreadPoolJobExecutor().submit(FileSystemScanJob(plan_output=output))
+    return Response(stream_with_context(iter(output)), mimetype='application/x-ndjson')
+
+
+@app.cli.command('plan-scan')
+@click.argument('output', type=click.File('w'))
+@click.argument('roots', nargs=-1)
+@click.option('--template', help='Movie target name pattern to plan with, instead of the configured one.')
+def plan_scan_command(output, roots, template):
+    """
+    Writes a match plan (a dry-run of a scan) of given roots (or of all scan roots) as JSON lines to OUTPUT.
+    """
+    planner = MatchPlanner(formatter=NameFormatter(template=template), processed_items=ProcessedMediaItems()) \
+        if template else None
+    SimpleJobExecutor().submit(FileSystemScanJob(media_scan_paths=list(roots) or None, plan_output=output,
+                                                 planner=planner))
+
+
+@app.route('/api/scans/interrupted')
+def interrupted_scans():
+    return jsonify(ScanCheckpoint.interrupted())
+
+
+@app.route('/api/scans/<job_id>/resume', methods=['POST'])
+def resume_scan(job_id: str):
+    checkpoint = ScanCheckpoint.query.filter_by(job_id=job_id).first_or_404()
+    if checkpoint.is_running():
+        raise Conflict(f'Scan job {job_id} is already running.')
+
+    logger.info(f'Resuming scan job {job_id} after {checkpoint.current_item} processed media items.')
+    job = FileSystemScanJob.resume(checkpoint)
+    ThreadPoolJobExecutor().submit(job)
+    return jsonify(job_id=job.id())
+
+
 @socket.on('connect', namespace='/sync')
 def jobs():
     logger.info("Socket connected to /sync endpoint")
@@ -1,6 +1,7 @@
 import logging
 import logging.config
 import os.path
+from contextlib import contextmanager
 
 import dacite
 from flask import Flask
@@ -32,6 +33,20 @@ db = SQLAlchemy(app)
 socket = SocketIO(app)
 
 
+@contextmanager
+def own_session():
+    """
+    A database session of its own, closed (and so rolled back, unless the caller commits it) on exit. It is meant
+    for writes made in the middle of somebody else's unit of work, like cache entries: committing it does not commit
+    anything pending in the scoped session (db.session) of the calling thread.
+    """
+    session = db.create_session({})()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
 def tbdb_api_key() -> str:
     return os.environ.get('TMDB_API_KEY')
 
@@ -58,10 +73,143 @@ class Config(object):
     def media_scanner_skip_filetype_checks(cls):
         return app.config.get('BANANA_MEDIA_SCANNER_SKIP_FILETYPE_CHECKS')
 
+    @classmethod
+    def media_scanner_incremental(cls) -> bool:
+        return app.config.get('BANANA_MEDIA_SCANNER_INCREMENTAL', True)
+
+    @classmethod
+    def media_scanner_workers(cls) -> int:
+        return int(app.config.get('BANANA_MEDIA_SCANNER_WORKERS', 1))
+
+    @classmethod
+    def media_scanner_mount_concurrency(cls) -> dict:
+        return app.config.get('BANANA_MEDIA_SCANNER_MOUNT_CONCURRENCY', {})
+
+    @classmethod
+    def media_scanner_filetype_workers(cls) -> int:
+        return int(app.config.get('BANANA_MEDIA_SCANNER_FILETYPE_WORKERS', 4))
+
+    @classmethod
+    def media_scanner_checkpoint_interval(cls) -> float:
+        return float(app.config.get('BANANA_MEDIA_SCANNER_CHECKPOINT_INTERVAL', 5))
+
+    @classmethod
+    def media_parser_processes(cls) -> int:
+        return int(app.config.get('BANANA_MEDIA_PARSER_PROCESSES', 0))
+
+    @classmethod
+    def media_parser_chunk_size(cls) -> int:
+        return int(app.config.get('BANANA_MEDIA_PARSER_CHUNK_SIZE', 256))
+
+    @classmethod
+    def media_watch(cls) -> bool:
+        return app.config.get('BANANA_MEDIA_WATCH', False)
+
+    @classmethod
+    def media_watch_debounce(cls) -> float:
+        return float(app.config.get('BANANA_MEDIA_WATCH_DEBOUNCE', 30))
+
+    @classmethod
+    def media_watch_rescan_interval(cls) -> float:
+        return float(app.config.get('BANANA_MEDIA_WATCH_RESCAN_INTERVAL', 60 * 60))
+
     @classmethod
     def media_matcher(cls) -> str:
         return app.config.get('BANANA_MEDIA_MATCHER')
 
+    @classmethod
+    def matcher_aka_candidates(cls) -> int:
+        return int(app.config.get('BANANA_MATCHER_AKA_CANDIDATES', 5))
+
+    @classmethod
+    def matcher_cache(cls) -> bool:
+        return app.config.get('BANANA_MATCHER_CACHE', True)
+
+    @classmethod
+    def matcher_cache_ttl(cls) -> int:
+        return int(app.config.get('BANANA_MATCHER_CACHE_TTL', 7 * 24 * 60 * 60))
+
+    @classmethod
+    def matcher_cache_negative_ttl(cls) -> int:
+        return int(app.config.get('BANANA_MATCHER_CACHE_NEGATIVE_TTL', 60 * 60))
+
+    @classmethod
+    def matcher_deadline(cls) -> float:
+        """
+        :return: seconds a matcher querying sources at the same time waits for all of them
+        """
+        return float(app.config.get('BANANA_MATCHER_DEADLINE', 30))
+
+    @classmethod
+    def source_concurrency(cls) -> dict:
+        """
+        :return: dict of source name (TMDBApi, IMDBApi): maximal number of concurrent calls to the source
+        """
+        return app.config.get('BANANA_SOURCE_CONCURRENCY', {})
+
+    @classmethod
+    def source_default_concurrency(cls) -> int:
+        return int(app.config.get('BANANA_SOURCE_DEFAULT_CONCURRENCY', 4))
+
+    @classmethod
+    def http_cache(cls) -> bool:
+        return app.config.get('BANANA_HTTP_CACHE', True)
+
+    @classmethod
+    def http_cache_max_size(cls) -> int:
+        return int(app.config.get('BANANA_HTTP_CACHE_MAX_SIZE', 256 * 1024 * 1024))
+
+    @classmethod
+    def http_cache_ttls(cls) -> dict:
+        """
+        :return: dict of URL regular expression: seconds its responses are cached for, extending (or overriding)
+                 default TTLs of the response cache
+        """
+        return app.config.get('BANANA_HTTP_CACHE_TTLS', {})
+
+    @classmethod
+    def imdb_pool_size(cls) -> int:
+        return int(app.config.get('BANANA_IMDB_POOL_SIZE', 4))
+
+    @classmethod
+    def imdb_suggestions_timeout(cls) -> float:
+        return float(app.config.get('BANANA_IMDB_SUGGESTIONS_TIMEOUT', 5))
+
+    @classmethod
+    def imdb_suggestions_cache_size(cls) -> int:
+        return int(app.config.get('BANANA_IMDB_SUGGESTIONS_CACHE_SIZE', 1024))
+
+    @classmethod
+    def imdb_suggestions_cache_ttl(cls) -> int:
+        return int(app.config.get('BANANA_IMDB_SUGGESTIONS_CACHE_TTL', 60 * 60))
+
+    @classmethod
+    def reference_data_refresh_interval(cls) -> float:
+        return float(app.config.get('BANANA_REFERENCE_DATA_REFRESH_INTERVAL', 24 * 60 * 60))
+
+    @classmethod
+    def tmdb_pool_size(cls) -> int:
+        return int(app.config.get('BANANA_TMDB_POOL_SIZE', 10))
+
+    @classmethod
+    def tmdb_rate_limit(cls) -> float:
+        """
+        :return: maximal (sustained) number of TMDB requests per second, 0 for no limit
+        """
+        return float(app.config.get('BANANA_TMDB_RATE_LIMIT', 20))
+
+    @classmethod
+    def tmdb_rate_burst(cls) -> int:
+        return int(app.config.get('BANANA_TMDB_RATE_BURST', 40))
+
+    @classmethod
+    def tmdb_retries(cls) -> int:
+        return int(app.config.get('BANANA_TMDB_RETRIES', 3))
+
+    @classmethod
+    def tmdb_timeout(cls) -> float:
+        return float(app.config.get('BANANA_TMDB_TIMEOUT', 10))
+
     @classmethod
     def media_target_resolver(cls) -> str:
         return app.config.get('BANANA_MEDIA_TARGET_RESOLVER')
@@ -74,6 +222,17 @@ class Config(object):
     def media_scan_path(cls):
         return app.config.get('BANANA_MEDIA_SCAN_PATH')
 
+    @classmethod
+    def media_scan_paths(cls) -> list:
+        """
+        :return: BANANA_MEDIA_SCAN_PATHS (a list of scan roots), or BANANA_MEDIA_SCAN_PATH if it is not set
+        """
+        paths = app.config.get('BANANA_MEDIA_SCAN_PATHS')
+        if paths is None:
+            path = cls.media_scan_path()
+            return [path] if path else []
+        return [paths] if isinstance(paths, str) else list(paths)
+
 
 logging.config.fileConfig(os.path.abspath(
     os.path.join(app.root_path, '..', '..', 'config', 'logging.conf')))
@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, TypeVar
+
+from banana.core import getLogger
+
+logger = getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('threading')
+    except ImportError:
+        return False
+
+
+def io_executor(max_workers: int) -> Executor:
+    """
+    Creates a thread pool executor for blocking I/O (filesystem, network).
+
+    When gevent monkey patches threading, regular thread pool threads are just greenlets and blocking system
+    calls (like scandir on a network mount) would block all of them. In that case, gevent thread pool, backed by
+    real OS threads, is used instead; waiting on its futures still yields to other greenlets.
+
+    :param max_workers: maximal number of worker threads
+    :return: concurrent.futures compatible Executor
+    """
+    if _gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor(max_workers)
+    return ThreadPoolExecutor(max_workers)
+
+
+class DeviceExecutors(object):
+    """
+    Bounded I/O executors, one per device (st_dev), so that devices are scheduled independently: a slow (or
+    spinning) disk gets a low limit and does not thrash, while an SSD or a network mount can run at full speed.
+
+    Every device is limited to workers threads by default, mount_concurrency overrides the limit for devices of
+    given mount points (any path on a device will do). Devices limited to a single worker have no executor, their
+    I/O is expected to run in the calling thread.
+    """
+
+    def __init__(self, workers: int = 1, mount_concurrency: Dict[str, int] = None):
+        self._workers = workers
+        self._device_concurrency: Dict[int, int] = {}
+        self._executors: Dict[int, Executor] = {}
+        self._lock = threading.Lock()
+
+        for mount, concurrency in (mount_concurrency or {}).items():
+            try:
+                self._device_concurrency[os.stat(mount).st_dev] = int(concurrency)
+            except OSError as e:
+                logger.warning(f'Cannot resolve mount {mount} for I/O concurrency: {e}')
+
+    def concurrency(self, device: Optional[int]) -> int:
+        """
+        :param device: st_dev of a device, or None if not known
+        :return: maximal number of concurrent I/O operations on the device
+        """
+        return self._device_concurrency.get(device, self._workers)
+
+    def max_concurrency(self) -> int:
+        return max([self._workers] + list(self._device_concurrency.values()))
+
+    def executor(self, device: Optional[int]) -> Optional[Executor]:
+        """
+        :param device: st_dev of a device, or None if not known
+        :return: executor of the device, or None if its I/O should not run concurrently
+        """
+        concurrency = self.concurrency(device)
+        if concurrency <= 1:
+            return None
+
+        with self._lock:
+            executor = self._executors.get(device)
+            if executor is None:
+                executor = self._executors[device] = io_executor(concurrency)
+            return executor
+
+    def shutdown(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False)
+            self._executors = {}
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the call, callers arriving while it is
+    in flight wait for it and get the same result (or the same exception) instead of running the call again.
+    A key is forgotten as soon as its call completes, callers after that run the call anew.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._coalesced = 0
+
+    def coalesced(self) -> int:
+        """
+        :return: number of calls which waited for a call in flight, instead of running it
+        """
+        with self._lock:
+            return self._coalesced
+
+    def do(self, key: Hashable, call: Callable[[], T]) -> T:
+        """
+        :param key: identifies calls with the same result
+        :param call: the call to run, unless a call with the same key is in flight
+        :return: result of the call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                future.set_running_or_notify_cancel()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,198 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from banana.core import getLogger
+from banana.core.httpcache import CachedResponse, ResponseCache, cache_key
+from banana.core.metrics import metrics
+
+logger = getLogger(__name__)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket rate limiter: tokens are refilled at rate per second, up to burst tokens, and every
+    request takes one. A rate of 0 (or less) means no limit.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Takes a token, possibly ahead of time.
+
+        :return: seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be made.
+
+        :return: seconds waited
+        """
+        if self._rate <= 0:
+            return 0.0
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """
+    :return: seconds to wait as requested by Retry-After header of a response (delay seconds or an HTTP date),
+             or None if there is no (valid) header
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient(object):
+    """
+    HTTP client of one remote API: a keep-alive session with a bounded connection pool shared by all threads,
+    a token bucket rate limit, and retries of throttled (429), failed (5xx) and unreachable requests with
+    exponential backoff, honoring Retry-After of the API.
+
+    If a ResponseCache is given, GET responses of URLs it caches are served from it while fresh, and revalidated
+    (with ETag/Last-Modified) once they are not; only successful responses are cached.
+
+    Request latencies are recorded as '<name>.http' timer, retries, throttled requests and rate limiter waits as
+    '<name>.http.*' counters and timers in metrics.
+    """
+
+    def __init__(self, name: str, pool_size: int = 10, rate: float = 0, burst: int = 1, retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 30, timeout: float = 10,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES, cache: ResponseCache = None):
+        self.name = name
+        self._cache = cache
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._timeout = timeout
+        self._retry_statuses = frozenset(retry_statuses)
+        self._rate_limiter = TokenBucket(rate, burst)
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        delay = retry_after(response) if response is not None else None
+        if delay is None:
+            delay = self._backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+        return min(delay, self._max_backoff)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Makes a request (unless its response is cached), retrying it if needed. Takes the same arguments as
+        requests.request; the last response is returned even if it failed, it is up to the caller to check its
+        status.
+
+        :raise requests.RequestException: if the API cannot be reached, after all retries
+        """
+        ttl = self._cache.ttl(url) if self._cache is not None and method.upper() == 'GET' else None
+        if ttl is None:
+            return self._request(method, url, **kwargs)
+
+        key = cache_key(method, url, kwargs.get('params'))
+        cached = self._cache.get(key)
+        if cached is not None and cached.fresh:
+            return self._cached_response(url, cached)
+        if cached is not None and cached.validators():
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **cached.validators()}
+
+        response = self._request(method, url, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            self._cache.revalidated(key, ttl)
+            return self._cached_response(url, cached)
+        if response.status_code == 200:
+            self._cache.put(key, response.status_code, response.headers, response.content, ttl)
+        return response
+
+    @staticmethod
+    def _cached_response(url: str, cached: CachedResponse) -> requests.Response:
+        response = requests.Response()
+        response.status_code = cached.status
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response._content = cached.body
+        response.url = url
+        return response
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self._timeout)
+        attempt = 0
+        while True:
+            waited = self._rate_limiter.acquire()
+            if waited:
+                metrics.observe(f'{self.name}.http.rate_limited', waited)
+
+            response = None
+            try:
+                with metrics.timer(f'{self.name}.http'):
+                    response = self.session.request(method, url, **kwargs)
+                if response.status_code not in self._retry_statuses or attempt >= self._retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self._retries:
+                    raise
+                logger.debug(f'{self.name} request {method} {url} failed, retrying. {e}')
+
+            if response is not None and response.status_code == 429:
+                metrics.count(f'{self.name}.http.throttled')
+            delay = self._delay(attempt, response)
+            if response is not None:
+                logger.debug(f'{self.name} request {method} {url} returned {response.status_code}, '
+                             f'retrying in {delay:.2f}s')
+                response.close()
+            metrics.count(f'{self.name}.http.retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        :return: requests made and connections opened by the connection pools of the client
+        """
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        requests_made = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_made += pool.num_requests
+        return dict(requests=requests_made, connections=connections,
+                    reused=requests_made - connections if requests_made else 0)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,299 @@
+import re
+import threading
+import traceback
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlencode
+
+from marshmallow import Schema, fields
+
+from banana.core import db, getLogger, Config, JsonMixin, own_session
+from banana.core.metrics import metrics
+
+logger = getLogger(__name__)
+
+# seconds responses of matching URLs (regular expressions, searched in order) are cached for; responses of URLs
+# matching none of them are not cached
+DEFAULT_TTLS = {
+    r'api\.themoviedb\.org/3/search/': 24 * 60 * 60,
+    r'api\.themoviedb\.org/3/find/': 30 * 24 * 60 * 60,
+    r'api\.themoviedb\.org/3/movie/\d+/alternative_titles': 30 * 24 * 60 * 60,
+    r'api\.themoviedb\.org/3/movie/\d+': 7 * 24 * 60 * 60,
+    r'api\.themoviedb\.org/3/genre/': 7 * 24 * 60 * 60,
+    r'imdb\.com/find': 24 * 60 * 60,
+    r'imdb\.com/title/tt\d+/': 30 * 24 * 60 * 60,
+}
+
+# query parameters which are not a part of cache keys
+_IGNORED_PARAMS = frozenset(['api_key'])
+
+# an accessed entry is touched (for LRU eviction) at most once per this period, so that hits stay reads
+_TOUCH_INTERVAL = timedelta(hours=1)
+
+# threads running read-only, see read_only
+_read_only = threading.local()
+
+T = TypeVar('T')
+
+
+def cache_key(method: str, url: str, params: dict = None) -> str:
+    """
+    :return: cache key of a request: method, URL and sorted query parameters, without credentials
+    """
+    params = sorted((k, v) for k, v in (params or {}).items() if k not in _IGNORED_PARAMS)
+    return f'{method.upper()} {url}?{urlencode(params)}' if params else f'{method.upper()} {url}'
+
+
+@contextmanager
+def read_only():
+    """
+    Within the context, responses are served from the cache, but nothing is written to it (not even access times)
+    by the calling thread, and by calls it hands over to other threads with carry_read_only. Used by dry runs (like
+    match planning), which must not write to the database.
+    """
+    previous = is_read_only()
+    _read_only.enabled = True
+    try:
+        yield
+    finally:
+        _read_only.enabled = previous
+
+
+def is_read_only() -> bool:
+    return getattr(_read_only, 'enabled', False)
+
+
+def carry_read_only(call: Callable[..., T]) -> Callable[..., T]:
+    """
+    :return: the call, running read-only (see read_only) if the calling thread is; wrap calls submitted to executors
+    """
+    if not is_read_only():
+        return call
+
+    def read_only_call(*args, **kwargs):
+        with read_only():
+            return call(*args, **kwargs)
+    return read_only_call
+
+
+@dataclass
+class HttpCacheEntry(db.Model):
+    """
+    A cached response: status, a few headers (content type and validators) and zlib compressed body.
+    """
+    id: int = db.Column(db.Integer, primary_key=True)
+    key: str = db.Column(db.String, nullable=False, unique=True)
+    status: int = db.Column(db.Integer, nullable=False)
+    headers: dict = db.Column(db.JSON)
+    body: bytes = db.Column(db.LargeBinary)
+    size: int = db.Column(db.Integer, nullable=False, default=0)
+    expires_datetime: datetime = db.Column(db.DateTime, nullable=False)
+    accessed_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+@dataclass
+class CachedResponse(object):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """
+        :return: conditional request headers revalidating this response (empty if it has no ETag/Last-Modified)
+        """
+        validators = {}
+        if self.headers.get('ETag'):
+            validators['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = self.headers['Last-Modified']
+        return validators
+
+
+class ResponseCacheStatsSchema(Schema):
+    hits = fields.Integer()
+    revalidated = fields.Integer()
+    misses = fields.Integer()
+    stale = fields.Integer()
+    writes = fields.Integer()
+    evictions = fields.Integer()
+    errors = fields.Integer()
+
+
+@dataclass
+class ResponseCacheStats(JsonMixin):
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    stale: int = 0
+    writes: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    @classmethod
+    def schema(cls) -> Schema:
+        return ResponseCacheStatsSchema()
+
+
+class ResponseCache(object):
+    """
+    Persistent cache of HTTP responses of source APIs (TMDB, IMDb), below the source clients, so that it survives
+    restarts.
+
+    Responses live for a TTL of their URL (see DEFAULT_TTLS); expired responses are kept, and revalidated with
+    their ETag or Last-Modified if they have one. Bodies are stored compressed, and once all bodies exceed
+    max_size bytes, least recently used responses are evicted (down to 90% of max_size).
+
+    Failures are logged, not raised: the cache is never a reason for a request to fail. Threads running read-only
+    (see read_only) do not write anything. Responses are read and written in a session of their own (see
+    own_session), so the cache never commits anything pending in the current session.
+    """
+
+    def __init__(self, max_size: int = Config.http_cache_max_size(), ttls: Dict[str, int] = None):
+        self._max_size = max_size
+        ttls = ttls if ttls is not None else {**DEFAULT_TTLS, **Config.http_cache_ttls()}
+        self._ttls = [(re.compile(pattern), int(ttl)) for pattern, ttl in ttls.items()]
+        self._stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+        # total size of cached bodies, summed up on first use, then kept up to date by writes and evictions
+        self._size: Optional[int] = None
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            setattr(self._stats, counter, getattr(self._stats, counter) + n)
+        metrics.count(f'http_cache.{counter}', n)
+
+    def stats(self) -> ResponseCacheStats:
+        """
+        :return: a copy of hit/miss counters of this cache
+        """
+        with self._lock:
+            return ResponseCacheStats(**self._stats.__dict__)
+
+    def ttl(self, url: str) -> Optional[int]:
+        """
+        :return: seconds a response of the URL is fresh for, or None if it is not cached at all
+        """
+        return next((ttl for pattern, ttl in self._ttls if pattern.search(url)), None)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        :param key: cache key of a request (see cache_key)
+        :return: the cached response, fresh or not, or None if nothing is cached
+        """
+        # noinspection PyBroadException
+        try:
+            with own_session() as session:
+                entry = session.query(HttpCacheEntry).filter_by(key=key).first()
+                if entry is None:
+                    self._count('misses')
+                    return None
+
+                now = datetime.utcnow()
+                fresh = entry.expires_datetime > now
+                self._count('hits' if fresh else 'stale')
+                response = CachedResponse(status=entry.status, headers=dict(entry.headers or {}),
+                                          body=zlib.decompress(entry.body) if entry.body else b'', fresh=fresh)
+                if fresh and entry.accessed_datetime < now - _TOUCH_INTERVAL and not is_read_only():
+                    entry.accessed_datetime = now
+                    session.commit()
+                return response
+        except BaseException:
+            logger.warning(f'Cannot read cached response of {key}: {traceback.format_exc()}')
+            self._count('errors')
+            return None
+
+    def put(self, key: str, status: int, headers: Dict[str, str], body: bytes, ttl: int):
+        """
+        Caches (or replaces a cached) response, and commits. Evicts least recently used responses if the cache is
+        full.
+        """
+        if is_read_only():
+            return
+        # noinspection PyBroadException
+        try:
+            compressed = zlib.compress(body)
+            with own_session() as session:
+                entry = session.query(HttpCacheEntry).filter_by(key=key).first()
+                if entry is None:
+                    entry = HttpCacheEntry(key=key)
+                    session.add(entry)
+                previous_size = entry.size or 0
+                now = datetime.utcnow()
+                entry.status = status
+                entry.headers = {name: headers.get(name) for name in
+                                 ('Content-Type', 'ETag', 'Last-Modified', 'X-Url') if headers.get(name)}
+                entry.body = compressed
+                entry.size = len(compressed)
+                entry.expires_datetime = now + timedelta(seconds=ttl)
+                entry.accessed_datetime = now
+                session.commit()
+            self._count('writes')
+            self._resized(len(compressed) - previous_size)
+            self._evict()
+        except BaseException:
+            logger.warning(f'Cannot cache response of {key}: {traceback.format_exc()}')
+            self._count('errors')
+
+    def revalidated(self, key: str, ttl: int):
+        """
+        Marks a stale response fresh again (the server confirmed it did not change), and commits.
+        """
+        if is_read_only():
+            return
+        # noinspection PyBroadException
+        try:
+            now = datetime.utcnow()
+            with own_session() as session:
+                session.query(HttpCacheEntry).filter_by(key=key).update(
+                    {'expires_datetime': now + timedelta(seconds=ttl), 'accessed_datetime': now})
+                session.commit()
+            self._count('revalidated')
+        except BaseException:
+            logger.warning(f'Cannot revalidate cached response of {key}: {traceback.format_exc()}')
+            self._count('errors')
+
+    def size(self) -> int:
+        """
+        :return: total size of cached (compressed) bodies; summed up in the database only once
+        """
+        with self._lock:
+            if self._size is not None:
+                return self._size
+        with own_session() as session:
+            size = session.query(db.func.coalesce(db.func.sum(HttpCacheEntry.size), 0)).scalar()
+        with self._lock:
+            if self._size is None:
+                self._size = size
+            return self._size
+
+    def _resized(self, delta: int):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+
+    def _evict(self):
+        excess = self.size() - int(self._max_size * 0.9)
+        if excess <= self._max_size * 0.1:
+            return
+
+        evicted = []
+        evicted_size = 0
+        with own_session() as session:
+            for entry_id, size in session.query(HttpCacheEntry.id, HttpCacheEntry.size)\
+                    .order_by(HttpCacheEntry.accessed_datetime):
+                if excess <= 0:
+                    break
+                evicted.append(entry_id)
+                excess -= size
+                evicted_size += size
+            session.query(HttpCacheEntry).filter(HttpCacheEntry.id.in_(evicted)).delete(synchronize_session=False)
+            session.commit()
+        self._resized(-evicted_size)
+        self._count('evictions', len(evicted))
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+# upper bounds (in seconds) of latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram(object):
+    """
+    Latency histogram with fixed buckets (see LATENCY_BUCKETS), together with a number of calls which failed.
+    Not thread safe on its own, see Metrics.
+    """
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def to_dict(self) -> dict:
+        return dict(count=self.count, errors=self.errors, total=self.total, buckets=list(self.buckets))
+
+
+def _percentile(buckets: List[int], count: int, fraction: float) -> float:
+    """
+    :return: upper bound of the bucket the percentile falls into (the largest bound for the unbounded bucket)
+    """
+    rank = fraction * count
+    seen = 0
+    for index, n in enumerate(buckets):
+        seen += n
+        if seen >= rank and n > 0:
+            return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+    return LATENCY_BUCKETS[-1]
+
+
+def summary(snapshot: dict) -> dict:
+    """
+    Summarizes a snapshot (or a difference of snapshots, see difference): call and error counts, total and mean
+    time, and approximate 50th, 95th and 99th percentiles (bucket upper bounds) of every timer, and all counters.
+
+    :param snapshot: a snapshot returned by Metrics.snapshot
+    :return: JSON serializable summary
+    """
+    timers = {}
+    for name, t in sorted(snapshot['timers'].items()):
+        if t['count'] == 0:
+            continue
+        timers[name] = dict(count=t['count'],
+                            errors=t['errors'],
+                            total=round(t['total'], 6),
+                            mean=round(t['total'] / t['count'], 6),
+                            p50=_percentile(t['buckets'], t['count'], 0.5),
+                            p95=_percentile(t['buckets'], t['count'], 0.95),
+                            p99=_percentile(t['buckets'], t['count'], 0.99))
+    counters = {name: n for name, n in sorted(snapshot['counters'].items()) if n}
+    return dict(timers=timers, counters=counters)
+
+
+def difference(after: dict, before: dict) -> dict:
+    """
+    :return: snapshot of what was recorded between two snapshots
+    """
+    timers = {}
+    for name, t in after['timers'].items():
+        b = before['timers'].get(name, dict(count=0, errors=0, total=0.0, buckets=[0] * len(t['buckets'])))
+        timers[name] = dict(count=t['count'] - b['count'],
+                            errors=t['errors'] - b['errors'],
+                            total=t['total'] - b['total'],
+                            buckets=[x - y for x, y in zip(t['buckets'], b['buckets'])])
+    counters = {name: n - before['counters'].get(name, 0) for name, n in after['counters'].items()}
+    return dict(timers=timers, counters=counters)
+
+
+class Metrics(object):
+    """
+    Thread safe registry of latency histograms (timers) and counters, by name. Names are dotted, starting with
+    a component: 'TMDBApi.search', 'matcher.scoring', 'match_cache.hits'.
+    """
+
+    def __init__(self):
+        self._timers: Dict[str, Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._timers.get(name)
+            if histogram is None:
+                histogram = self._timers[name] = Histogram()
+            histogram.observe(seconds, error)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Times a block of code; a block which raises is recorded as an error.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        :return: a copy of all timers and counters
+        """
+        with self._lock:
+            return dict(timers={name: h.to_dict() for name, h in self._timers.items()},
+                        counters=dict(self._counters))
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+
+metrics = Metrics()
@@ -0,0 +1,151 @@
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from banana.core import db, getLogger, Config
+from banana.core.httpcache import carry_read_only, is_read_only
+from banana.core.metrics import metrics
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ReferenceDataSnapshot(db.Model):
+    """
+    Last fetched reference data of a source, so that it is available right after a restart.
+    """
+    id: int = db.Column(db.Integer, primary_key=True)
+    name: str = db.Column(db.String, nullable=False, unique=True)
+    data: dict = db.Column(db.JSON)
+    updated_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReferenceData(object):
+    """
+    Small catalogs of a source every lookup needs (like TMDB genres and image configuration), served from memory.
+
+    Data is loaded from its persisted snapshot first (warmup), and refreshed from the source in background
+    whenever it is older than refresh_interval (or there is no snapshot). Lookups never wait for a refresh: until
+    one completes they see the previous data, or the defaults. Failed refreshes are retried on access, at most once
+    per retry_interval. Lookups which find something missing (like a genre id the catalog does not know yet) do not
+    wait either, they ask for a refresh (see missing) and make do with what there is.
+
+    Refreshes started by a read-only thread (see httpcache.read_only) do not store the snapshot.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[], dict], defaults: dict = None,
+                 refresh_interval: float = Config.reference_data_refresh_interval(), retry_interval: float = 60):
+        self.name = name
+        self._fetch = fetch
+        self._data = dict(defaults or {})
+        self._refresh_interval = refresh_interval
+        self._retry_interval = retry_interval
+        self._updated: Optional[float] = None
+        self._attempted: Optional[float] = None
+        self._warm = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def data(self) -> dict:
+        """
+        :return: current data (never blocks on the source); starts a background refresh if it is stale
+        """
+        if not self._warm:
+            self.warmup()
+        if self._stale():
+            self.refresh_in_background()
+        return self._data
+
+    def missing(self):
+        """
+        Tells that the current data lacks something a lookup needs: refreshes it in background, unless a refresh was
+        started within the last retry_interval (so data the source does not have either is not fetched over and
+        over again).
+        """
+        with self._lock:
+            attempted_recently = self._attempted is not None and \
+                time.monotonic() - self._attempted < self._retry_interval
+        if not attempted_recently:
+            self.refresh_in_background()
+
+    def _stale(self) -> bool:
+        now = time.monotonic()
+        return (self._updated is None or now - self._updated >= self._refresh_interval) and \
+            (self._attempted is None or now - self._attempted >= self._retry_interval)
+
+    def warmup(self):
+        """
+        Loads the persisted snapshot (if any), and refreshes it in background if it is stale.
+        """
+        with self._lock:
+            if self._warm:
+                return
+            self._warm = True
+
+        # noinspection PyBroadException
+        try:
+            snapshot = ReferenceDataSnapshot.query.filter_by(name=self.name).first()
+            if snapshot is not None:
+                self._data = {**self._data, **snapshot.data}
+                age = (datetime.utcnow() - snapshot.updated_datetime).total_seconds()
+                self._updated = time.monotonic() - age
+                logger.info(f'Loaded {self.name} reference data snapshot from {snapshot.updated_datetime}.')
+        except BaseException:
+            logger.warning(f'Cannot load {self.name} reference data snapshot: {traceback.format_exc()}')
+            db.session.rollback()
+
+        if self._stale():
+            self.refresh_in_background()
+
+    def refresh(self):
+        """
+        Fetches data from the source, replaces the current data and the snapshot with it.
+        """
+        with metrics.timer(f'reference_data.{self.name}.refresh'):
+            data = self._fetch()
+        self._data = {**self._data, **data}
+        self._updated = time.monotonic()
+        logger.info(f'Refreshed {self.name} reference data.')
+
+        if is_read_only():
+            return
+
+        # noinspection PyBroadException
+        try:
+            snapshot = ReferenceDataSnapshot.query.filter_by(name=self.name).first()
+            if snapshot is None:
+                snapshot = ReferenceDataSnapshot(name=self.name)
+                db.session.add(snapshot)
+            snapshot.data = data
+            snapshot.updated_datetime = datetime.utcnow()
+            db.session.commit()
+        except BaseException:
+            logger.warning(f'Cannot store {self.name} reference data snapshot: {traceback.format_exc()}')
+            db.session.rollback()
+
+    def refresh_in_background(self):
+        """
+        Starts a refresh in a background thread, unless one is running already.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._attempted = time.monotonic()
+
+        @carry_read_only
+        def run():
+            # noinspection PyBroadException
+            try:
+                self.refresh()
+            except BaseException:
+                logger.warning(f'Cannot refresh {self.name} reference data: {traceback.format_exc()}')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name=f'{self.name}-reference-data', daemon=True).start()
@@ -1,8 +1,17 @@
 from dataclasses import dataclass
+from typing import List
+
 from marshmallow import Schema, fields
 from banana.core import JsonMixin
 
 
+class ScanRootProgressSchema(Schema):
+    path = fields.String(required=True)
+    current_item = fields.Integer(missing=None)
+    total_items = fields.Integer(missing=None)
+    completed = fields.Boolean(missing=False)
+
+
 class JobEventSchema(Schema):
     job_id = fields.String(required=True)
     job_type = fields.String(missing=None)
@@ -10,6 +19,8 @@ class JobEventSchema(Schema):
     current_item = fields.Integer(missing=None)
     total_items = fields.Integer(missing=None)
     context = fields.String(missing=None)
+    roots = fields.List(fields.Nested(ScanRootProgressSchema), missing=None)
+    summary = fields.Dict(missing=None)
 
 
 class EventTypes:
@@ -19,6 +30,15 @@ class EventTypes:
     ERROR = 'error'
 
 
+@dataclass
+class ScanRootProgress:
+
+    path: str
+    current_item: int = None
+    total_items: int = None
+    completed: bool = False
+
+
 @dataclass
 class JobProgressEvent(JsonMixin):
 
@@ -28,6 +48,7 @@ class JobProgressEvent(JsonMixin):
     current_item: int = None
     total_items: int = None
     context: str = None
+    roots: List[ScanRootProgress] = None
 
     @classmethod
     def schema(cls) -> Schema:
@@ -58,6 +79,8 @@ class JobCompletedEvent(JsonMixin):
     current_item: int = None
     total_items: int = None
     context: str = None
+    # timers and counters recorded while the job ran (see banana.core.metrics.summary)
+    summary: dict = None
 
     @classmethod
     def schema(cls) -> Schema:
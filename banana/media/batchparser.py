@@ -0,0 +1,158 @@
+import multiprocessing
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from banana.core import Config
+from banana.media.p import MediaParser, patterns
+
+T = TypeVar('T')
+
+# every field MediaParser.parse can return, a column of ParsedColumns each
+FIELDS = tuple(key for key, _ in patterns) + ('episodeName', 'title', 'excess')
+
+_parser = MediaParser()
+
+# process pools shared by all BatchMediaParsers of this process, by number of processes
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    :return: a process pool of given size, shared by the whole process; workers are spawned, not forked, as
+     a fork of a process patched by gevent (with its hub, threads and locks) is not safe
+    """
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            pool = _pools[processes] = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+class ParsedColumns(object):
+    """
+    Column-oriented results of MediaParser.parse for a batch of file names: one list per field, with None where
+    a field was not parsed. It is compact to pass between processes, and rows (dicts, as returned by
+    MediaParser.parse) are built only when asked for.
+
+    File names which were not parsed (None) have no fields at all, file names which could not be parsed have
+    an error instead.
+    """
+
+    def __init__(self, filenames: List[Optional[str]], columns: Dict[str, list], errors: Dict[int, str] = None):
+        self.filenames = filenames
+        self.columns = columns
+        self.errors = errors if errors is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def column(self, field: str) -> list:
+        """
+        :param field: one of FIELDS
+        :return: values of field, in order of file names
+        """
+        return self.columns[field]
+
+    def row(self, index: int) -> dict:
+        """
+        :param index: index of a file name
+        :return: dict of parsed fields of the file name, the same as MediaParser.parse would return
+        :raise ValueError: if the file name could not be parsed
+        """
+        if index in self.errors:
+            raise ValueError(f'Cannot parse {self.filenames[index]}: {self.errors[index]}')
+        return {field: values[index] for field, values in self.columns.items() if values[index] is not None}
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self.row(index) for index in range(len(self)))
+
+
+def parse_columns(filenames: List[Optional[str]]) -> ParsedColumns:
+    """
+    Parses a batch of file names in this process. It is what process pool workers of BatchMediaParser run.
+
+    :param filenames: file names, or None for ones which should be skipped
+    :return: ParsedColumns of filenames
+    """
+    columns = {field: [None] * len(filenames) for field in FIELDS}
+    errors = {}
+    for index, filename in enumerate(filenames):
+        if filename is None:
+            continue
+        # noinspection PyBroadException
+        try:
+            parsed = _parser.parse(filename)
+        except BaseException:
+            errors[index] = traceback.format_exc()
+            continue
+        for field, value in parsed.items():
+            columns[field][index] = value
+    return ParsedColumns(filenames, columns, errors)
+
+
+class BatchMediaParser(object):
+    """
+    Parses file names in chunks on a process pool, so that parsing of a large import runs on all cores and does
+    not compete with the scan (and the web server) for the GIL. Chunks are submitted ahead, but only a few of
+    them per process, so a stream of file names is not read (nor held in memory) all at once.
+
+    With no processes, chunks are parsed in this process, one at a time.
+
+    The pool is shared by all parsers (and scans) with the same number of processes, and lives as long as the
+    process does. Its workers are spawned: they import this module (not the application) on start, so the app
+    has to be run by a server (like flask run), and not as a script, which they would import as their main module.
+    """
+
+    def __init__(self,
+                 processes: int = Config.media_parser_processes(),
+                 chunk_size: int = Config.media_parser_chunk_size()):
+        self._processes = processes
+        self._chunk_size = max(1, chunk_size)
+        self._executor = _shared_pool(processes) if processes > 0 else None
+
+    def parse_chunks(self,
+                     items: Iterable[T],
+                     filename: Callable[[T], Optional[str]] = lambda item: item) \
+            -> Iterator[Tuple[List[T], ParsedColumns]]:
+        """
+        :param items: items to parse, usually file names themselves
+        :param filename: returns a file name of an item, or None if the item should not be parsed
+        :return: iterator of (chunk of items, ParsedColumns of their file names), in order of items
+        """
+        items = iter(items)
+        chunks = iter(lambda: list(islice(items, self._chunk_size)), [])
+
+        if self._executor is None:
+            for chunk in chunks:
+                yield chunk, parse_columns([filename(item) for item in chunk])
+            return
+
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, self._executor.submit(parse_columns, [filename(item) for item in chunk])))
+            if len(pending) >= 2 * self._processes:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+    def parse_all(self, filenames: Iterable[str]) -> ParsedColumns:
+        """
+        :param filenames: file names to parse
+        :return: ParsedColumns of all filenames
+        """
+        result = ParsedColumns([], {field: [] for field in FIELDS})
+        for _, columns in self.parse_chunks(filenames):
+            offset = len(result)
+            result.filenames.extend(columns.filenames)
+            for field, values in columns.columns.items():
+                result.columns[field].extend(values)
+            result.errors.update({offset + index: error for index, error in columns.errors.items()})
+        return result
@@ -0,0 +1,145 @@
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import List, Tuple
+
+import rx
+from marshmallow import Schema, fields
+from marshmallow_enum import EnumField
+
+from banana.core import db, getLogger, Config, JsonMixin
+from banana.core.jobs import JobContext
+from banana.media.item import ParsedMediaItem
+
+_running_jobs = set()
+_running_jobs_lock = threading.Lock()
+
+
+class ScanJobStatus(Enum):
+    RUNNING = 1
+    FAILED = 2
+
+
+class ScanCheckpointSchema(Schema):
+    job_id = fields.String(required=True)
+    roots = fields.List(fields.String())
+    status = EnumField(ScanJobStatus)
+    current_item = fields.Integer(missing=None)
+    last_path = fields.String(missing=None)
+    last_filename = fields.String(missing=None)
+    created_datetime = fields.DateTime(missing=None)
+    updated_datetime = fields.DateTime(missing=None)
+
+
+@dataclass
+class ScanCheckpoint(db.Model, JsonMixin):
+    """
+    Persistent position of a scan job: scan roots, the number of media items processed so far and the last one
+    of them. Outcomes of processed items are kept by the scan index (recorded with the job id), in the same
+    transaction as the rest of the work done for an item.
+
+    A checkpoint exists only while a job is not completed. A job which is RUNNING, but not running in this process,
+    was interrupted; it can be resumed (under the same job id) together with FAILED jobs.
+    """
+    id: int = db.Column(db.Integer, primary_key=True)
+    job_id: str = db.Column(db.String, nullable=False, unique=True)
+    roots: List[str] = db.Column(db.JSON, nullable=False)
+    status: ScanJobStatus = db.Column(db.Enum(ScanJobStatus), nullable=False)
+    current_item: int = db.Column(db.Integer, default=0)
+    last_path: str = db.Column(db.String)
+    last_filename: str = db.Column(db.String)
+
+    created_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def schema(cls) -> Schema:
+        return ScanCheckpointSchema()
+
+    def is_running(self) -> bool:
+        """
+        :return: True if the job is running in this process
+        """
+        with _running_jobs_lock:
+            return self.job_id in _running_jobs
+
+    @classmethod
+    def interrupted(cls) -> List['ScanCheckpoint']:
+        """
+        :return: checkpoints of jobs which can be resumed
+        """
+        return [c for c in cls.query.order_by(cls.created_datetime.desc()).all() if not c.is_running()]
+
+    @classmethod
+    def start(cls, job_id: str, roots: List[str]) -> 'ScanCheckpoint':
+        """
+        Creates (or, for a resumed job, reopens) a checkpoint of a running job and commits it.
+        """
+        with _running_jobs_lock:
+            _running_jobs.add(job_id)
+
+        checkpoint = cls.query.filter_by(job_id=job_id).first()
+        if checkpoint is None:
+            checkpoint = cls(job_id=job_id, roots=list(roots), current_item=0)
+            db.session.add(checkpoint)
+        checkpoint.status = ScanJobStatus.RUNNING
+        db.session.commit()
+        return checkpoint
+
+
+class ScanCheckpointObserver(rx.Observer):
+    """
+    Periodically checkpoints a position of a scan job. It has to be subscribed after the observer doing
+    the actual work, so that an item is checkpointed only after it has been committed.
+
+    Checkpoints are written at most once per interval (in seconds); processed items are committed one by one,
+    so a restart loses only the item in flight, and the checkpoint itself is at most interval seconds behind.
+    When the job completes, its checkpoint is removed.
+    """
+
+    def __init__(self, job_context: JobContext, interval: float = Config.media_scanner_checkpoint_interval()):
+        self._job_context = job_context
+        self._interval = interval
+        self._next_checkpoint = time.monotonic() + interval
+        self._position: Tuple[int, str, str] = None
+        self.logger = getLogger(self.__class__.__name__)
+
+    def _finish(self):
+        with _running_jobs_lock:
+            _running_jobs.discard(self._job_context.id())
+
+    def _checkpoint(self, status: ScanJobStatus):
+        # noinspection PyBroadException
+        try:
+            values = dict(status=status, updated_datetime=datetime.utcnow())
+            if self._position is not None:
+                values.update(zip(('current_item', 'last_path', 'last_filename'), self._position))
+            ScanCheckpoint.query.filter_by(job_id=self._job_context.id()).update(values)
+            db.session.commit()
+        except BaseException:
+            self.logger.warning(f"Cannot checkpoint scan job {self._job_context.id()}: {traceback.format_exc()}")
+            db.session.rollback()
+        self._next_checkpoint = time.monotonic() + self._interval
+
+    def on_next(self, index_and_media: Tuple[int, ParsedMediaItem]):
+        index, media = index_and_media
+        self._position = (index, media.path, media.filename)
+        if time.monotonic() >= self._next_checkpoint:
+            self._checkpoint(ScanJobStatus.RUNNING)
+
+    def on_completed(self):
+        # noinspection PyBroadException
+        try:
+            ScanCheckpoint.query.filter_by(job_id=self._job_context.id()).delete()
+            db.session.commit()
+        except BaseException:
+            self.logger.warning(f"Cannot remove checkpoint of {self._job_context.id()}: {traceback.format_exc()}")
+            db.session.rollback()
+        self._finish()
+
+    def on_error(self, error):
+        self._checkpoint(ScanJobStatus.FAILED)
+        self._finish()
@@ -0,0 +1,183 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import filetype
+from cachetools import LRUCache
+
+from banana.core import Config, getLogger
+from banana.core.concurrency import DeviceExecutors
+
+# filetype needs at most this many leading bytes to recognize any of the video types
+HEADER_SIZE = 262
+
+# files with these extensions are never media, they are rejected without touching the disk
+NON_VIDEO_EXTENSIONS = frozenset([
+    # subtitles
+    '.srt', '.sub', '.idx', '.ass', '.ssa', '.vtt', '.smi',
+    # metadata and text
+    '.nfo', '.txt', '.xml', '.json', '.url', '.log', '.md', '.html', '.htm', '.pdf',
+    # images
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tbn', '.webp',
+    # checksums, parity and download leftovers
+    '.sfv', '.md5', '.sha1', '.par2', '.nzb', '.torrent', '.part', '.!qb', '.crdownload',
+    # audio
+    '.mp3', '.flac', '.ogg', '.wav', '.m4a', '.aac', '.ac3', '.dts',
+    # archives and executables
+    '.rar', '.zip', '.7z', '.gz', '.tar', '.exe', '.db'])
+
+
+def header_is_video(header: bytes) -> bool:
+    """
+    :param header: leading bytes of a file
+    :return: True if header is a signature of a video type supported by filetype
+    """
+    return filetype.video(bytearray(header)) is not None
+
+
+def _read_header(f: str) -> bytes:
+    with open(f, 'rb') as fp:
+        return fp.read(HEADER_SIZE)
+
+
+def _cache_key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class FileTypeCache(object):
+    """
+    Thread safe, bounded cache of sniffed file types, keyed by (device, inode, size, mtime). A file is sniffed
+    again only if it was replaced or modified, renaming (or hard linking) a file keeps its cached type.
+    """
+
+    def __init__(self, maxsize: int = 64 * 1024):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, st: os.stat_result) -> Optional[bool]:
+        with self._lock:
+            return self._cache.get(_cache_key(st))
+
+    def put(self, st: os.stat_result, supported: bool):
+        with self._lock:
+            self._cache[_cache_key(st)] = supported
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+
+_shared_cache = FileTypeCache()
+
+
+class FileTypeSniffer(object):
+    """
+    Checks if files are videos supported by the scanner.
+
+    Files with well known non video extensions are rejected right away, cached results are returned without I/O.
+    Anything else is sniffed by reading only a file header, on a bounded pool of I/O workers, so that a slow disk
+    does not stall the whole scan. Results are cached by FileTypeCache, which is shared by all sniffers by default.
+
+    Like directory listing, sniffing is scheduled per device (see DeviceExecutors): workers is the default limit
+    for every device and mount_concurrency overrides it for devices of given mount points.
+    """
+
+    def __init__(self, workers: int = Config.media_scanner_filetype_workers(), cache: FileTypeCache = None,
+                 mount_concurrency: Dict[str, int] = Config.media_scanner_mount_concurrency()):
+        self._workers = workers
+        self._mount_concurrency = mount_concurrency
+        self._cache = cache if cache is not None else _shared_cache
+        self.logger = getLogger(self.__class__.__name__)
+
+    def _fast_path(self, filename: str, st: os.stat_result = None) -> Optional[bool]:
+        """
+        :return: True/False if file type is known without reading the file, None otherwise
+        """
+        if os.path.splitext(filename)[1].lower() in NON_VIDEO_EXTENSIONS:
+            return False
+        if st is not None:
+            return self._cache.get(st)
+        return None
+
+    def _sniff(self, path: str, filename: str, st: os.stat_result = None) -> bool:
+        f = os.path.join(path, filename)
+        # noinspection PyBroadException
+        try:
+            if st is None:
+                st = os.stat(f)
+                cached = self._cache.get(st)
+                if cached is not None:
+                    return cached
+
+            self.logger.debug(f"Checking if {f} is supported by this scanner...")
+            supported = header_is_video(_read_header(f))
+            self._cache.put(st, supported)
+            return supported
+        except Exception:
+            # unreadable files are not cached, they may become readable later
+            return False
+
+    def is_supported(self, path: str, filename: str, st: os.stat_result = None) -> bool:
+        """
+        Checks a single file in the calling thread.
+
+        :param path: a directory of a file
+        :param filename: a name of a file
+        :param st: os.stat_result of a file, if already known
+        :return: True if the file is a supported video
+        """
+        supported = self._fast_path(filename, st)
+        return supported if supported is not None else self._sniff(path, filename, st)
+
+    def sniff_all(self, files: Iterable[Tuple[str, str, Optional[os.stat_result]]],
+                  device_of: Callable[[str], int] = None, executors: DeviceExecutors = None) \
+            -> Iterator[Tuple[str, str, Optional[os.stat_result], bool]]:
+        """
+        Checks files concurrently. Files are consumed lazily and only a bounded number of them is in flight,
+        results are yielded in the same order as files were given.
+
+        :param files: iterable of (path, filename, os.stat_result or None)
+        :param device_of: returns st_dev of a directory, used to schedule files without os.stat_result
+        :param executors: per device executors shared with other I/O (like directory listing) of the caller, which
+                          owns them; limits of the sniffer are not used then
+        :return: iterator of (path, filename, os.stat_result or None, supported)
+        """
+        shared = executors is not None
+        if not shared:
+            executors = DeviceExecutors(self._workers, self._mount_concurrency)
+        in_flight = deque()
+        window = 2 * executors.max_concurrency()
+
+        def device(path, st):
+            if st is not None:
+                return st.st_dev
+            # noinspection PyBroadException
+            try:
+                return device_of(path) if device_of is not None else None
+            except Exception:
+                return None
+
+        try:
+            for path, filename, st in files:
+                supported = self._fast_path(filename, st)
+                executor = executors.executor(device(path, st)) if supported is None else None
+                if executor is not None:
+                    future = executor.submit(self._sniff, path, filename, st)
+                else:
+                    future = Future()
+                    future.set_result(supported if supported is not None else self._sniff(path, filename, st))
+                in_flight.append((path, filename, st, future))
+
+                while in_flight and (len(in_flight) > window or in_flight[0][3].done()):
+                    path, filename, st, future = in_flight.popleft()
+                    yield path, filename, st, future.result()
+
+            while in_flight:
+                path, filename, st, future = in_flight.popleft()
+                yield path, filename, st, future.result()
+
+        finally:
+            if not shared:
+                executors.shutdown()
@@ -1,6 +1,8 @@
 import os
+import threading
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict
 
 from marshmallow import Schema, fields, EXCLUDE
 from sqlalchemy import and_
@@ -52,6 +54,8 @@ class ParsedMediaItemSchema(Schema):
 
 @dataclass
 class ParsedMediaItem(db.Model, JsonMixin):
+    __table_args__ = (db.Index('ix_parsed_media_item_path_filename', 'path', 'filename'),)
+
     id: int = db.Column(db.Integer, primary_key=True)
     filename: str = db.Column(db.String)
     target_filename: str = db.Column(db.String)
@@ -89,6 +93,9 @@ class ParsedMediaItem(db.Model, JsonMixin):
     matched_movie_id: int = db.Column(db.Integer, db.ForeignKey('movie.id'),
                                       nullable=True)
 
+    # transient field not stored in database; a stat of the file taken by the scanner
+    file_stat = None
+
     def __hash__(self):
         return id(self)
 
@@ -165,3 +172,53 @@ class ParsedMediaItem(db.Model, JsonMixin):
     @classmethod
     def schema(cls) -> Schema:
         return ParsedMediaItemSchema()
+
+
+class ProcessedMediaItems(object):
+    """
+    A set of (path, filename) of media items already stored in the database, either matched or not. It is loaded
+    with a single query on first use, so that the scanner can skip already processed files without any database
+    round-trip. Filenames are grouped by path, which keeps it compact for large libraries.
+
+    It should be kept up to date by adding media items once they are committed.
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, bool]] = None
+        self._lock = threading.RLock()
+
+    def _load(self) -> Dict[str, Dict[str, bool]]:
+        with self._lock:
+            if self._items is None:
+                items = {}
+                rows = db.session.query(ParsedMediaItem.path, ParsedMediaItem.filename,
+                                        ParsedMediaItem.matched_movie_id.isnot(None)).all()
+                for path, filename, matched in rows:
+                    files = items.setdefault(path, {})
+                    files[filename] = files.get(filename, False) or bool(matched)
+                self._items = items
+            return self._items
+
+    def is_processed(self, path: str, filename: str) -> bool:
+        return filename in self._load().get(path, ())
+
+    def is_matched(self, path: str, filename: str) -> bool:
+        return self._load().get(path, {}).get(filename, False)
+
+    def add(self, path: str, filename: str, matched: bool):
+        items = self._load()
+        with self._lock:
+            items.setdefault(path, {})[filename] = matched
+
+    def discard(self, path: str, filename: str = None):
+        """
+        Discards a media item, or all media items in a directory (and its subdirectories) if filename is not given.
+        """
+        items = self._load()
+        with self._lock:
+            if filename is not None:
+                items.get(path, {}).pop(filename, None)
+            else:
+                prefix = os.path.join(path, '')
+                for p in [p for p in items if p == path or p.startswith(prefix)]:
+                    del items[p]
@@ -1,18 +1,25 @@
 import uuid
 from abc import abstractmethod
 from enum import Enum
+from typing import List
 
 import rx
 
 from ..media.observables.mediascanner import FileSystemMediaScanner
+from ..media.observables.mediawatcher import FileSystemMediaWatcher
 from .observers import MediaScannerProgressEventObserver, MediaScannerCompletedOrErrorEventObserver, \
-    MediaItemMatchingObserver, \
+    MediaItemMatchingObserver, MediaItemChangesObserver, \
     ManualMediaItemMatchingObserver, ManualMatchProgressEventObserver, ManualMatchCompletedOrErrorEventObserver, \
     FixMatchObserver, FixMatchProgressEventObserver, FixMatchCompletedOrErrorEventObserver, ParsedMediaItem, \
     EmitEventMixin, JobProgressEvent, JobCompletedEvent
 from ..core import JobContext, Runnable, Config, socket as web_socket
 from ..media.observables.fixmatch import FixMatchObservable
 from ..media.observables.manualmatchig import ManualMatchingObservable
+from ..media.checkpoint import ScanCheckpoint, ScanCheckpointObserver
+from ..media.item import ProcessedMediaItems
+from ..media.planning import MatchPlanner, MatchPlanObserver
+from ..media.scanindex import ScanIndex
+from ..media.watcher import WatchEventType
 from ..media.targets import get_media_target_resolver, MediaTargetResolver
 from ..movies.model import MovieMatchCandidate
 
@@ -20,16 +27,47 @@ from ..movies.model import MovieMatchCandidate
 class JobTypes(Enum):
 
     MEDIA_SCANNER = 'media_scanner'
+    MEDIA_WATCHER = 'media_watcher'
     MANUAL_MATCH = 'manual_match'
     FIX_MATCH = 'fix_match'
     GENERIC = 'generic'
 
 
 class FileSystemScanJob(JobContext, Runnable):
-
-    def __init__(self):
-        self._id: str= str(uuid.uuid4())
+    """
+    Scans media scan roots (BANANA_MEDIA_SCAN_PATHS, unless given) and matches found media items.
+
+    The job checkpoints its position (see ScanCheckpoint) and records an outcome of every item in the scan index,
+    so an interrupted job can be resumed by its id: files it has already processed are skipped.
+
+    If plan_output is given, the job runs in a planning (dry-run) mode instead: every scanned file is parsed,
+    matched and resolved, and its MatchPlan is written as a JSON line to plan_output (which is closed at the end).
+    Nothing is written to the database, nothing is linked and no job events are emitted. If plan_output can be
+    cancelled (see StreamedPlanOutput), the scan stops once it is.
+    """
+
+    def __init__(self, scan_index: ScanIndex = None, processed_items: ProcessedMediaItems = None,
+                 media_scan_paths: List[str] = None, job_id: str = None, resumed_items: int = 0,
+                 plan_output=None, planner: MatchPlanner = None):
+        self._id: str = job_id or str(uuid.uuid4())
         self._type: str = JobTypes.MEDIA_SCANNER.value
+        self._scan_index = scan_index
+        self._processed_items = processed_items or ProcessedMediaItems()
+        self._media_scan_paths = media_scan_paths if media_scan_paths is not None else Config.media_scan_paths()
+        self._resumed_items = resumed_items
+        self._plan_output = plan_output
+        self._planner = planner
+
+    @classmethod
+    def resume(cls, checkpoint: ScanCheckpoint) -> 'FileSystemScanJob':
+        """
+        Creates a job continuing an interrupted one, under the same job id.
+
+        :param checkpoint: a checkpoint of an interrupted job
+        :return: FileSystemScanJob to run
+        """
+        return cls(media_scan_paths=checkpoint.roots, job_id=checkpoint.job_id,
+                   resumed_items=checkpoint.current_item or 0)
 
     def id(self):
         return self._id
@@ -37,20 +75,85 @@ class FileSystemScanJob(JobContext, Runnable):
     def type(self):
         return self._type
 
+    def _plan(self, scheduler):
+        planner = self._planner if self._planner is not None else MatchPlanner(processed_items=self._processed_items)
+        scanner = FileSystemMediaScanner(self, media_scan_path=self._media_scan_paths,
+                                         cancelled=getattr(self._plan_output, 'cancelled', None))
+        scanner_observable = rx.Observable.create(scanner).map(lambda media, index: (index + 1, media))
+        if scheduler is not None:
+            scanner_observable = scanner_observable.subscribe_on(scheduler)
+        scanner_observable.subscribe(MatchPlanObserver(self, self._plan_output, planner=planner))
+
     def run(self, scheduler):
-        scanner = FileSystemMediaScanner(self)
-        media_items_to_scan = scanner.media_items_to_scan()
-        scanner_observable = rx.Observable.create(scanner).zip(rx.Observable.
-                                                    from_iterable(range(media_items_to_scan), scheduler), lambda x, y: (y+1, x))
+        if self._plan_output is not None:
+            return self._plan(scheduler)
+
+        scan_index = self._scan_index
+        if scan_index is None:
+            # outcomes are always recorded, so the job can be resumed; a non incremental scan skips only
+            # files processed by the job itself (which matters only when it is resumed)
+            scan_index = ScanIndex() if Config.media_scanner_incremental() else ScanIndex(job_id=self._id)
+        ScanCheckpoint.start(self._id, self._media_scan_paths)
+
+        scanner = FileSystemMediaScanner(self, media_scan_path=self._media_scan_paths, scan_index=scan_index)
+        scanner_observable = rx.Observable.create(scanner)\
+            .map(lambda media, index: (self._resumed_items + index + 1, media))
         subject = rx.subjects.Subject()
-        subject.subscribe(MediaItemMatchingObserver(self))
-        subject.subscribe(MediaScannerProgressEventObserver(self, total_items=media_items_to_scan))
+        subject.subscribe(MediaItemMatchingObserver(self, scan_index=scan_index,
+                                                    processed_items=self._processed_items))
+        subject.subscribe(ScanCheckpointObserver(self))
+        subject.subscribe(MediaScannerProgressEventObserver(self, total_items=scanner.media_items_to_scan,
+                                                            roots_progress=scanner.roots_progress))
         subject.subscribe(MediaScannerCompletedOrErrorEventObserver(self))
 
         scanner_observable.subscribe_on(scheduler).flat_map(lambda x: rx.Observable.just(x, scheduler))\
             .subscribe(subject)
 
 
+class FileSystemWatchJob(JobContext, Runnable):
+    """
+    Watches media scan path and matches media items as they are created. Deleted and moved files are propagated
+    to already matched media items; whenever watcher loses track of changes, an incremental FileSystemScanJob is run.
+    """
+
+    def __init__(self):
+        self._id: str = str(uuid.uuid4())
+        self._type: str = JobTypes.MEDIA_WATCHER.value
+        self._scan_index = ScanIndex() if Config.media_scanner_incremental() else None
+        self._processed_items = ProcessedMediaItems()
+        self._watcher = None
+
+    def id(self):
+        return self._id
+
+    def type(self):
+        return self._type
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def run(self, scheduler):
+        self._watcher = FileSystemMediaWatcher(self, scan_index=self._scan_index)
+        subject = rx.subjects.Subject()
+
+        created = subject.filter(lambda e: e.event_type is WatchEventType.CREATED)\
+            .map(lambda e, index: (index + 1, e.media))
+        created.subscribe(MediaItemMatchingObserver(self, scan_index=self._scan_index,
+                                                    processed_items=self._processed_items))
+        created.subscribe(MediaScannerProgressEventObserver(self))
+
+        subject.filter(lambda e: e.event_type in (WatchEventType.DELETED, WatchEventType.MOVED))\
+            .subscribe(MediaItemChangesObserver(self, scan_index=self._scan_index,
+                                                processed_items=self._processed_items))
+        subject.filter(lambda e: e.event_type is WatchEventType.RESCAN)\
+            .subscribe(on_next=lambda e: FileSystemScanJob(scan_index=self._scan_index,
+                                                           processed_items=self._processed_items).run(scheduler))
+        subject.subscribe(MediaScannerCompletedOrErrorEventObserver(self))
+
+        rx.Observable.create(self._watcher).subscribe_on(scheduler).subscribe(subject)
+
+
 class ManualMovieMatchJob(JobContext, Runnable):
 
     def __init__(self,
@@ -1,95 +1,245 @@
 import uuid
 import os
 import rx
+import time
 import traceback
+from functools import partial
+from typing import Callable, List, Tuple, Union
 
+from banana.events import ScanRootProgress
 from banana.media.item import ParsedMediaItem
-from banana.core import JobContext, Runnable, Config, getLogger
+from banana.core import JobContext, Runnable, Config, getLogger, db
+from banana.core.concurrency import DeviceExecutors
+from banana.media.batchparser import BatchMediaParser
+from banana.media.filetypes import FileTypeSniffer
 from banana.media.p import MediaParser
+from banana.media.scanindex import ScanIndex, ScanOutcome
+from banana.media.walker import DirectoryWalker, walk_all
 
-import filetype
+
+def to_parsed_media_item(path: str, filename: str, parsed: dict) -> ParsedMediaItem:
+    """
+    Creates a ParsedMediaItem from the result of MediaParser.
+
+    :param path: a directory of a media file
+    :param filename: a name of a media file
+    :param parsed: a dict returned by MediaParser.parse
+    :return: a (transient) ParsedMediaItem
+    """
+    return ParsedMediaItem(filename=filename,
+                           path=path,
+                           audio=parsed.get("audio"),
+                           codec=parsed.get("codec"),
+                           container=parsed.get("container"),
+                           episode=parsed.get("episode"),
+                           episodeName=parsed.get("episodeName"),
+                           garbage=parsed.get("garbage"),
+                           group=parsed.get("group"),
+                           hardcoded=parsed.get("hardcoded"),
+                           language=parsed.get("language"),
+                           proper=parsed.get("proper"),
+                           quality=parsed.get("quality"),
+                           region=parsed.get("region"),
+                           repack=parsed.get("repack"),
+                           resolution=parsed.get("resolution"),
+                           season=parsed.get("season"),
+                           title=parsed.get("title"),
+                           website=parsed.get("website"),
+                           widescreen=parsed.get("widescreen"),
+                           year=parsed.get("year"))
 
 
 class FileSystemMediaScanner(object):
     """
     A callable here, which is transformed to rx.Observable with Observable.create factory method.
 
-    This class scans a given directory for media to match and feeds Observers with parsed media files. Observers are
+    This class scans given directories (scan roots) for media to match and feeds Observers with parsed media files. Observers are
     responsible for an actual match.
 
     It has an unique ID for every running scanner job.
+
+    The directory tree is walked only once: media items are streamed to observers as soon as they are found, and
+    the total number of items to scan is a running estimate, which becomes exact when the walk is completed.
+
+    If a ScanIndex is given, files which did not change since they were last processed are skipped before
+    they are even parsed, and so are hard links of already matched files (see ScanIndex.linked_to).
+
+    Scan roots are walked concurrently (see walk_all), and directories are listed ahead of the scan by a bounded
+    pool of workers per device, see DirectoryWalker. File types are checked concurrently as well, see
+    FileTypeSniffer. Devices are scheduled independently: listing and sniffing share the same per device workers,
+    so their limits hold for all I/O of the scan, across all scan roots on the same device. Progress is tracked per
+    scan root.
+
+    With parser processes, file names are parsed in chunks on a process pool (see BatchMediaParser), otherwise
+    they are parsed one by one, on the scan thread.
+
+    If cancelled is given, the scan stops (and completes) as soon as it returns True.
     """
 
     def __init__(self,
                  job_context: JobContext,
-                 media_scan_path: str = Config.media_scan_path(),
-                 skip_filetype_checks: bool = Config.media_scanner_skip_filetype_checks()):
+                 media_scan_path: Union[str, List[str]] = Config.media_scan_paths(),
+                 skip_filetype_checks: bool = Config.media_scanner_skip_filetype_checks(),
+                 scan_index: ScanIndex = None,
+                 workers: int = Config.media_scanner_workers(),
+                 mount_concurrency: dict = Config.media_scanner_mount_concurrency(),
+                 sniffer: FileTypeSniffer = None,
+                 commit_interval: float = Config.media_scanner_checkpoint_interval(),
+                 parser_processes: int = Config.media_parser_processes(),
+                 cancelled: Callable[[], bool] = None):
 
         self._job_context = job_context
-        self._media_scan_path = media_scan_path
-        self._media_source = os.walk(media_scan_path)
-        self._total_items = sum([len(files) for _, _, files in os.walk(media_scan_path)])
+        self._media_scan_paths = [media_scan_path] if isinstance(media_scan_path, str) else list(media_scan_path)
+        self._executors = DeviceExecutors(workers, mount_concurrency)
+        self._media_sources = [DirectoryWalker(root, executors=self._executors) for root in self._media_scan_paths]
+        self._current_dir: Tuple[str, int] = None
+        self._scanned = [0] * len(self._media_sources)
         self.logger = getLogger(self.__class__.__name__)
         self.skip_filetype_checks = skip_filetype_checks
+        self.sniffer = sniffer if sniffer is not None else FileTypeSniffer()
         self.media_parser = MediaParser()
+        self.batch_parser = BatchMediaParser(parser_processes) if parser_processes > 0 else None
+        self._scan_index = scan_index
+        self._commit_interval = commit_interval
+        self._next_commit = None
+        self._cancelled = cancelled
 
     def media_items_to_scan(self) -> int:
-        return self._total_items
+        """
+        :return: estimated number of media items to scan; exact once the scan is completed
+        """
+        return sum(walker.estimated_total() for walker in self._media_sources)
+
+    def roots_progress(self) -> List[ScanRootProgress]:
+        """
+        :return: progress of every scan root; scanned items include skipped files
+        """
+        return [ScanRootProgress(path=walker.root(),
+                                 current_item=scanned,
+                                 total_items=max(walker.estimated_total(), scanned),
+                                 completed=walker.completed())
+                for walker, scanned in zip(self._media_sources, self._scanned)]
+
+    def _device_of(self, path: str) -> int:
+        # files are consumed lazily, so a file being checked comes from the directory yielded last
+        if self._current_dir is not None and self._current_dir[0] == path:
+            return self._current_dir[1]
+        return os.stat(path).st_dev
+
+    def _files_to_scan(self):
+        """
+        :return: iterator of (path, filename, os.stat_result or None) of files which should be scanned
+        """
+
+        def file_stat(entry):
+            try:
+                return entry.stat()
+            except OSError:
+                return None
+
+        for root, current_dir_name, entry, device in walk_all(self._media_sources, self._executors):
+            if self._cancelled is not None and self._cancelled():
+                self.logger.info(f'Scan job {self._job_context.id()} cancelled.')
+                return
+
+            self._scanned[root] += 1
+            self._current_dir = (current_dir_name, device)
+            f = entry.name
+            stat = file_stat(entry) if self._scan_index is not None else None
+
+            if stat is not None and self._scan_index.is_unchanged(current_dir_name, f, stat):
+                self.logger.debug(f'File {f} did not change since the last scan. Skipping.')
+                continue
+
+            linked = self._scan_index.linked_to(current_dir_name, f, stat) if stat is not None else None
+            if linked is not None:
+                self.logger.debug(f'File {f} is a hard link of already matched {os.path.join(*linked)}. '
+                                  f'Skipping.')
+                self._record(current_dir_name, f, stat, ScanOutcome.LINKED)
+                continue
+
+            yield current_dir_name, f, stat
+
+    def _record(self, path: str, filename: str, stat, outcome: ScanOutcome):
+        """
+        Records an outcome of a file the scanner itself is done with (it is not passed to observers).
+        """
+        if self._scan_index is not None:
+            self._scan_index.record(path, filename, stat, outcome, job_id=self._job_context.id())
+            self._commit_periodically()
+
+    def _commit_periodically(self):
+        """
+        Commits outcomes recorded by the scanner itself once in a while, so that an interrupted scan does not
+        process those files again.
+        """
+        if time.monotonic() >= self._next_commit:
+            db.session.commit()
+            self._scan_index.committed()
+            self._next_commit = time.monotonic() + self._commit_interval
+
+    def _parsed(self, files):
+        """
+        :param files: iterator of (path, filename, os.stat_result or None, supported)
+        :return: iterator of (path, filename, os.stat_result or None, supported, parse), where parse returns
+                 a result of MediaParser.parse of a supported file
+        """
+        if self.batch_parser is None:
+            for path, f, stat, supported in files:
+                yield path, f, stat, supported, partial(self.media_parser.parse, f)
+            return
+
+        for chunk, columns in self.batch_parser.parse_chunks(files, filename=lambda file: file[1] if file[3] else None):
+            for index, (path, f, stat, supported) in enumerate(chunk):
+                yield path, f, stat, supported, partial(columns.row, index)
 
     def __call__(self, observer: rx.Observer):
 
-        def is_supported_filetype(path, file):
+        self.logger.info(f"Starting scan job: {self._job_context.id()} for folders: {self._media_scan_paths}")
+
+        if self.skip_filetype_checks:
+            files = ((path, f, stat, True) for path, f, stat in self._files_to_scan())
+        else:
+            files = self.sniffer.sniff_all(self._files_to_scan(), device_of=self._device_of,
+                                           executors=self._executors)
+
+        self._next_commit = time.monotonic() + self._commit_interval
+
+        for current_dir_name, f, stat, supported, parse in self._parsed(files):
+
+            if not supported:
+                self.logger.info(f'File {f} is not supported by this scanner. Skipping.')
+                self._record(current_dir_name, f, stat, ScanOutcome.UNSUPPORTED)
+                continue
+
+            # a name which fails to parse fails only its own item, the scan goes on
+            # noinspection PyBroadException
+            try:
+                self.logger.debug(f"Processing {f}...")
+                media = to_parsed_media_item(path=current_dir_name, filename=f,
+                                             parsed=parse())
+                media.file_stat = stat
+            except BaseException:
+                self.logger.warning(f"Cannot parse {os.path.join(current_dir_name, f)}. Skipping. "
+                                    f"{traceback.format_exc()}")
+                self._record(current_dir_name, f, stat, ScanOutcome.IGNORED)
+                continue
+
             # noinspection PyBroadException
             try:
-                f = os.path.join(path, file)
-                self.logger.debug(f"Checking if {f} is supported by this scanner...")
-                return filetype.video(f) is not None
-            except:
-                return False
-
-        self.logger.info(f"Starting scan job: {self._job_context.id()} for a folder: {self._media_scan_path}")
-
-        for current_dir_name, subdirectories, files in self._media_source:
-            for f in files:
-
-                media = self.media_parser.parse(f)
-
-                # noinspection PyBroadException
-                try:
-                    if not self.skip_filetype_checks and \
-                            not is_supported_filetype(current_dir_name, f):
-                        self.logger.info(f'File {f} is not supported by this scanner. Skipping.')
-                    else:
-                        self.logger.debug(f"Processing {f}...")
-                        media = ParsedMediaItem(filename=f,
-                                                path=current_dir_name,
-                                                audio=media.get("audio"),
-                                                codec=media.get("codec"),
-                                                container=media.get("container"),
-                                                episode=media.get("episode"),
-                                                episodeName=media.get("episodeName"),
-                                                garbage=media.get("garbage"),
-                                                group=media.get("group"),
-                                                hardcoded=media.get("hardcoded"),
-                                                language=media.get("language"),
-                                                proper=media.get("proper"),
-                                                quality=media.get("quality"),
-                                                region=media.get("region"),
-                                                repack=media.get("repack"),
-                                                resolution=media.get("resolution"),
-                                                season=media.get("season"),
-                                                title=media.get("title"),
-                                                website=media.get("website"),
-                                                widescreen=media.get("widescreen"),
-                                                year=media.get("year"))
-
-                        observer.on_next(media)
-
-                except BaseException as e:
-                    self.logger("FileSystemMediaScanner caught exception", traceback.format_exc())
-                    observer.on_error(e)
-
-        self.logger.info(f"Completed file scan job: {self._job_context.id()} for a folder {self._media_scan_path}")
+                observer.on_next(media)
+            except BaseException as e:
+                self.logger.warning(f"FileSystemMediaScanner caught exception: {traceback.format_exc()}")
+                observer.on_error(e)
+
+        self._executors.shutdown()
+
+        if self._scan_index is not None:
+            # persist outcomes recorded by the scanner itself (unsupported and linked files)
+            db.session.commit()
+            self._scan_index.committed()
+
+        self.logger.info(f"Completed file scan job: {self._job_context.id()} for folders {self._media_scan_paths}")
         observer.on_completed()
 
 
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+import traceback
+from typing import List, Union
+
+import rx
+
+from banana.core import JobContext, Config, getLogger
+from banana.media.filetypes import FileTypeSniffer
+from banana.media.observables.mediascanner import to_parsed_media_item
+from banana.media.p import MediaParser
+from banana.media.scanindex import ScanIndex
+from banana.media.watcher import Inotify, InotifyUnavailable, WatchEvent, WatchEventType, \
+    IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE, IN_Q_OVERFLOW
+
+
+class FileSystemMediaWatcher(object):
+    """
+    A callable here, which is transformed to rx.Observable with Observable.create factory method.
+
+    It watches given directories (with inotify) and feeds Observers with WatchEvents as files are created, moved
+    or deleted. Created files are debounced: a file is emitted (with a parsed media item) only after there were no
+    changes to it for a given number of seconds, so files which are still being written are not matched too early.
+
+    A file (or directory) moved within watched roots is reported by a pair of events, which may come in separate
+    reads; one moved away without a pair within move_timeout seconds (or until the watch stops) is reported
+    as DELETED.
+
+    If events overflow, it emits RESCAN event so that an incremental scan can pick up whatever was lost. If inotify
+    is not available at all, it falls back to RESCAN events emitted periodically. RESCAN is emitted at start as well,
+    to pick up changes made while we were not watching.
+    """
+
+    def __init__(self,
+                 job_context: JobContext,
+                 media_watch_path: Union[str, List[str]] = Config.media_scan_paths(),
+                 debounce: float = Config.media_watch_debounce(),
+                 rescan_interval: float = Config.media_watch_rescan_interval(),
+                 skip_filetype_checks: bool = Config.media_scanner_skip_filetype_checks(),
+                 scan_index: ScanIndex = None,
+                 poll_interval: float = 1.0,
+                 move_timeout: float = 0.5,
+                 sniffer: FileTypeSniffer = None):
+        self._job_context = job_context
+        self._media_watch_paths = [media_watch_path] if isinstance(media_watch_path, str) else list(media_watch_path)
+        self._debounce = debounce
+        self._rescan_interval = rescan_interval
+        self._poll_interval = poll_interval
+        self._move_timeout = move_timeout
+        self.skip_filetype_checks = skip_filetype_checks
+        self.sniffer = sniffer if sniffer is not None else FileTypeSniffer()
+        self._scan_index = scan_index
+        self._stopped = threading.Event()
+        self.media_parser = MediaParser()
+        self.logger = getLogger(self.__class__.__name__)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _created(self, path: str, filename: str):
+        try:
+            stat = os.stat(os.path.join(path, filename))
+        except OSError:
+            self.logger.debug(f'File {filename} does not exist anymore. Skipping.')
+            return None
+
+        if self._scan_index is not None and self._scan_index.is_unchanged(path, filename, stat):
+            self.logger.debug(f'File {filename} is already indexed. Skipping.')
+            return None
+
+        linked = self._scan_index.linked_to(path, filename, stat) if self._scan_index is not None else None
+        if linked is not None:
+            self.logger.info(f'File {filename} is a hard link of already matched {os.path.join(*linked)}. Skipping.')
+            return None
+
+        if not self.skip_filetype_checks and not self.sniffer.is_supported(path, filename, stat):
+            self.logger.info(f'File {filename} is not supported by this scanner. Skipping.')
+            return None
+
+        media = to_parsed_media_item(path=path, filename=filename, parsed=self.media_parser.parse(filename))
+        media.file_stat = stat
+        return WatchEvent(WatchEventType.CREATED, path=path, filename=filename, media=media)
+
+    def _watch(self, inotify: Inotify, observer: rx.Observer):
+        pending = {}
+        # cookie: (path, filename, deadline) of files moved from, not paired with their moved to yet
+        moved_from = {}
+
+        def debounce(path, filename):
+            pending[(path, filename)] = time.monotonic() + self._debounce
+
+        def debounce_tree(directory):
+            for current_dir, _, files in os.walk(directory):
+                for f in files:
+                    debounce(current_dir, f)
+
+        def forget_pending(path, filename):
+            if filename is not None:
+                pending.pop((path, filename), None)
+            else:
+                prefix = os.path.join(path, '')
+                for key in [k for k in pending if k[0] == path or k[0].startswith(prefix)]:
+                    del pending[key]
+
+        def moved_away(cookie):
+            path, filename, _ = moved_from.pop(cookie)
+            forget_pending(path, filename)
+            observer.on_next(WatchEvent(WatchEventType.DELETED, path=path, filename=filename))
+
+        while not self._stopped.is_set():
+            timeout = self._poll_interval
+            deadlines = list(pending.values()) + [deadline for _, _, deadline in moved_from.values()]
+            if deadlines:
+                timeout = max(0.0, min(timeout, min(deadlines) - time.monotonic()))
+
+            for e in inotify.read_events(timeout):
+
+                if e.mask & IN_Q_OVERFLOW:
+                    self.logger.warning('Watch events overflowed. Falling back to an incremental scan.')
+                    pending.clear()
+                    observer.on_next(WatchEvent(WatchEventType.RESCAN))
+                    continue
+
+                if e.path is None:
+                    continue
+
+                full_path = os.path.join(e.path, e.name)
+                # for directory events, the directory itself is the path, and there is no filename
+                path, filename = (full_path, None) if e.is_directory() else (e.path, e.name)
+
+                if e.mask & IN_MOVED_FROM:
+                    moved_from[e.cookie] = (path, filename, time.monotonic() + self._move_timeout)
+
+                elif e.mask & IN_MOVED_TO and e.cookie in moved_from:
+                    src_path, src_filename, _ = moved_from.pop(e.cookie)
+                    if filename is None:
+                        inotify.moved_directory(src_path, path)
+                        forget_pending(src_path, None)
+                        debounce_tree(path)
+                    else:
+                        # already known files are moved in the index first, so they won't be matched again
+                        forget_pending(src_path, src_filename)
+                        debounce(path, filename)
+                    observer.on_next(WatchEvent(WatchEventType.MOVED, path=src_path, filename=src_filename,
+                                                dest_path=path, dest_filename=filename))
+
+                elif e.mask & (IN_MOVED_TO | IN_CREATE) and filename is None:
+                    inotify.watch_tree(path)
+                    debounce_tree(path)
+
+                elif e.mask & IN_DELETE:
+                    forget_pending(path, filename)
+                    observer.on_next(WatchEvent(WatchEventType.DELETED, path=path, filename=filename))
+
+                elif filename is not None:
+                    debounce(path, filename)
+
+            now = time.monotonic()
+            # moved out of the watched tree
+            for cookie in [c for c, (_, _, deadline) in moved_from.items() if deadline <= now]:
+                moved_away(cookie)
+
+            for key in [k for k, deadline in pending.items() if deadline <= now]:
+                del pending[key]
+                event = self._created(*key)
+                if event is not None:
+                    observer.on_next(event)
+
+        for cookie in list(moved_from):
+            moved_away(cookie)
+
+    def __call__(self, observer: rx.Observer):
+        self.logger.info(f"Starting watch job: {self._job_context.id()} for folders: {self._media_watch_paths}")
+
+        try:
+            inotify = Inotify()
+        except InotifyUnavailable as e:
+            self.logger.warning(f'{e}. Falling back to periodic incremental scans.')
+            inotify = None
+
+        # noinspection PyBroadException
+        try:
+            observer.on_next(WatchEvent(WatchEventType.RESCAN))
+
+            if inotify is None:
+                while not self._stopped.wait(self._rescan_interval):
+                    observer.on_next(WatchEvent(WatchEventType.RESCAN))
+            else:
+                for root in self._media_watch_paths:
+                    inotify.watch_tree(root)
+                self._watch(inotify, observer)
+
+        except BaseException as e:
+            self.logger.warning(f"FileSystemMediaWatcher caught exception: {traceback.format_exc()}")
+            observer.on_error(e)
+            return
+
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+        self.logger.info(f"Completed watch job: {self._job_context.id()} for folders {self._media_watch_paths}")
+        observer.on_completed()
@@ -3,6 +3,7 @@ from typing import Tuple
 import rx
 
 from banana.core import socket as web_socket, getLogger
+from banana.core.metrics import metrics, summary, difference
 from banana.core.jobs import JobContext
 from banana.events import JobProgressEvent, JobCompletedEvent, JobErrorEvent
 from banana.media.item import ParsedMediaItem
@@ -23,11 +24,17 @@ class EmitEventMixin(object):
 
 # noinspection PyBroadException
 class MediaScannerCompletedOrErrorEventObserver(EmitEventMixin, rx.Observer):
+    """
+    Emits JobCompletedEvent, with a summary of metrics (matcher and source latencies, cache hits) recorded since
+    the observer was created, or JobErrorEvent. Metrics are process wide, so a summary of a job includes work
+    of jobs which ran at the same time.
+    """
 
     def __init__(self, job_context: JobContext, socket=web_socket):
         super().__init__()
         self._job_context = job_context
         self._socket = socket
+        self._metrics_at_start = metrics.snapshot()
         self.logger = getLogger(self.__class__.__name__)
 
     def on_next(self, value):
@@ -35,8 +42,11 @@ class MediaScannerCompletedOrErrorEventObserver(EmitEventMixin, rx.Observer):
 
     def on_completed(self):
         try:
+            job_summary = summary(difference(metrics.snapshot(), self._metrics_at_start))
+            self.logger.info(f'Job {self._job_context.id()} completed: {job_summary}')
             self.emit(self._socket,
-                      JobCompletedEvent(job_id=self._job_context.id(), job_type=self._job_context.type())
+                      JobCompletedEvent(job_id=self._job_context.id(), job_type=self._job_context.type(),
+                                        summary=job_summary)
                       )
 
         except BaseException as e:
@@ -55,23 +65,31 @@ class MediaScannerCompletedOrErrorEventObserver(EmitEventMixin, rx.Observer):
 
 # noinspection PyBroadException
 class MediaScannerProgressEventObserver(EmitEventMixin, rx.Observer):
+    """
+    Emits JobProgressEvent for every scanned media item. Total items may be either a number, or a callable
+    returning a running estimate (the scanner does not know the total number of items upfront). If roots_progress
+    callable is given, progress of every scan root is emitted as well.
+    """
 
-    def __init__(self, job_context: JobContext, socket=web_socket, total_items=None):
+    def __init__(self, job_context: JobContext, socket=web_socket, total_items=None, roots_progress=None):
         super().__init__()
         self._job_context = job_context
         self._socket = socket
         self._total_items = total_items
+        self._roots_progress = roots_progress
         self.logger = getLogger(self.__class__.__name__)
 
     def on_next(self, index_and_media: Tuple[int, ParsedMediaItem]):
         try:
             index, media = index_and_media
+            total_items = self._total_items() if callable(self._total_items) else self._total_items
             self.emit(self._socket,
                       JobProgressEvent(job_id=self._job_context.id(),
                                        job_type=self._job_context.type(),
                                        context=media.filename,
-                                       total_items=self._total_items,
-                                       current_item=index)
+                                       total_items=max(total_items, index) if total_items is not None else None,
+                                       current_item=index,
+                                       roots=self._roots_progress() if self._roots_progress is not None else None)
                       )
         except BaseException as e:
             self.logger.warning("Exception caught while emitting JobProgressEvent: {}".format(e))
@@ -1,5 +1,6 @@
 import traceback
-from typing import Tuple
+from functools import partial
+from typing import Callable, List, Tuple
 
 import rx
 from funcy import none
@@ -8,10 +9,15 @@ from whatever import _
 from banana.core import Config, socket as web_socket
 from banana.core import db, getLogger
 from banana.core.jobs import JobContext
-from banana.media.item import ParsedMediaItem
+from banana.core.metrics import metrics
+from banana.media.item import ParsedMediaItem, ProcessedMediaItems
 from banana.media.model import UnmatchedItem
+from banana.media.nameformatter import NameFormatter
+from banana.media.scanindex import ScanIndex, ScanOutcome, in_directory, moved_path
 from banana.media.observers import EmitEventMixin, JobErrorEvent
-from banana.media.targets import get_media_target_resolver, MediaTargetResolver
+from banana.media.targets import get_media_target_resolver, MediaTargetResolver, get_media_target_builder, \
+    MediaTargetBuilder
+from banana.media.watcher import WatchEvent, WatchEventType
 from banana.movies.commands import match_movie
 from banana.movies.matchdecider import MatchType, MatchDecider
 from banana.movies.matcher import get_matcher, Matcher
@@ -24,14 +30,28 @@ class MediaItemMatchingObserver(rx.Observer):
                  job_context: JobContext,
                  resolver: MediaTargetResolver = get_media_target_resolver(Config.media_target_resolver()),
                  matcher: Matcher = get_matcher(Config.media_matcher()),
-                 decider: MatchDecider = MatchDecider()
+                 decider: MatchDecider = MatchDecider(),
+                 scan_index: ScanIndex = None,
+                 processed_items: ProcessedMediaItems = None
                  ):
         self._job_context = job_context
         self.matcher = matcher
         self.decider = decider
         self.resolver = resolver
+        self._scan_index = scan_index
+        self._processed_items = processed_items
         self.logger = getLogger(self.__class__.__name__)
 
+    def _record(self, media: ParsedMediaItem, outcome: ScanOutcome):
+        if self._scan_index is not None:
+            self._scan_index.record(media.path, media.filename, media.file_stat, outcome,
+                                    job_id=self._job_context.id())
+
+    def _commit(self):
+        db.session.commit()
+        if self._scan_index is not None:
+            self._scan_index.committed()
+
     def on_next(self, index_and_media: Tuple[int, ParsedMediaItem]):
         # noinspection PyBroadException
         try:
@@ -42,16 +62,29 @@ class MediaItemMatchingObserver(rx.Observer):
 
             if not media.is_movie():
                 self.logger.info("{} not a movie. Skipping.".format(media.filename))
+                self._record(media, ScanOutcome.IGNORED)
+                self._commit()
                 return
 
-            already_matched = media.already_matched()
+            if self._processed_items is not None:
+                if self._processed_items.is_processed(media.path, media.filename):
+                    self.logger.info("Media item {} already processed. Skipping.".format(media.absolute_path()))
+                    matched = self._processed_items.is_matched(media.path, media.filename)
+                    self._record(media, ScanOutcome.MATCHED if matched else ScanOutcome.UNMATCHED)
+                    self._commit()
+                    return
+            else:
+                already_matched = media.already_matched()
 
-            if already_matched:
-                self.logger.info("Media item {} already matched to {}. Skipping.".format(
-                    already_matched.absolute_path(), already_matched.absolute_target_path()))
-                return
+                if already_matched:
+                    self.logger.info("Media item {} already matched to {}. Skipping.".format(
+                        already_matched.absolute_path(), already_matched.absolute_target_path()))
+                    self._record(media, ScanOutcome.MATCHED)
+                    self._commit()
+                    return
 
-            match_result = self.decider.try_match(self.matcher.top5_matches(media))
+            with metrics.timer(f'matcher.{type(self.matcher).__name__}'):
+                match_result = self.decider.try_match(self.matcher.top5_matches(media))
 
             if match_result.match_type() is MatchType.MATCHED:
                 matched_movie = match_result.matched_movie()
@@ -61,24 +94,38 @@ class MediaItemMatchingObserver(rx.Observer):
                 target_media, target = self.resolver.resolve(media=media, movie=matched_movie)
 
                 if not target.can_link():
+                    self._record(media, ScanOutcome.IGNORED)
+                    self._commit()
                     return
 
+                self._record(media, ScanOutcome.MATCHED)
                 match_movie(media=target_media,
                             movie=matched_movie,
                             target=target)
+                matched = True
 
             else:
+                for candidate in match_result.potential_matches():
+                    candidate.genres = candidate.named_genres()
                 media.unmatched = UnmatchedItem(potential_matches=match_result.potential_matches(),
                                                 non_match_reason=match_result.reason())
 
                 db.session.add(media)
+                self._record(media, ScanOutcome.UNMATCHED)
+                matched = False
 
-            db.session.commit()
+            with metrics.timer('matching.db_commit'):
+                self._commit()
+
+            if self._processed_items is not None:
+                self._processed_items.add(media.path, media.filename, matched=matched)
 
         except BaseException:
             self.logger.warning("Exception caught while processing media item: {}"
                                 .format(traceback.format_exc()))
             db.session.rollback()
+            if self._scan_index is not None:
+                self._scan_index.rolled_back()
 
     def on_completed(self):
         pass
@@ -87,6 +134,119 @@ class MediaItemMatchingObserver(rx.Observer):
         self.logger.warn("Matching observer caught exception: {}".format(traceback.format_exc()))
 
 
+class MediaItemChangesObserver(rx.Observer):
+    """
+    Propagates deleted and moved files, reported by FileSystemMediaWatcher, to parsed media items, their
+    targets and the scan index.
+
+    When a source file is deleted, its target link is removed together with the parsed media item (and the movie,
+    if it was the only media item of that movie). When it is moved, the parsed media item just follows it: the target
+    is a hard link, so it does not care.
+    """
+
+    def __init__(self,
+                 job_context: JobContext,
+                 target_builder: MediaTargetBuilder = get_media_target_builder(Config.media_target()),
+                 formatter: NameFormatter = NameFormatter(),
+                 scan_index: ScanIndex = None,
+                 processed_items: ProcessedMediaItems = None):
+        self._job_context = job_context
+        self.target_builder = target_builder
+        self.formatter = formatter
+        self._scan_index = scan_index
+        self._processed_items = processed_items
+        self.logger = getLogger(self.__class__.__name__)
+
+    @staticmethod
+    def _media_items(path: str, filename: str):
+        if filename is None:
+            return ParsedMediaItem.query.filter(in_directory(ParsedMediaItem.path, path)).all()
+        return ParsedMediaItem.query.filter_by(path=path, filename=filename).all()
+
+    def _deleted(self, event: WatchEvent) -> List[Callable[[], None]]:
+        after_commit = []
+        media_items = self._media_items(event.path, event.filename)
+        deleted_ids = {media.id for media in media_items}
+        deleted_movies = set()
+
+        for media in media_items:
+            movie = media.matched_movie
+
+            if movie and media.already_linked():
+                target_path = media.absolute_target_path()
+                self.logger.info(f'Media item {media.absolute_path()} deleted. Unlinking {target_path}.')
+                target = self.target_builder.build(media=media, movie=movie, formatter=self.formatter)
+                after_commit.append(partial(target.do_unlink, target_path))
+
+            # if we are removing the last media items of a movie, we remove whole movie altogether
+            if movie and movie.id not in deleted_movies and all(m.id in deleted_ids for m in movie.media_items):
+                deleted_movies.add(movie.id)
+                db.session.delete(movie)
+
+            db.session.delete(media)
+
+        if self._scan_index is not None:
+            self._scan_index.forget(event.path, event.filename)
+        if self._processed_items is not None:
+            after_commit.append(partial(self._processed_items.discard, event.path, event.filename))
+        return after_commit
+
+    def _moved(self, event: WatchEvent) -> List[Callable[[], None]]:
+        after_commit = []
+        if self._processed_items is not None:
+            after_commit.append(partial(self._processed_items.discard, event.path, event.filename))
+
+        for media in self._media_items(event.path, event.filename):
+            self.logger.info(f'Media item {media.absolute_path()} moved to {event.dest_path}.')
+            if event.filename is None:
+                media.path = moved_path(media.path, event.path, event.dest_path)
+            else:
+                media.path = event.dest_path
+                media.filename = event.dest_filename
+
+            if self._processed_items is not None:
+                after_commit.append(partial(self._processed_items.add, media.path, media.filename,
+                                            matched=media.matched_movie_id is not None))
+
+        if self._scan_index is not None:
+            self._scan_index.move(event.path, event.filename, event.dest_path, event.dest_filename)
+        return after_commit
+
+    def on_next(self, event: WatchEvent):
+        after_commit = []
+        # noinspection PyBroadException
+        try:
+            if event.event_type is WatchEventType.DELETED:
+                after_commit = self._deleted(event)
+            elif event.event_type is WatchEventType.MOVED:
+                after_commit = self._moved(event)
+
+            db.session.commit()
+            if self._scan_index is not None:
+                self._scan_index.committed()
+
+        except BaseException:
+            self.logger.warning("Exception caught while processing {}: {}".format(event, traceback.format_exc()))
+            db.session.rollback()
+            if self._scan_index is not None:
+                self._scan_index.rolled_back()
+            return
+
+        # links are removed (and in-memory views changed) only once the database does not know them anymore
+        for action in after_commit:
+            # noinspection PyBroadException
+            try:
+                action()
+            except BaseException:
+                self.logger.warning("Exception caught while processing {}: {}".format(event, traceback.format_exc()))
+
+    def on_completed(self):
+        pass
+
+    def on_error(self, error):
+        self.logger.warning('MediaItemChangesObserver on_error: {}'.format(error))
+
+
 class ManualMediaItemMatchingObserver(EmitEventMixin, rx.Observer):
 
     def __init__(self,
@@ -43,21 +43,41 @@ types = {
     'hdr': 'boolean'
 }
 
-class MediaParser(object):
+# compiled once, at import; all but season, episode and website have to match whole words
+_compiled_patterns = [
+    (key, re.compile(pattern if key in ('season', 'episode', 'website') else r'\b%s\b' % pattern, re.I))
+    for key, pattern in patterns
+]
 
-    def _escape_regex(self, string):
-        return re.sub('[\-\[\]{}()*+?.,\\\^$|#\s]', '\\$&', string)
-    
-    def __init__(self):
-        self.torrent = None
-        self.excess_raw = None
-        self.group_raw = None
-        self.start = None
+_underscore = re.compile('_')
+_escape = re.compile('[\-\[\]{}()*+?.,\\\^$|#\s]')
+_group_codec = re.compile(patterns[5][1], re.I)
+_group_quality = re.compile(patterns[4][1])
+_episode_name = re.compile('[^ ]+ [^ ]+ .+')
+_episode_name_separators = re.compile('[\._]')
+_trailing_underscores = re.compile('_+$')
+_title_leading_dash = re.compile('^ -')
+_title_dot = re.compile('\.')
+_title_trailing = re.compile('([\[\(_]|- )$')
+_excess_trim = re.compile('(^[-\. ()]+)|([-\. ]+$)')
+_excess_brackets = re.compile('[\(\)\/]')
+_excess_split = re.compile('\.\.+| +')
+
+
+class _ParseState(object):
+    """
+    State of a single MediaParser.parse call.
+    """
+
+    def __init__(self, name):
+        self.parts = {}
+        self.torrent = {'name': name}
+        self.excess_raw = name
+        self.group_raw = ''
+        self.start = 0
         self.end = None
-        self.title_raw = None
-        self.parts = None
 
-    def _part(self, name, match, raw, clean):
+    def part(self, name, match, raw, clean):
         # The main core instructuions
         self.parts[name] = clean
 
@@ -76,29 +96,30 @@ class MediaParser(object):
             if raw is not None:
                 self.excess_raw = self.excess_raw.replace(raw, '')
 
-    def _late(self, name, clean):
+    def late(self, name, clean):
         if name == 'group':
-            self._part(name, [], None, clean)
+            self.part(name, [], None, clean)
         elif name == 'episodeName':
-            clean = re.sub('[\._]', ' ', clean)
-            clean = re.sub('_+$', '', clean)
-            self._part(name, [], None, clean.strip())
+            clean = _episode_name_separators.sub(' ', clean)
+            clean = _trailing_underscores.sub('', clean)
+            self.part(name, [], None, clean.strip())
 
-    def parse(self, name):
-        self.parts = {}
-        self.torrent = {'name': name}
-        self.excess_raw = name
-        self.group_raw = ''
-        self.start = 0
-        self.end = None
-        self.title_raw = None
 
-        for key, pattern in patterns:
-            if key not in ('season', 'episode', 'website'):
-                pattern = r'\b%s\b' % pattern
+class MediaParser(object):
+    """
+    Parses media (torrent-like) file names. Patterns are compiled once per process and every parse call keeps
+    its state to itself, so a single MediaParser can be shared by threads (and pickled to worker processes).
+    """
+
+    def _escape_regex(self, string):
+        return _escape.sub('\\$&', string)
 
-            clean_name = re.sub('_', ' ', self.torrent['name'])
-            match = re.findall(pattern, clean_name, re.I)
+    def parse(self, name):
+        state = _ParseState(name)
+        clean_name = _underscore.sub(' ', name)
+
+        for key, pattern in _compiled_patterns:
+            match = pattern.findall(clean_name)
             if len(match) == 0:
                 continue
 
@@ -119,35 +140,34 @@ class MediaParser(object):
                 if key in types.keys() and types[key] == 'integer':
                     clean = int(clean)
             if key == 'group':
-                if re.search(patterns[5][1], clean, re.I) \
-                        or re.search(patterns[4][1], clean):
+                if _group_codec.search(clean) or _group_quality.search(clean):
                     continue  # Codec and quality.
-                if re.match('[^ ]+ [^ ]+ .+', clean):
+                if _episode_name.match(clean):
                     key = 'episodeName'
             if key == 'episode':
                 sub_pattern = self._escape_regex(match[index['raw']])
-                self.torrent['map'] = re.sub(
-                    sub_pattern, '{episode}', self.torrent['name']
+                state.torrent['map'] = re.sub(
+                    sub_pattern, '{episode}', state.torrent['name']
                 )
-            self._part(key, match, match[index['raw']], clean)
+            state.part(key, match, match[index['raw']], clean)
 
         # Start process for title
-        raw = self.torrent['name']
-        if self.end is not None:
-            raw = raw[self.start:self.end].split('(')[0]
+        raw = state.torrent['name']
+        if state.end is not None:
+            raw = raw[state.start:state.end].split('(')[0]
 
-        clean = re.sub('^ -', '', raw)
+        clean = _title_leading_dash.sub('', raw)
         if clean.find(' ') == -1 and clean.find('.') != -1:
-            clean = re.sub('\.', ' ', clean)
-        clean = re.sub('_', ' ', clean)
-        clean = re.sub('([\[\(_]|- )$', '', clean).strip()
+            clean = _title_dot.sub(' ', clean)
+        clean = _underscore.sub(' ', clean)
+        clean = _title_trailing.sub('', clean).strip()
 
-        self._part('title', [], raw, clean)
+        state.part('title', [], raw, clean)
 
         # Start process for end
-        clean = re.sub('(^[-\. ()]+)|([-\. ]+$)', '', self.excess_raw)
-        clean = re.sub('[\(\)\/]', ' ', clean)
-        match = re.split('\.\.+| +', clean)
+        clean = _excess_trim.sub('', state.excess_raw)
+        clean = _excess_brackets.sub(' ', clean)
+        match = _excess_split.split(clean)
         if len(match) > 0 and isinstance(match[0], tuple):
             match = list(match[0])
 
@@ -155,25 +175,25 @@ class MediaParser(object):
         clean = [item for item in filter(lambda a: a != '-', clean)]
         clean = [item.strip('-') for item in clean]
         if len(clean) != 0:
-            group_pattern = clean[-1] + self.group_raw
-            if self.torrent['name'].find(group_pattern) == \
-                    len(self.torrent['name']) - len(group_pattern):
-                self._late('group', clean.pop() + self.group_raw)
+            group_pattern = clean[-1] + state.group_raw
+            if state.torrent['name'].find(group_pattern) == \
+                    len(state.torrent['name']) - len(group_pattern):
+                state.late('group', clean.pop() + state.group_raw)
 
-            if 'map' in self.torrent.keys() and len(clean) != 0:
+            if 'map' in state.torrent.keys() and len(clean) != 0:
                 episode_name_pattern = (
                     '{episode}'
-                    '' + re.sub('_+$', '', clean[0])
+                    '' + _trailing_underscores.sub('', clean[0])
                 )
-                if self.torrent['map'].find(episode_name_pattern) != -1:
-                    self._late('episodeName', clean.pop(0))
+                if state.torrent['map'].find(episode_name_pattern) != -1:
+                    state.late('episodeName', clean.pop(0))
 
         if len(clean) != 0:
             if len(clean) == 1:
                 clean = clean[0]
-            self._part('excess', [], self.excess_raw, clean)
-        
-        return self.parts
+            state.part('excess', [], state.excess_raw, clean)
+
+        return state.parts
 
 
 if __name__=="__main__":
@@ -0,0 +1,231 @@
+import os
+import queue
+import threading
+import traceback
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import rx
+from marshmallow import Schema, fields
+from marshmallow_enum import EnumField
+
+from banana.core import Config, JsonMixin, getLogger
+from banana.core.httpcache import read_only
+from banana.core.jobs import JobContext
+from banana.media.item import ParsedMediaItem, ProcessedMediaItems
+from banana.media.nameformatter import NameFormatter
+from banana.movies.matchdecider import MatchDecider, MatchType
+from banana.movies.matcher import Matcher, get_matcher
+from banana.movies.model import MovieMatchCandidate
+
+
+class PlanOutcome(Enum):
+    MATCHED = 1
+    UNMATCHED = 2
+    IGNORED = 3
+    ALREADY_PROCESSED = 4
+    ERROR = 5
+
+
+class PlannedCandidateSchema(Schema):
+    title = fields.String(missing=None)
+    release_year = fields.Integer(missing=None)
+    match = fields.Integer(missing=None)
+    source = fields.String(missing=None)
+    external_id = fields.String(missing=None)
+
+
+class MatchPlanSchema(Schema):
+    path = fields.String(required=True)
+    filename = fields.String(required=True)
+    title = fields.String(missing=None)
+    year = fields.String(missing=None)
+    outcome = EnumField(PlanOutcome)
+    score = fields.Integer(missing=None)
+    movie = fields.Nested(PlannedCandidateSchema, missing=None)
+    target = fields.String(missing=None)
+    conflicts = fields.List(fields.String())
+    reason = fields.String(missing=None)
+    candidates = fields.Nested(PlannedCandidateSchema, many=True)
+
+
+@dataclass
+class MatchPlan(JsonMixin):
+    """
+    What a scan would do with a single file: a proposed movie (the best candidate) with its score,
+    a target path, and conflicts which would prevent (or spoil) linking it.
+    """
+    path: str
+    filename: str
+    title: str = None
+    year: str = None
+    outcome: PlanOutcome = None
+    score: int = None
+    movie: MovieMatchCandidate = None
+    target: str = None
+    conflicts: List[str] = field(default_factory=list)
+    reason: str = None
+    candidates: List[MovieMatchCandidate] = field(default_factory=list)
+
+    @classmethod
+    def schema(cls) -> Schema:
+        return MatchPlanSchema()
+
+
+class MatchPlanner(object):
+    """
+    Parses, matches and resolves a target of media items, the same way MediaItemMatchingObserver does, but without
+    any DB writes, and without linking anything. Sources are still queried; caches of the matcher (candidates, id
+    map) and of source responses are read, but not written (see Matcher.read_only and httpcache.read_only).
+    Already processed media items are read (not matched again), if ProcessedMediaItems are given.
+
+    Conflicts reported are: a target which already exists, and a target planned for another file in this plan.
+    """
+
+    def __init__(self,
+                 matcher: Matcher = get_matcher(Config.media_matcher()),
+                 decider: MatchDecider = MatchDecider(),
+                 formatter: NameFormatter = NameFormatter(),
+                 processed_items: ProcessedMediaItems = None):
+        self.matcher = matcher.read_only()
+        self.decider = decider
+        self.formatter = formatter
+        self._processed_items = processed_items
+        self._planned_targets: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _conflicts(self, media: ParsedMediaItem, target: str) -> List[str]:
+        conflicts = []
+        if os.path.isfile(target):
+            conflicts.append(f'target {target} already exists')
+
+        with self._lock:
+            planned = self._planned_targets.setdefault(target, media.absolute_path())
+        if planned != media.absolute_path():
+            conflicts.append(f'target {target} is already planned for {planned}')
+        return conflicts
+
+    def plan(self, media: ParsedMediaItem) -> MatchPlan:
+        """
+        :param media: a (transient) parsed media item
+        :return: MatchPlan of the media item
+        """
+        plan = MatchPlan(path=media.path, filename=media.filename, title=media.title,
+                         year=str(media.year) if media.year is not None else None)
+
+        if not media.is_movie():
+            plan.outcome = PlanOutcome.IGNORED
+            plan.reason = 'not a movie'
+            return plan
+
+        if self._processed_items is not None and self._processed_items.is_processed(media.path, media.filename):
+            plan.outcome = PlanOutcome.ALREADY_PROCESSED
+            return plan
+
+        with read_only():
+            match_result = self.decider.try_match(self.matcher.top5_matches(media))
+        plan.candidates = match_result.potential_matches()
+        plan.score = max((c.match for c in plan.candidates if c.match is not None), default=None)
+
+        if match_result.match_type() is MatchType.MATCHED:
+            plan.outcome = PlanOutcome.MATCHED
+            plan.movie = plan.candidates[0]
+            plan.target = self.formatter.format(match_result.matched_movie(), media)
+            plan.conflicts = self._conflicts(media, plan.target)
+        else:
+            plan.outcome = PlanOutcome.UNMATCHED
+            plan.reason = match_result.reason().name
+
+        return plan
+
+
+class MatchPlanObserver(rx.Observer):
+    """
+    Writes a MatchPlan of every scanned media item as a single JSON line (JSONL) to a text output, which is flushed
+    after every line, so the plan can be followed while it is being made. The output is closed when scan completes.
+
+    If the output can be cancelled (see StreamedPlanOutput), media items scanned after it was cancelled are not
+    planned anymore.
+    """
+
+    def __init__(self, job_context: JobContext, output, planner: MatchPlanner = None):
+        self._job_context = job_context
+        self._output = output
+        self.planner = planner if planner is not None else MatchPlanner()
+        self.logger = getLogger(self.__class__.__name__)
+
+    def _write(self, plan: MatchPlan):
+        self._output.write(plan.to_json() + '\n')
+        self._output.flush()
+
+    def cancelled(self) -> bool:
+        cancelled = getattr(self._output, 'cancelled', None)
+        return cancelled is not None and cancelled()
+
+    def on_next(self, index_and_media: Tuple[int, ParsedMediaItem]):
+        _, media = index_and_media
+        if self.cancelled():
+            return
+        # noinspection PyBroadException
+        try:
+            plan = self.planner.plan(media)
+        except BaseException as e:
+            self.logger.warning(f"Exception caught while planning media item: {traceback.format_exc()}")
+            plan = MatchPlan(path=media.path, filename=media.filename, title=media.title,
+                             outcome=PlanOutcome.ERROR, reason=str(e))
+        self._write(plan)
+
+    def on_completed(self):
+        self.logger.info(f'Match plan of {self._job_context.id()} completed.')
+        self._output.close()
+
+    def on_error(self, error):
+        self.logger.warning(f'Match plan of {self._job_context.id()} failed: {error}')
+        self._output.close()
+
+
+class StreamedPlanOutput(object):
+    """
+    A text output of MatchPlanObserver, which can be iterated over (from another thread) as lines are written;
+    iteration stops once the output is closed. Used to stream a plan as an HTTP response.
+
+    At most maxsize lines are buffered, writing more waits for the reader. Once the reader stops iterating before
+    the output is closed (like when an HTTP client disconnects), the output is cancelled: writes are dropped, and
+    the plan job stops scanning.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self._lines = queue.Queue(maxsize=maxsize)
+        self._cancelled = threading.Event()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _put(self, line: Optional[str]):
+        while not self._cancelled.is_set():
+            try:
+                self._lines.put(line, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, line: str):
+        self._put(line)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._put(None)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            while True:
+                line = self._lines.get()
+                if line is None:
+                    return
+                yield line
+        except GeneratorExit:
+            self._cancelled.set()
+            raise
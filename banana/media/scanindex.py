@@ -0,0 +1,269 @@
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from banana.core import db, getLogger
+
+logger = getLogger(__name__)
+
+
+class ScanOutcome(Enum):
+    MATCHED = 1
+    UNMATCHED = 2
+    IGNORED = 3
+    UNSUPPORTED = 4
+    # a hard link of an already matched file
+    LINKED = 5
+
+
+@dataclass
+class ScanIndexEntry(db.Model):
+    """
+    Stores a stat signature (size, mtime, inode) of every scanned file together with the outcome of
+    the last scan. Scanner uses it to skip files which did not change since they were last processed.
+
+    Device and inode of matched files are used to recognize hard links (like targets made by
+    HardLinkMediaTargetBuilder) of files which are already matched.
+    """
+    __table_args__ = (db.UniqueConstraint('path', 'filename'),)
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    path: str = db.Column(db.String, nullable=False)
+    filename: str = db.Column(db.String, nullable=False)
+    size: int = db.Column(db.BigInteger)
+    mtime: int = db.Column(db.BigInteger)
+    inode: int = db.Column(db.BigInteger)
+    device: int = db.Column(db.BigInteger)
+    outcome: ScanOutcome = db.Column(db.Enum(ScanOutcome))
+    job_id: str = db.Column(db.String)
+
+    updated_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def stat_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def in_directory(path_column, directory: str):
+    """
+    SQL criterion matching paths equal to, or nested in a given directory.
+    """
+    return or_(path_column == directory, path_column.startswith(os.path.join(directory, ''), autoescape=True))
+
+
+def _is_in_directory(path: str, directory: str) -> bool:
+    return path == directory or path.startswith(os.path.join(directory, ''))
+
+
+def moved_path(path: str, directory: str, dest_directory: str) -> str:
+    """
+    Rewrites a path nested in a directory which was moved to dest_directory.
+    """
+    return dest_directory + path[len(directory):]
+
+
+class ScanIndex(object):
+    """
+    In-memory view of the persistent scan index. All entries are loaded lazily with a single query, on the first
+    lookup, so a rescan costs one stat call per file and no database round-trips for files which did not change.
+
+    Recording an outcome (and forgetting or moving files) changes entries in the current database session; it is up
+    to the caller to commit them, together with the rest of the work done for a given file, and to call committed
+    (or rolled_back) afterwards. The in-memory view changes only once the entries are committed, so a file whose
+    processing is rolled back is not skipped (or taken for a matched file) later on. Pending changes are kept per
+    thread, the same way database sessions are.
+
+    If job_id is given, the view is limited to entries recorded by that job. Such an index skips only files
+    already processed by the job, which is what resuming an interrupted, non incremental scan needs.
+
+    The index also keeps (device, inode) of all matched files, regardless of job_id, see linked_to.
+    """
+
+    def __init__(self, job_id: str = None):
+        self._job_id = job_id
+        self._entries: Dict[Tuple[str, str], Tuple[int, int, int]] = None
+        self._matched_inodes: Dict[Tuple[int, int], Tuple[str, str]] = None
+        self._pending = threading.local()
+        self._lock = threading.RLock()
+
+    def _pending_outcomes(self) -> Dict[Tuple[str, str], Tuple[Tuple[int, int, int], int, ScanOutcome]]:
+        pending = getattr(self._pending, 'outcomes', None)
+        if pending is None:
+            pending = self._pending.outcomes = {}
+        return pending
+
+    def _pending_changes(self) -> List[Callable[[], None]]:
+        changes = getattr(self._pending, 'changes', None)
+        if changes is None:
+            changes = self._pending.changes = []
+        return changes
+
+    def _load(self):
+        with self._lock:
+            if self._entries is None:
+                query = db.session.query(ScanIndexEntry.path, ScanIndexEntry.filename,
+                                         ScanIndexEntry.size, ScanIndexEntry.mtime, ScanIndexEntry.inode)
+                if self._job_id is not None:
+                    query = query.filter(ScanIndexEntry.job_id == self._job_id)
+                rows = query.all()
+                self._entries = {(path, filename): (size, mtime, inode)
+                                 for path, filename, size, mtime, inode in rows}
+                logger.info(f'Loaded {len(self._entries)} scan index entries.')
+            return self._entries
+
+    def _load_matched_inodes(self):
+        with self._lock:
+            if self._matched_inodes is None:
+                rows = db.session.query(ScanIndexEntry.device, ScanIndexEntry.inode,
+                                        ScanIndexEntry.path, ScanIndexEntry.filename)\
+                    .filter(ScanIndexEntry.outcome == ScanOutcome.MATCHED,
+                            ScanIndexEntry.device.isnot(None), ScanIndexEntry.inode.isnot(None)).all()
+                self._matched_inodes = {(device, inode): (path, filename) for device, inode, path, filename in rows}
+            return self._matched_inodes
+
+    def _forget_matched_inodes(self, predicate):
+        inodes = self._load_matched_inodes()
+        for key in [k for k, v in inodes.items() if predicate(*v)]:
+            del inodes[key]
+
+    def is_unchanged(self, path: str, filename: str, st: os.stat_result) -> bool:
+        """
+        Checks if a file was already processed and did not change since.
+
+        :param path: a directory of a file
+        :param filename: a file name
+        :param st: current stat of a file
+        :return: True if file is indexed with the same stat signature, False otherwise
+        """
+        if st is None:
+            return False
+        return self._load().get((path, filename)) == stat_signature(st)
+
+    def linked_to(self, path: str, filename: str, st: os.stat_result) -> Optional[Tuple[str, str]]:
+        """
+        Checks if a file is a hard link of an already matched file. Only files with more than one link
+        (st_nlink) are looked up: that is a cheap way to rule out most files, and an inode reused after
+        a matched file was deleted is not mistaken for a link of it.
+
+        :param path: a directory of a file
+        :param filename: a file name
+        :param st: current stat of a file
+        :return: (path, filename) of the matched file sharing the inode, or None
+        """
+        if st is None or st.st_nlink < 2:
+            return None
+        linked = self._load_matched_inodes().get((st.st_dev, st.st_ino))
+        return linked if linked != (path, filename) else None
+
+    def record(self, path: str, filename: str, st: os.stat_result, outcome: ScanOutcome, job_id: str = None):
+        """
+        Records an outcome of processing a file. Files without stat (which we could not stat) are not recorded,
+        so they are always rescanned.
+        """
+        if st is None:
+            return
+
+        size, mtime, inode = signature = stat_signature(st)
+        device = st.st_dev
+        entries = self._load()
+        pending = self._pending_outcomes()
+
+        with self._lock:
+            # a partial view does not know about entries of other jobs
+            if (path, filename) not in entries and (path, filename) not in pending and (
+                    self._job_id is None or ScanIndexEntry.query.filter_by(path=path, filename=filename).count() == 0):
+                db.session.add(ScanIndexEntry(path=path, filename=filename, size=size, mtime=mtime, inode=inode,
+                                              device=device, outcome=outcome, job_id=job_id))
+            else:
+                ScanIndexEntry.query.filter_by(path=path, filename=filename).update(
+                    dict(size=size, mtime=mtime, inode=inode, device=device, outcome=outcome, job_id=job_id,
+                         updated_datetime=datetime.utcnow()))
+        pending[(path, filename)] = (signature, device, outcome)
+        self._pending_changes().append(lambda: self._recorded(path, filename, signature, device, outcome))
+
+    def _recorded(self, path: str, filename: str, signature: Tuple[int, int, int], device: int, outcome: ScanOutcome):
+        entries = self._load()
+        inodes = self._load_matched_inodes()
+        entries[(path, filename)] = signature
+        inode = signature[2]
+        if outcome is ScanOutcome.MATCHED:
+            inodes[(device, inode)] = (path, filename)
+        elif inodes.get((device, inode)) == (path, filename):
+            del inodes[(device, inode)]
+
+    def committed(self):
+        """
+        Applies changes made (by the calling thread) since the last commit or rollback to the in-memory view.
+        Call it once the session they were made in is committed.
+        """
+        changes = self._pending_changes()
+        if not changes:
+            return
+        self._pending.outcomes = {}
+        self._pending.changes = []
+
+        with self._lock:
+            for change in changes:
+                change()
+
+    def rolled_back(self):
+        """
+        Discards changes made (by the calling thread) since the last commit. Call it once the session they
+        were made in is rolled back.
+        """
+        self._pending.outcomes = {}
+        self._pending.changes = []
+
+    def forget(self, path: str, filename: str = None):
+        """
+        Removes a file from the index. If filename is not given, all files in a directory (and its subdirectories)
+        are removed.
+        """
+        if filename is not None:
+            ScanIndexEntry.query.filter_by(path=path, filename=filename).delete()
+        else:
+            ScanIndexEntry.query.filter(in_directory(ScanIndexEntry.path, path)).delete(synchronize_session=False)
+        self._pending_changes().append(lambda: self._forgotten(path, filename))
+
+    def _forgotten(self, path: str, filename: str):
+        entries = self._load()
+        if filename is not None:
+            entries.pop((path, filename), None)
+            self._forget_matched_inodes(lambda p, f: (p, f) == (path, filename))
+        else:
+            for key in [k for k in entries if _is_in_directory(k[0], path)]:
+                del entries[key]
+            self._forget_matched_inodes(lambda p, f: _is_in_directory(p, path))
+
+    def move(self, path: str, filename: str, dest_path: str, dest_filename: str = None):
+        """
+        Moves a file in the index, keeping its signature and outcome (a moved file keeps its inode, size and mtime).
+        If filename is not given, a whole directory is moved to dest_path.
+        """
+        if filename is not None:
+            self.forget(dest_path, dest_filename)
+            ScanIndexEntry.query.filter_by(path=path, filename=filename).update(
+                dict(path=dest_path, filename=dest_filename))
+        else:
+            for entry in ScanIndexEntry.query.filter(in_directory(ScanIndexEntry.path, path)):
+                entry.path = moved_path(entry.path, path, dest_path)
+        self._pending_changes().append(lambda: self._moved(path, filename, dest_path, dest_filename))
+
+    def _moved(self, path: str, filename: str, dest_path: str, dest_filename: str):
+        entries = self._load()
+        inodes = self._load_matched_inodes()
+        if filename is not None:
+            if (path, filename) in entries:
+                entries[(dest_path, dest_filename)] = entries.pop((path, filename))
+            for key in [k for k, v in inodes.items() if v == (path, filename)]:
+                inodes[key] = (dest_path, dest_filename)
+        else:
+            for key in [k for k in entries if _is_in_directory(k[0], path)]:
+                entries[(moved_path(key[0], path, dest_path), key[1])] = entries.pop(key)
+            for key in [k for k, v in inodes.items() if _is_in_directory(v[0], path)]:
+                inodes[key] = (moved_path(inodes[key][0], path, dest_path), inodes[key][1])
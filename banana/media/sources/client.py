@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, Iterable, List, TypeVar
+
+from banana.core import Config, getLogger
+from banana.core.concurrency import io_executor
+from banana.core.httpcache import carry_read_only
+
+logger = getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class SourceClient(object):
+    """
+    Runs calls to media sources (TMDB, IMDb) concurrently, on a bounded executor per source, so that fanning out
+    searches, alternative title lookups or movie updates never runs more than the source's concurrency of them
+    at once, however many matchers (or jobs) fan out at the same time.
+
+    Sources are identified by name (TMDBApi, IMDBApi). Every source is limited to default_concurrency calls,
+    concurrency overrides the limit of given sources; a source limited to a single call runs its calls in
+    the calling thread.
+
+    Calls of a caller running read-only (see httpcache.read_only) run read-only as well.
+
+    Calls run by the client must not fan out through the client again (they could wait for a slot held by their
+    caller); fan out from matchers, and keep calls on the executors to single requests.
+    """
+
+    def __init__(self, concurrency: Dict[str, int] = None, default_concurrency: int = 4):
+        self._concurrency = {name: int(n) for name, n in (concurrency or {}).items()}
+        self._default_concurrency = default_concurrency
+        self._executors: Dict[str, Executor] = {}
+        self._lock = threading.Lock()
+
+    def concurrency(self, source: str) -> int:
+        return self._concurrency.get(source, self._default_concurrency)
+
+    def _executor(self, source: str) -> Executor:
+        with self._lock:
+            executor = self._executors.get(source)
+            if executor is None:
+                executor = self._executors[source] = io_executor(self.concurrency(source))
+            return executor
+
+    def submit(self, source: str, call: Callable[..., R], *args) -> Future:
+        """
+        :param source: name of the source the call goes to
+        :return: future of the call's result
+        """
+        call = carry_read_only(call)
+        if self.concurrency(source) <= 1:
+            future = Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(call(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        return self._executor(source).submit(call, *args)
+
+    def map(self, source: str, call: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Calls call with every item concurrently, as the source allows.
+
+        :param source: name of the source the calls go to
+        :return: results, in order of items
+        :raise: exception of the first (in order of items) call which failed
+        """
+        futures = [self.submit(source, call, item) for item in items]
+        return [f.result() for f in futures]
+
+    def shutdown(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False)
+            self._executors = {}
+
+
+source_client = SourceClient(Config.source_concurrency(), Config.source_default_concurrency())
@@ -1,8 +1,14 @@
+import queue
+import threading
+from contextlib import contextmanager
 from typing import List, Tuple
 import imdb
 
 import banana.media.sources.imdbsuggestions as imdbsuggestions
-from banana.core import getLogger
+from banana.core import getLogger, Config
+from banana.core.httpcache import ResponseCache, cache_key, response_cache
+from banana.core.metrics import metrics
+from banana.media.sources.client import source_client
 from banana.movies.model import MovieMatchCandidate, Genre
 
 logger = getLogger(__name__)
@@ -127,6 +133,139 @@ def _imdb_to_match_candidate(m: dict) -> MovieMatchCandidate:
     )
 
 
+class _CachedURLOpener(object):
+    """
+    Wraps IMDbPY URL opener, caching pages it retrieves in a ResponseCache (IMDbPY does not use requests, so it
+    does not go through HttpClient). Partial retrievals (size limited) are never cached.
+    """
+
+    def __init__(self, opener, cache: ResponseCache):
+        self._opener = opener
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._opener, name)
+
+    def retrieve_unicode(self, url, size=-1):
+        ttl = self._cache.ttl(url) if size == -1 else None
+        if ttl is None:
+            return self._opener.retrieve_unicode(url, size=size)
+
+        key = cache_key('GET', url)
+        cached = self._cache.get(key)
+        if cached is not None and cached.fresh:
+            # IMDbPY checks where a search got redirected to
+            self._opener._last_url = cached.headers.get('X-Url', url)
+            return cached.body.decode('utf-8')
+
+        page = self._opener.retrieve_unicode(url, size=size)
+        self._cache.put(key, 200, {'X-Url': self._opener._last_url}, page.encode('utf-8'), ttl)
+        return page
+
+
+def _imdb() -> imdb.IMDb:
+    """
+    :return: new IMDb access object, with a persistent page cache (unless disabled)
+    """
+    ia = imdb.IMDb()
+    if Config.http_cache():
+        ia.urlOpener = _CachedURLOpener(ia.urlOpener, response_cache)
+    return ia
+
+
+def _imdb_search_result_to_match_candidate(m) -> MovieMatchCandidate:
+    """
+    Maps an IMDB search result to a lightweight match candidate: title and year only, AKAs and the rest of movie
+    information are fetched later, if needed (see IMDBApi.fetch_akas and IMDBApi.complete).
+
+    :param m: an IMDB movie object, as returned by search
+    :return: a MovieMatchCandidate without AKAs (None), plot, poster, rating and genres
+    """
+    return MovieMatchCandidate(
+        title=m.get("title"),
+        original_title=m.get("title"),
+        release_year=m.get("year"),
+        external_id=str(m.movieID),
+        source="imdb",
+        akas=None,
+        genres=[]
+    )
+
+
+class IMDbAccessorPool(object):
+    """
+    Pool of reusable IMDb access objects. An access object is not thread safe (its URL opener keeps state of
+    a request), so each is used by one thread at a time; up to size of them are created on demand, callers wait
+    for a free one beyond that.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._free = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> imdb.IMDb:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self._size
+            if create:
+                self._created += 1
+        if not create:
+            return self._free.get()
+        try:
+            return _imdb()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def accessor(self):
+        """
+        Borrows an IMDb access object for a with block.
+        """
+        ia = self._acquire()
+        try:
+            yield ia
+        finally:
+            self._free.put(ia)
+
+
+_accessors = IMDbAccessorPool(Config.imdb_pool_size())
+
+
+def _imdb_akas(imdb_id: str) -> List[str]:
+    """
+    :return: alternative titles of a movie (from its release info), or none if they cannot be fetched
+    """
+    # noinspection PyBroadException
+    try:
+        with metrics.timer('IMDBApi.akas'), _accessors.accessor() as ia:
+            movie = ia.get_movie(str(imdb_id), info=('akas',))
+        return list(dict.fromkeys(a.split('::')[0].strip() for a in movie.get('akas', []) if a.strip()))
+    except BaseException as e:
+        logger.warning("Exception caught while fetching IMDB alternative titles of {}. {}".format(imdb_id, e))
+        return []
+
+
+def _imdb_main(imdb_id: str):
+    """
+    :return: an IMDB movie object with main information, or None if it cannot be fetched
+    """
+    # noinspection PyBroadException
+    try:
+        with metrics.timer('IMDBApi.update'), _accessors.accessor() as ia:
+            return ia.get_movie(str(imdb_id), info=('main',))
+    except BaseException as e:
+        logger.warning("Exception caught while fetching IMDB movie {}. {}".format(imdb_id, e))
+        return None
+
+
 class IMDBApi(object):
 
     @staticmethod
@@ -135,14 +274,49 @@ class IMDBApi(object):
         Returns a match candidates for a given movie. This is different from search function, as search uses
         fast but limited information form suggestions API, while this uses slower but richer PyIMDB API.
 
+        Candidates are lightweight, just what matching needs first (title and year). AKAs are fetched only if
+        matching needs them (fetch_akas), and the rest of movie information only for candidates a matcher returns
+        (complete).
+
         :param title - a title to find matching movies in IMDB
         :return: a list of MovieMatchCandidates
         """
-        ia = imdb.IMDb()
-        movies = ia.search_movie(title)
-        for m in movies:
-            ia.update(m, 'main')
-        return [_imdb_to_match_candidate(m) for m in movies]
+        with _accessors.accessor() as ia:
+            movies = ia.search_movie(title)
+        return [_imdb_search_result_to_match_candidate(m) for m in movies]
+
+    @staticmethod
+    def fetch_akas(candidates: List[MovieMatchCandidate]):
+        """
+        Fetches alternative titles (AKAs) of match candidates which do not have them yet, concurrently.
+        Candidates are updated in place; a candidate whose AKAs cannot be fetched gets none.
+
+        :param candidates: match candidates returned by match
+        """
+        missing = [c for c in candidates if c.akas is None]
+        for candidate, akas in zip(missing, source_client.map('IMDBApi', _imdb_akas,
+                                                              [c.external_id for c in missing])):
+            candidate.akas = akas
+
+    @staticmethod
+    def complete(candidates: List[MovieMatchCandidate]):
+        """
+        Fetches main information (plot, poster, rating and genres) of match candidates which have none yet,
+        concurrently. Candidates are updated in place, their titles, year and AKAs are kept; a candidate whose
+        information cannot be fetched stays as it is.
+
+        :param candidates: match candidates returned by match
+        """
+        lightweight = [c for c in candidates if c.plot is None and c.poster is None and c.rating is None and
+                       not c.genres]
+        for candidate, movie in zip(lightweight, source_client.map('IMDBApi', _imdb_main,
+                                                                   [c.external_id for c in lightweight])):
+            if movie is None or not movie.get('title'):
+                continue
+            candidate.plot = _imdb_plot(movie)
+            candidate.poster = movie.get("cover")
+            candidate.rating = movie.get("rating")
+            candidate.genres = _imdb_genres(movie)
 
     @staticmethod
     def get_by_id(imdb_id: str) -> MovieMatchCandidate:
@@ -153,8 +327,8 @@ class IMDBApi(object):
 
         :return: a MovieMatchCandidate for this ID.
         """
-        ia = imdb.IMDb()
-        movie = ia.get_movie(str(imdb_id))
+        with _accessors.accessor() as ia:
+            movie = ia.get_movie(str(imdb_id))
         return _imdb_to_match_candidate(movie)
 
     @staticmethod
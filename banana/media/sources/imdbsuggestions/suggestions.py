@@ -1,9 +1,19 @@
-import requests
 import json
+import threading
+from typing import List, Optional
 
+from cachetools import TTLCache
+
+from banana.core import Config
+from banana.core.concurrency import SingleFlight
+from banana.core.http import HttpClient
+from banana.core.metrics import metrics
 
 _imdb_suggestions_url = "https://sg.media-imdb.com/suggests/"
 
+# IMDB never returns more suggestions than this; a query with fewer suggestions got all of them
+_suggestions_limit = 8
+
 
 def _has_attr(attr, d):
         return attr in d
@@ -38,6 +48,72 @@ def _filter_movies(suggestions: [dict]) -> [dict]:
     )
 
 
+def _normalized(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+def _matches(suggestion: dict, query: str) -> bool:
+    """
+    :return: True if every word of a (normalized) query starts a word of a suggestion's title, as IMDB matches them
+    """
+    words = _normalized(suggestion.get('l', '')).split()
+    return all(any(w.startswith(q) for w in words) for q in query.split())
+
+
+class SuggestionsClient(object):
+    """
+    IMDB suggestions client for typeahead search: requests go through a pooled keep-alive session with a timeout,
+    suggestions are cached by (normalized) query, and concurrent requests for the same query are coalesced.
+
+    A query extending a cached shorter one (its prefix) is answered from the shorter one's suggestions, without
+    a request, if the shorter one got all of its suggestions (fewer than IMDB returns at most): suggestions of the
+    longer query are then among them.
+    """
+
+    def __init__(self, http: HttpClient, cache_size: int = 1024, ttl: int = 60 * 60):
+        self._http = http
+        self._cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._requests = SingleFlight()
+
+    def _cached(self, query: str) -> Optional[List[dict]]:
+        with self._lock:
+            suggestions = self._cache.get(query)
+            if suggestions is not None:
+                return suggestions
+            for end in range(len(query) - 1, 0, -1):
+                prefix_suggestions = self._cache.get(query[:end])
+                if prefix_suggestions is not None and len(prefix_suggestions) < _suggestions_limit:
+                    return [s for s in prefix_suggestions if _matches(s, query)]
+        return None
+
+    def _fetch(self, query: str) -> List[dict]:
+        response = self._http.get(_imdb_suggestions_url + "/" + query[:1] + "/" + query + ".json")
+        response.raise_for_status()
+        suggestions = _unwrap_jsonp(response.text).get('d', [])
+        with self._lock:
+            self._cache[query] = suggestions
+        return suggestions
+
+    def suggestions(self, title: str) -> dict:
+        """
+        :param title: a movie title, or a phrase to get suggestions for
+        :return: IMDB suggestions (of any kind) response
+        """
+        query = _normalized(title)
+        suggestions = self._cached(query)
+        if suggestions is not None:
+            metrics.count('imdb_suggestions.cached')
+            return {'d': suggestions}
+        return {'d': self._requests.do(query, lambda: self._fetch(query))}
+
+
+_client = SuggestionsClient(HttpClient('imdb_suggestions', pool_size=Config.imdb_pool_size(), retries=1,
+                                       timeout=Config.imdb_suggestions_timeout()),
+                            cache_size=Config.imdb_suggestions_cache_size(),
+                            ttl=Config.imdb_suggestions_cache_ttl())
+
+
 def suggest_movie(title: str):
     """
     This is dead simple wrapper for and IMDB suggestions API:
@@ -47,11 +123,10 @@ def suggest_movie(title: str):
     We use this API for quick search capabilities for banana. Anything else requires slower, but more feature rich
     PyIMDB lib.
 
+    Suggestions are cached, and a longer query is answered from a shorter one when possible (see
+    SuggestionsClient), so that typing a title does not request IMDB on every keystroke.
+
     :param title: a movie title, or a phrase to get suggestions for
     :return: and list of dictionary with *movie* a suggestions. Anything else would be filtered out.
     """
-    return _filter_movies(
-        _unwrap_jsonp(
-            requests.get(_imdb_suggestions_url + "/" + title[:1].lower() + "/" + title + ".json").text
-        )
-    )
+    return _filter_movies(_client.suggestions(title))
@@ -1,10 +1,14 @@
+import json
 import tmdbsimple as tmdb
 import textwrap
 from datetime import datetime
-from banana.core import tbdb_api_key
+from banana.core import tbdb_api_key, Config
+from banana.core.http import HttpClient
+from banana.core.httpcache import response_cache
+from banana.core.reference import ReferenceData
+from banana.media.sources.client import source_client
 from typing import List, Tuple
 from banana.movies.model import MovieMatchCandidate, Genre
-from cachetools.func import ttl_cache
 
 from logging import getLogger
 
@@ -12,6 +16,42 @@ logger = getLogger(__name__)
 
 tmdb.API_KEY = tbdb_api_key()
 
+# shared by all TMDB calls: pooled keep-alive connections, TMDB rate limit, retries of throttled requests and
+# persistent response cache
+tmdb_client = HttpClient('tmdb', pool_size=Config.tmdb_pool_size(), rate=Config.tmdb_rate_limit(),
+                         burst=Config.tmdb_rate_burst(), retries=Config.tmdb_retries(), timeout=Config.tmdb_timeout(),
+                         cache=response_cache if Config.http_cache() else None)
+
+# tmdbsimple asks for a new connection per request (Connection: close), we keep them alive
+_tmdb_headers = {k: v for k, v in tmdb.base.TMDB.headers.items() if k != 'Connection'}
+
+
+def _tmdb_request(self, method, path, params=None, payload=None):
+    """
+    Replaces tmdbsimple request (a bare requests.request call) with a request made by tmdb_client.
+    """
+    response = tmdb_client.request(method, self._get_complete_url(path), params=self._get_params(params),
+                                   data=json.dumps(payload) if payload else payload, headers=_tmdb_headers)
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+    return response.json()
+
+
+tmdb.base.TMDB._request = _tmdb_request
+
+
+def _fetch_reference_data() -> dict:
+    """
+    :return: TMDB genre catalog (genre id, as a string: name) and image base URL
+    """
+    genres = tmdb.Genres().movie_list()["genres"]
+    images = tmdb.Configuration().info()["images"]
+    return {"genres": {str(g["id"]): g["name"] for g in genres}, "image_base_url": images["secure_base_url"]}
+
+
+tmdb_reference = ReferenceData("tmdb", _fetch_reference_data,
+                               defaults={"genres": {}, "image_base_url": "https://image.tmdb.org/t/p/"})
+
 
 def tmdb_date_to_date(d):
     if not d:
@@ -26,23 +66,25 @@ def tmdb_date_to_date(d):
 class TMDBApi:
 
     @staticmethod
-    @ttl_cache(ttl=60 * 60 * 600)
     def get_genres():
-        return tmdb.Genres().movie_list()["genres"]
-    
-    def _find_genre_name_by_id(genre_id: int) -> str:
-        genres = TMDBApi.get_genres()
-        return next(g['name'] for g in genres if g['id'] == genre_id)
+        return [{"id": int(gid), "name": name} for gid, name in tmdb_reference.data()["genres"].items()]
 
+    @staticmethod
     def _tmdb_genres(genre_ids):
-        return [Genre(name=TMDBApi._find_genre_name_by_id(gid), genre_id=gid) for gid in genre_ids]     
+        genres = tmdb_reference.data()["genres"]
+        if any(str(gid) not in genres for gid in genre_ids):
+            # not loaded yet, or a new genre: it is kept by id, without a name, until the catalog is refreshed.
+            # Candidates with such genres are not cached (see MatchCache.put), and the genres are not persisted
+            # (see MovieMatchCandidate.to_movie)
+            tmdb_reference.missing()
+        return [Genre(name=genres.get(str(gid)), genre_id=gid) for gid in genre_ids]
 
     @staticmethod
     def _tmdb_poster_url(tmdb_poster_path: str) -> str:
         if not tmdb_poster_path:
             return None
         else:
-            return "https://image.tmdb.org/t/p/w600_and_h900_bestv2/" + tmdb_poster_path
+            return tmdb_reference.data()["image_base_url"] + "w600_and_h900_bestv2/" + tmdb_poster_path
 
     @staticmethod
     def _tmdb_release_year(tmdb_date: str) -> int:
@@ -119,15 +161,36 @@ class TMDBApi:
     # Fast search for UI search functionality; it should return only minimal set of information as a dict 
     @staticmethod
     def match(title: str) -> List[MovieMatchCandidate]:
+        # alternative titles are not part of search results, they are fetched later, only if needed (fetch_akas)
         results = tmdb.Search().movie(query=title)['results']
-        matches = []
-        for m in results:
-            akas = tmdb.Movies(m["id"]).alternative_titles()['titles']
-            akas = [a['title'] for a in akas]
-            matches.append(TMDBApi._tmdb_to_movie_match_candidate(m, akas))
-        logger.debug("IMDB matches {}".format(matches))
+        matches = [TMDBApi._tmdb_to_movie_match_candidate(m) for m in results]
+        logger.debug("TMDB matches {}".format(matches))
         return matches
 
+    @staticmethod
+    def _alternative_titles(tmdb_id) -> List[str]:
+        try:
+            return [a['title'] for a in tmdb.Movies(int(tmdb_id)).alternative_titles()['titles']]
+        except BaseException as e:
+            logger.warning("Exception caught while fetching TMDB alternative titles of {}. {}".format(tmdb_id, e))
+            return []
+
+    @staticmethod
+    def fetch_akas(candidates: List[MovieMatchCandidate]):
+        """
+        Fetches alternative titles (AKAs) of match candidates which do not have them yet, concurrently (as many
+        at once as source_client allows TMDB). Candidates are updated in place; a candidate whose AKAs cannot be
+        fetched gets none.
+
+        :param candidates: match candidates returned by match
+        """
+        missing = [c for c in candidates if c.akas is None]
+        if not missing:
+            return
+        for candidate, akas in zip(missing, source_client.map('TMDBApi', TMDBApi._alternative_titles,
+                                                              [c.external_id for c in missing])):
+            candidate.akas = akas
+
     # Returns possible match candidates for a movie; this is much slower than search, as it returns a richer
     # set of information
     @staticmethod
@@ -150,6 +213,8 @@ class TMDBApi:
     
     @staticmethod
     def get_by_id(id):
-        movie = tmdb.Movies(int(id)).info()
+        # alternative titles come with movie details in the same request
+        movie = tmdb.Movies(int(id)).info(append_to_response='alternative_titles')
         logger.debug("Fetched TMDB movie by id {}, result: {}".format(id, movie))
-        return TMDBApi._tmdb_to_movie_match_candidate(movie, prefetch_genres=False)
+        akas = [a['title'] for a in movie.get('alternative_titles', {}).get('titles', [])]
+        return TMDBApi._tmdb_to_movie_match_candidate(movie, akas=akas, prefetch_genres=False)
@@ -33,6 +33,15 @@ class MediaTarget(ABC):
     def do_relink(self, from_path: str):
         pass
 
+    def do_unlink(self, target_path: str):
+        """
+        Removes a target, when its source media item is gone. Media targets which cannot remove their targets,
+        just don't implement it.
+
+        :param target_path: a target to remove
+        """
+        raise NotImplementedError(f'{self.__class__.__name__} cannot unlink {target_path}')
+
     def already_exist(self) -> bool:
         """
         Check if given target already exist. This, again, may be anything: a local file copy, or a link, or a copy of
@@ -96,6 +105,10 @@ class SkipExistingMediaTargetResolver(MediaTargetResolver):
                     raise NotImplementedError(f'\'{os.path.basename(target_absolute_path)}\' already exists and cannot'
                                               f' be linked to \'{media.filename}\'')
 
+                def do_unlink(self, target_path: str):
+                    raise NotImplementedError(f'\'{os.path.basename(target_absolute_path)}\' was not linked to'
+                                              f' \'{media.filename}\' and cannot be unlinked')
+
             return media, DoNotTouchMediaTarget()
         else:
             media.set_target_absolute_path(target_absolute_path)
@@ -126,6 +139,9 @@ class NoOpMediaTargetBuilder(MediaTargetBuilder):
                     from_path,
                     self._formatter.format(self._movie, self._media)))
 
+            def do_unlink(self, target_path: str):
+                logger.info("**Dry Run** Just logging information. Unlinking {}".format(target_path))
+
             def already_exist(self) -> bool:
                 return False
 
@@ -181,6 +197,16 @@ class HardLinkMediaTargetBuilder(MediaTargetBuilder):
                     logger.info(f"Removing unlinked media {from_file}")
                     os.unlink(from_file)
 
+            def do_unlink(self, target_path: str):
+                """
+                Removes a hard link to the source media file, which is gone.
+
+                :param target_path: a hard link name
+                """
+                if Path(target_path).exists():
+                    logger.info(f"Removing unlinked media {target_path}")
+                    os.unlink(target_path)
+
             def already_exist(self) -> bool:
                 """
                 Check if a target, the link name already exist on the filesystem.
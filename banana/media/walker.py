@@ -0,0 +1,264 @@
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+from banana.core import getLogger
+from banana.core.concurrency import DeviceExecutors
+
+logger = getLogger(__name__)
+
+
+class _Deferred(object):
+    """
+    Future-like wrapper for listing directories in the calling thread, when there is no concurrency.
+    """
+
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+
+    def result(self):
+        return self._fn(*self._args)
+
+
+class DirectoryWalker(object):
+    """
+    A single pass, scandir based directory walker. It yields files as soon as their directory is listed, so
+    consumers can start processing before the whole tree is known.
+
+    Like os.walk, symlinks to directories are not followed unless follow_symlinks is set; directories are
+    de-duplicated by (device, inode), so that even then symlink loops (or the same directory linked twice) are
+    visited only once. Unreadable directories are logged and skipped, the same way os.walk does by default.
+
+    While walking, it keeps a running count of discovered files and can estimate the total number of files
+    based on the average number of files per visited directory.
+
+    Subdirectories can be listed concurrently, ahead of the consumer, which matters for high latency network
+    mounts. Concurrency is limited per device (st_dev): workers is the default limit for every device, and
+    mount_concurrency overrides it for devices of given mount points. Walkers of several roots can share
+    DeviceExecutors, so that the limits hold across all of them. Files are yielded in the same order regardless
+    of concurrency.
+    """
+
+    def __init__(self, root: str, follow_symlinks: bool = False, workers: int = 1,
+                 mount_concurrency: Dict[str, int] = None, executors: DeviceExecutors = None):
+        self._root = root
+        self._follow_symlinks = follow_symlinks
+        self._workers = workers
+        self._mount_concurrency = mount_concurrency
+        self._executors = executors
+        self._current: Tuple[str, int] = None
+        self._discovered_files = 0
+        self._visited_dirs = 0
+        self._pending_dirs = 0
+        self._completed = False
+
+    def discovered(self) -> int:
+        """
+        :return: number of files discovered so far
+        """
+        return self._discovered_files
+
+    def root(self) -> str:
+        return self._root
+
+    def completed(self) -> bool:
+        return self._completed
+
+    def device_of(self, directory: str) -> int:
+        """
+        :param directory: a directory yielded by this walker
+        :return: st_dev of the directory; known without I/O while its files are being yielded
+        """
+        if self._current is not None and self._current[0] == directory:
+            return self._current[1]
+        return os.stat(directory).st_dev
+
+    def estimated_total(self) -> int:
+        """
+        Estimates total number of files under the root. Once walk is completed, this is an exact number.
+
+        :return: estimated number of files
+        """
+        if self._completed or self._visited_dirs == 0:
+            return self._discovered_files
+        files_per_dir = self._discovered_files / self._visited_dirs
+        return self._discovered_files + int(self._pending_dirs * files_per_dir)
+
+    @staticmethod
+    def _dir_key(path: str, entry: os.DirEntry = None) -> Tuple[int, int]:
+        st = entry.stat() if entry is not None else os.stat(path)
+        if st.st_ino == 0:
+            # DirEntry on Windows does not carry inode numbers; os.stat does
+            st = os.stat(path)
+        return st.st_dev, st.st_ino
+
+    def _list(self, directory: str) -> Tuple[List[os.DirEntry], List[Tuple[str, Tuple[int, int]]]]:
+        """
+        Lists a directory. It may run in a worker thread, so it does not touch walker state.
+
+        :return: files and (path, (device, inode)) of subdirectories
+        """
+        files = []
+        subdirectories = []
+
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if not is_dir:
+                    files.append(entry)
+                    continue
+                if not self._follow_symlinks and entry.is_symlink():
+                    # like os.walk(followlinks=False): neither a file, nor walked into
+                    continue
+
+                try:
+                    subdirectories.append((entry.path, self._dir_key(entry.path, entry)))
+                except OSError as e:
+                    logger.debug(f'Cannot stat directory {entry.path}: {e}. Skipping.')
+
+        return files, subdirectories
+
+    def _submit(self, executors: DeviceExecutors, directory: str, device: int):
+        executor = executors.executor(device)
+        if executor is None:
+            return directory, device, _Deferred(self._list, directory)
+        return directory, device, executor.submit(self._list, directory)
+
+    def __iter__(self) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Walks the tree, yielding (directory path, DirEntry) for every non directory entry.
+        """
+        self._discovered_files = 0
+        self._visited_dirs = 0
+        self._completed = False
+
+        try:
+            root_key = self._dir_key(self._root)
+        except OSError as e:
+            logger.warning(f'Cannot access scan root {self._root}: {e}')
+            self._completed = True
+            return
+
+        executors = self._executors
+        if executors is None:
+            executors = DeviceExecutors(self._workers, self._mount_concurrency)
+        seen = {root_key}
+        stack = [self._submit(executors, self._root, root_key[0])]
+        self._pending_dirs = 1
+
+        try:
+            while stack:
+                current_dir, device, listing = stack.pop()
+                self._pending_dirs -= 1
+
+                try:
+                    files, subdirectories = listing.result()
+                except OSError as e:
+                    logger.warning(f'Cannot list directory {current_dir}: {e}. Skipping.')
+                    continue
+
+                children = []
+                for path, key in subdirectories:
+                    if key in seen:
+                        logger.debug(f'Directory {path} already visited. Skipping.')
+                        continue
+                    seen.add(key)
+                    children.append(self._submit(executors, path, key[0]))
+
+                self._visited_dirs += 1
+                self._discovered_files += len(files)
+                self._pending_dirs += len(children)
+
+                # keep os.walk like, top-down order
+                stack.extend(reversed(children))
+
+                self._current = (current_dir, device)
+                for f in files:
+                    yield current_dir, f
+
+            self._completed = True
+
+        finally:
+            self._current = None
+            if executors is not self._executors:
+                executors.shutdown()
+
+
+def _root_device(walker: DirectoryWalker):
+    try:
+        return os.stat(walker.root()).st_dev
+    except OSError:
+        return None
+
+
+def walk_all(walkers: List[DirectoryWalker], executors: DeviceExecutors = None,
+             buffer: int = 1024) -> Iterator[Tuple[int, str, os.DirEntry, int]]:
+    """
+    Walks several trees concurrently, so that listing a root does not wait until the previous one is exhausted.
+    Files of a root are yielded in the order of its walker, files of different roots are interleaved as they are
+    listed; at most buffer files are listed ahead of the consumer.
+
+    Every root is walked in its own thread, except roots on a device which executors (shared by the walkers) limit
+    to a single worker: those are walked one after another, so that the device still sees one listing at a time.
+
+    :return: iterator of (index of the walker, directory path, DirEntry, st_dev of the directory)
+    """
+    groups: Dict[object, List[Tuple[int, DirectoryWalker]]] = {}
+    for index, walker in enumerate(walkers):
+        device = _root_device(walker) if executors is not None else None
+        key = device if device is not None and executors.concurrency(device) <= 1 else ('root', index)
+        groups.setdefault(key, []).append((index, walker))
+
+    if len(groups) <= 1:
+        for index, walker in enumerate(walkers):
+            for path, entry in walker:
+                yield index, path, entry, walker.device_of(path)
+        return
+
+    items = queue.Queue(maxsize=buffer)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def walk(group: List[Tuple[int, DirectoryWalker]]):
+        try:
+            for index, walker in group:
+                # noinspection PyBroadException
+                try:
+                    for path, entry in walker:
+                        if not put((index, path, entry, walker.device_of(path))):
+                            return
+                except Exception as e:
+                    logger.warning(f'Cannot walk {walker.root()}: {e}')
+        finally:
+            put(done)
+
+    threads = [threading.Thread(target=walk, args=(group,), name=f'walker-{group[0][0]}', daemon=True)
+               for group in groups.values()]
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = len(threads)
+        while running:
+            item = items.get()
+            if item is done:
+                running -= 1
+            else:
+                yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,157 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+from banana.core import getLogger
+
+logger = getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+              IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class WatchEventType(Enum):
+    CREATED = 1
+    MOVED = 2
+    DELETED = 3
+    RESCAN = 4
+
+
+@dataclass
+class WatchEvent:
+    """
+    A filesystem change under a watched root. For directory events filename (and dest_filename) is None.
+    RESCAN means we lost track of changes (events overflowed, or we cannot watch at all) and an incremental
+    scan is needed.
+    """
+    event_type: WatchEventType
+    path: str = None
+    filename: str = None
+    dest_path: str = None
+    dest_filename: str = None
+    media: 'banana.media.item.ParsedMediaItem' = None
+
+    def is_directory(self) -> bool:
+        return self.event_type is not WatchEventType.RESCAN and self.filename is None
+
+
+@dataclass
+class InotifyEvent:
+    path: str
+    mask: int
+    cookie: int
+    name: str
+
+    def is_directory(self) -> bool:
+        return bool(self.mask & IN_ISDIR)
+
+
+class InotifyUnavailable(Exception):
+    pass
+
+
+class Inotify(object):
+    """
+    Minimal, non blocking inotify binding. Waiting for events goes through select, so with gevent monkey patching
+    it yields to other greenlets instead of blocking the whole process.
+
+    Inotify is not recursive; every directory has to be watched separately (see watch_tree).
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if os.name != 'posix' or not libc_name:
+            raise InotifyUnavailable('inotify is not available on this platform')
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            getattr(self._libc, 'inotify_init1')
+        except (OSError, AttributeError) as e:
+            raise InotifyUnavailable(f'inotify is not available: {e}')
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise InotifyUnavailable(f'inotify_init1 failed: {os.strerror(ctypes.get_errno())}')
+        self._watches = {}
+
+    def add_watch(self, path: str) -> Optional[int]:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            logger.warning(f'Cannot watch {path}: {os.strerror(ctypes.get_errno())}')
+            return None
+        self._watches[wd] = path
+        return wd
+
+    def watch_tree(self, root: str):
+        """
+        Watches a directory and all its subdirectories.
+        """
+        self.add_watch(root)
+        for current_dir, subdirectories, _ in os.walk(root):
+            for d in subdirectories:
+                self.add_watch(os.path.join(current_dir, d))
+
+    def moved_directory(self, path: str, dest_path: str):
+        """
+        Watch descriptors survive directory moves, but the paths we keep for them do not; fix them up.
+        """
+        prefix = os.path.join(path, '')
+        for wd, watched in list(self._watches.items()):
+            if watched == path or watched.startswith(prefix):
+                self._watches[wd] = dest_path + watched[len(path):]
+
+    def read_events(self, timeout: float) -> List[InotifyEvent]:
+        """
+        Waits up to timeout seconds for events and returns all events which are available.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            events.append(InotifyEvent(path=self._watches.get(wd), mask=mask, cookie=cookie, name=name))
+
+        return events
+
+    def close(self):
+        os.close(self._fd)
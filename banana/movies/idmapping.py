@@ -0,0 +1,85 @@
+import copy
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from banana.core import db, getLogger, Config, own_session
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class ImdbTmdbMapping(db.Model):
+    """
+    Cross reference of an IMDb id of a movie and its TMDB id. A mapping without a TMDB id is a negative one:
+    TMDB did not know the movie (or could not be asked) when it was looked up.
+    """
+    id: int = db.Column(db.Integer, primary_key=True)
+    imdb_id: str = db.Column(db.String, nullable=False, unique=True)
+    tmdb_id: str = db.Column(db.String)
+    updated_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ImdbTmdbIdMap(object):
+    """
+    Persistent map of IMDb ids to TMDB ids. Positive mappings never expire, negative ones expire after
+    negative_ttl seconds, so that movies added to TMDB later are found eventually. A read-only map (see read_only)
+    does not record anything. Mappings are read and written in a session of their own (see own_session).
+    """
+
+    def __init__(self, negative_ttl: int = Config.matcher_cache_negative_ttl()):
+        self._negative_ttl = timedelta(seconds=negative_ttl)
+        self._read_only = False
+
+    def read_only(self) -> 'ImdbTmdbIdMap':
+        """
+        :return: a view of this map, which ignores writes
+        """
+        view = copy.copy(self)
+        view._read_only = True
+        return view
+
+    def get_all(self, imdb_ids: Iterable) -> Dict[str, Optional[str]]:
+        """
+        :param imdb_ids: IMDb ids to look up
+        :return: dict of IMDb id: TMDB id (None for a negative mapping) of known ids; unknown ones are missing
+        """
+        imdb_ids = {str(i) for i in imdb_ids}
+        if not imdb_ids:
+            return {}
+
+        negative_since = datetime.utcnow() - self._negative_ttl
+        with own_session() as session:
+            return {m.imdb_id: m.tmdb_id
+                    for m in session.query(ImdbTmdbMapping).filter(ImdbTmdbMapping.imdb_id.in_(imdb_ids)).all()
+                    if m.tmdb_id is not None or m.updated_datetime > negative_since}
+
+    def put_all(self, mappings: Dict[str, Optional[str]]):
+        """
+        Records (or replaces) mappings and commits. Failures are logged, not raised.
+
+        :param mappings: dict of IMDb id: TMDB id, or None if TMDB does not know the movie
+        """
+        if not mappings or self._read_only:
+            return
+        # noinspection PyBroadException
+        try:
+            mappings = {str(imdb_id): str(tmdb_id) if tmdb_id is not None else None
+                        for imdb_id, tmdb_id in mappings.items()}
+            with own_session() as session:
+                existing = {m.imdb_id: m for m in session.query(ImdbTmdbMapping)
+                            .filter(ImdbTmdbMapping.imdb_id.in_(mappings.keys())).all()}
+                for imdb_id, tmdb_id in mappings.items():
+                    mapping = existing.get(imdb_id)
+                    if mapping is None:
+                        session.add(ImdbTmdbMapping(imdb_id=imdb_id, tmdb_id=tmdb_id))
+                    else:
+                        mapping.tmdb_id = tmdb_id
+                        mapping.updated_datetime = datetime.utcnow()
+                session.commit()
+        except BaseException:
+            logger.warning(f'Cannot record IMDb to TMDB id mappings: {traceback.format_exc()}')
+
+
+id_map = ImdbTmdbIdMap()
@@ -0,0 +1,199 @@
+import copy
+import re
+import threading
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import dacite
+import unidecode
+from marshmallow import Schema, fields
+
+from banana.core import db, getLogger, Config, JsonMixin, own_session
+from banana.core.metrics import metrics
+from banana.movies.model import MovieMatchCandidate
+
+logger = getLogger(__name__)
+
+_non_alphanumeric = re.compile(r'[^0-9a-z]+')
+
+
+def normalized_query(title: str) -> str:
+    """
+    Normalizes a title queried at a source, so that the same question asked differently (case, accents,
+    punctuation and spacing) hits the same cache entry: 'Amélie: The  Movie' -> 'amelie the movie'.
+    """
+    return _non_alphanumeric.sub(' ', unidecode.unidecode(title or '').lower()).strip()
+
+
+def source_name(source) -> str:
+    """
+    :param source: a media source (a class like TMDBApi, or its instance)
+    :return: name of the source, as a part of cache keys
+    """
+    return source.__name__ if isinstance(source, type) else type(source).__name__
+
+
+@dataclass
+class MatchCacheEntry(db.Model):
+    """
+    Candidate list a source returned for a (normalized) query, with alternative titles (AKAs) fetched for them
+    so far. An entry without candidates is a negative one: the query returned nothing, or failed.
+    """
+    __table_args__ = (db.UniqueConstraint('source', 'normalized_title'),)
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    source: str = db.Column(db.String, nullable=False)
+    normalized_title: str = db.Column(db.String, nullable=False)
+    candidates: list = db.Column(db.JSON)
+    expires_datetime: datetime = db.Column(db.DateTime, nullable=False)
+    updated_datetime: datetime = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MatchCacheStatsSchema(Schema):
+    hits = fields.Integer()
+    negative_hits = fields.Integer()
+    misses = fields.Integer()
+    expired = fields.Integer()
+    writes = fields.Integer()
+    errors = fields.Integer()
+
+
+@dataclass
+class MatchCacheStats(JsonMixin):
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    writes: int = 0
+    errors: int = 0
+
+    @classmethod
+    def schema(cls) -> Schema:
+        return MatchCacheStatsSchema()
+
+
+class MatchCache(object):
+    """
+    Persistent cache of source candidate lists, keyed by a source and a normalized query (a title). Year is not
+    a part of the key: sources are searched by title only, a year just scores candidates, which is always done
+    again on a cached list.
+
+    Entries live for ttl seconds, negative entries (no candidates, or a failed search) only for negative_ttl.
+    Entries are read and written in a session of their own (see own_session), and committed as they are written,
+    without anything pending in the current session. A read-only cache (see read_only) does not write anything.
+    """
+
+    def __init__(self,
+                 ttl: int = Config.matcher_cache_ttl(),
+                 negative_ttl: int = Config.matcher_cache_negative_ttl()):
+        self._ttl = timedelta(seconds=ttl)
+        self._negative_ttl = timedelta(seconds=negative_ttl)
+        self._stats = MatchCacheStats()
+        self._lock = threading.Lock()
+        self._read_only = False
+
+    def read_only(self) -> 'MatchCache':
+        """
+        :return: a view of this cache (sharing its entries and counters), which ignores writes
+        """
+        view = copy.copy(self)
+        view._read_only = True
+        return view
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+        metrics.count(f'match_cache.{counter}')
+
+    def stats(self) -> MatchCacheStats:
+        """
+        :return: a copy of hit/miss counters of this cache
+        """
+        with self._lock:
+            return MatchCacheStats(**self._stats.__dict__)
+
+    @staticmethod
+    def _dump(candidate: MovieMatchCandidate) -> dict:
+        dumped = MovieMatchCandidate.schema().dump(candidate)
+        dumped['akas'] = candidate.akas
+        return dumped
+
+    @staticmethod
+    def _load(dumped: dict) -> MovieMatchCandidate:
+        candidate = dacite.from_dict(data_class=MovieMatchCandidate,
+                                     data=MovieMatchCandidate.schema().load(dumped),
+                                     config=dacite.Config(check_types=False))
+        candidate.akas = dumped.get('akas')
+        return candidate
+
+    def get(self, source, title: str) -> Optional[List[MovieMatchCandidate]]:
+        """
+        :param source: a media source
+        :param title: a title the source is searched for
+        :return: new copies of cached candidates (an empty list for a negative entry), or None if nothing is cached
+        """
+        with own_session() as session:
+            entry = session.query(MatchCacheEntry.candidates, MatchCacheEntry.expires_datetime)\
+                .filter_by(source=source_name(source), normalized_title=normalized_query(title)).first()
+
+        if entry is None:
+            self._count('misses')
+            return None
+        candidates, expires_datetime = entry
+        if expires_datetime <= datetime.utcnow():
+            self._count('expired')
+            return None
+
+        if not candidates:
+            self._count('negative_hits')
+            return []
+        self._count('hits')
+        return [self._load(c) for c in candidates]
+
+    def put(self, source, title: str, candidates: List[MovieMatchCandidate]):
+        """
+        Caches (or replaces cached) candidates of a title, and commits. Failures are logged, not raised.
+
+        :param source: a media source
+        :param title: a title the source was searched for
+        :param candidates: candidates returned by the source, an empty list for a negative entry
+        """
+        if self._read_only:
+            return
+        # incomplete candidates (a source could not name some of their genres yet) are not cached at all, neither
+        # as they are, nor as a negative entry
+        if any(g.name is None for c in candidates for g in c.genres or []):
+            logger.info(f'Not caching candidates of {title}: some of their genres are not named yet.')
+            return
+        # noinspection PyBroadException
+        try:
+            key = dict(source=source_name(source), normalized_title=normalized_query(title))
+            with own_session() as session:
+                entry = session.query(MatchCacheEntry).filter_by(**key).first()
+                if entry is None:
+                    entry = MatchCacheEntry(**key)
+                    session.add(entry)
+                entry.candidates = [self._dump(c) for c in candidates]
+                entry.expires_datetime = datetime.utcnow() + (self._ttl if candidates else self._negative_ttl)
+                session.commit()
+            self._count('writes')
+        except BaseException:
+            logger.warning(f'Cannot cache candidates of {title}: {traceback.format_exc()}')
+            self._count('errors')
+
+    def purge_expired(self) -> int:
+        """
+        Removes expired entries and commits.
+
+        :return: number of removed entries
+        """
+        with own_session() as session:
+            removed = session.query(MatchCacheEntry)\
+                .filter(MatchCacheEntry.expires_datetime <= datetime.utcnow()).delete()
+            session.commit()
+        return removed
+
+
+match_cache = MatchCache()
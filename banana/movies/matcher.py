@@ -1,17 +1,34 @@
-from fuzzywuzzy import fuzz
-from typing import List
+import copy
+from concurrent.futures import wait
+from fuzzywuzzy import fuzz, utils
+from typing import Dict, List, Optional, Sequence
 from abc import ABC, abstractmethod
 import traceback
 
 from ..movies.model import MovieMatchCandidate
 from ..media.item import ParsedMediaItem
 from ..common.common import canonical_movie_title
-from ..core import app, getLogger
+from ..core import app, db, getLogger, Config
 
 from banana.media.sources import get_media_source
+from banana.media.sources.client import source_client
+from banana.core.concurrency import SingleFlight, io_executor
+from banana.core.httpcache import carry_read_only, is_read_only
+from banana.core.metrics import metrics
+from banana.movies.idmapping import ImdbTmdbIdMap, id_map
+from banana.movies.matchcache import MatchCache, match_cache, normalized_query, source_name
 
 logger = getLogger(__name__)
 
+# source searches in flight, shared by all matchers (and so by all jobs)
+_searches = SingleFlight()
+
+try:
+    # the same ratio fuzz.ratio computes (with python-Levenshtein), without a SequenceMatcher per call
+    from Levenshtein import ratio as _levenshtein_ratio
+except ImportError:
+    _levenshtein_ratio = None
+
 
 class Matcher(ABC):
 
@@ -19,11 +36,23 @@ class Matcher(ABC):
     def top5_matches(self, parsed_media_item: ParsedMediaItem) -> List[MovieMatchCandidate]:
         pass
 
+    def read_only(self) -> 'Matcher':
+        """
+        :return: a copy of this matcher, which reads its caches (candidates, id map), but does not write to them
+        """
+        matcher = copy.copy(self)
+        if getattr(matcher, 'cache', None) is not None:
+            matcher.cache = matcher.cache.read_only()
+        if getattr(matcher, 'id_map', None) is not None:
+            matcher.id_map = matcher.id_map.read_only()
+        return matcher
+
 
 class SourceMatcher(Matcher):
 
-    def __init__(self, source):
+    def __init__(self, source, cache: MatchCache = None):
         self.source = source
+        self.cache = cache
 
     def top5_matches(self, parsed_media_item):
         """
@@ -42,14 +71,15 @@ class SourceMatcher(Matcher):
         :param parsed_media_item: and media item to match
         :return: list of movie match candidates for a given media item
         """
-        return _top5_matches(parsed_media_item, self.source)
+        return _top5_matches(parsed_media_item, self.source, self.cache)
 
 
 class FallbackSourceMatcher(Matcher):
 
-    def __init__(self, primary, secondary):
+    def __init__(self, primary, secondary, cache: MatchCache = None):
         self.primary_source = primary
         self.secondary_source = secondary
+        self.cache = cache
 
     def top5_matches(self, parsed_media_item):
         """
@@ -59,35 +89,67 @@ class FallbackSourceMatcher(Matcher):
         :param parsed_media_item: and media item to match
         :return: list of movie match candidates for a given media item
         """
-        tmdb_results = _top5_matches(parsed_media_item, match_source=self.primary_source)
+        tmdb_results = _top5_matches(parsed_media_item, match_source=self.primary_source, cache=self.cache)
         if len(tmdb_results) == 0:
-            return _top5_matches(parsed_media_item, match_source=self.secondary_source)
+            return _top5_matches(parsed_media_item, match_source=self.secondary_source, cache=self.cache)
         else:
             return tmdb_results
 
 
 class CompositeSourceMatcher(Matcher, ABC):
 
-    def __init__(self, primary, secondary):
+    def __init__(self, primary, secondary, cache: MatchCache = None, id_map: ImdbTmdbIdMap = None):
         self.primary_source = primary
         self.secondary_source = secondary
+        self.cache = cache
+        self.id_map = id_map
 
     def _find_candidate_by_tmdbid(self, tmdb_id, matches: List[MovieMatchCandidate]):
         return next(filter(lambda m: m.external_id == tmdb_id, matches), None)
 
+    def _tmdb_id(self, imdb_id):
+        with metrics.timer(f'{source_name(self.primary_source)}.find_by_imdb_id'):
+            tmdb_movie = self.primary_source.get_by_imdbid_id(imdb_id)
+        return tmdb_movie.external_id if tmdb_movie else None
+
+    def _tmdb_ids(self, imdb_ids: List) -> Dict[str, Optional[str]]:
+        """
+        Resolves TMDB ids of IMDb ids: known ones from the id map, the rest concurrently from the primary source
+        (TMDB), recording them in the id map.
+
+        :return: dict of IMDb id (as a string): TMDB id, or None if TMDB does not know the movie
+        """
+        known = self.id_map.get_all(imdb_ids) if self.id_map is not None else {}
+        missing = [i for i in dict.fromkeys(imdb_ids) if str(i) not in known]
+        metrics.count('id_map.hits', len(known))
+        metrics.count('id_map.misses', len(missing))
+        if not missing:
+            return known
+
+        resolved = dict(zip((str(i) for i in missing),
+                            source_client.map(source_name(self.primary_source), self._tmdb_id, missing)))
+        if self.id_map is not None:
+            self.id_map.put_all(resolved)
+        return {**known, **resolved}
+
     def _dedup_matches(self, tmdb_matches, imdb_matches) -> List[MovieMatchCandidate]:
+        with metrics.timer('matcher.dedup'):
+            return self._dedup(tmdb_matches, imdb_matches)
+
+    def _dedup(self, tmdb_matches, imdb_matches) -> List[MovieMatchCandidate]:
 
         unique_matches = []
+        tmdb_ids = self._tmdb_ids([im.external_id for im in imdb_matches])
 
         for im in imdb_matches:
-            tmdb_movie = self.primary_source.get_by_imdbid_id(im.external_id)
-            if not tmdb_movie:
+            tmdb_id = tmdb_ids.get(str(im.external_id))
+            if not tmdb_id:
                 # We did not find this movie in TMBD source; assume this is not dupe. Add to the list.
                 unique_matches.append(im)
                 continue
             else:
                 # We have this movie in TMDB source; now check if we have this within the list of existing candidates
-                matched_tmdb_movie = self._find_candidate_by_tmdbid(tmdb_movie.external_id, tmdb_matches)
+                matched_tmdb_movie = self._find_candidate_by_tmdbid(tmdb_id, tmdb_matches)
                 if not matched_tmdb_movie:
                     # if not, assume this is the new movie and just add this to the list
                     unique_matches.append(im)
@@ -107,27 +169,46 @@ class CompositeSourceMatcher(Matcher, ABC):
 
 class ParallelMatcher(CompositeSourceMatcher):
 
-    def __init__(self, primary, secondary):
-        super().__init__(primary, secondary)
+    def __init__(self, primary, secondary, cache: MatchCache = None, id_map: ImdbTmdbIdMap = None,
+                 deadline: float = Config.matcher_deadline(), workers: int = 8):
+        super().__init__(primary, secondary, cache, id_map)
+        self.deadline = deadline
+        # shared by all media items (and read-only copies of this matcher), two workers per matched media item
+        self._executor = io_executor(workers)
 
     def top5_matches(self, parsed_media_item):
         """
-        This is basic matcher, used to match against TMDB first (which is fast), and when we dont have any match
-        candidates from this source as a fallback strategy we trying to match against (slow) IMDB.
+        Matches against TMDB and IMDB at the same time, then deduplicates results of both.
+
+        Both sources share a deadline: a source which does not return in time is skipped for this media item
+        (its search keeps running in background, and fills the cache if there is one).
 
         :param parsed_media_item: and media item to match
         :return: list of movie match candidates for a given media item
         """
-        tmdb_results = _top5_matches(parsed_media_item, match_source=self.primary_source)
-        imdb_results = _top5_matches(parsed_media_item, match_source=self.secondary_source)
+        tmdb_future, imdb_future = [self._executor.submit(carry_read_only(_in_worker(_top5_matches)),
+                                                          parsed_media_item, source, self.cache)
+                                    for source in (self.primary_source, self.secondary_source)]
+        wait([tmdb_future, imdb_future], timeout=self.deadline)
+
+        tmdb_results = self._result(tmdb_future, self.primary_source, parsed_media_item)
+        imdb_results = self._result(imdb_future, self.secondary_source, parsed_media_item)
 
         return self._dedup_matches(tmdb_matches=tmdb_results, imdb_matches=imdb_results)
 
+    def _result(self, future, source, parsed_media_item) -> List[MovieMatchCandidate]:
+        if not future.done():
+            logger.warning(f'{source_name(source)} did not match {parsed_media_item.title} within '
+                           f'{self.deadline}s, skipping it.')
+            metrics.count(f'{source_name(source)}.deadline_exceeded')
+            return []
+        return future.result()
+
 
 class FallbackLowThresholdSourceMatcher(CompositeSourceMatcher):
 
-    def __init__(self, primary, secondary):
-        super().__init__(primary, secondary)
+    def __init__(self, primary, secondary, cache: MatchCache = None, id_map: ImdbTmdbIdMap = None):
+        super().__init__(primary, secondary, cache, id_map)
 
     def top5_matches(self, parsed_media_item):
         """
@@ -138,23 +219,28 @@ class FallbackLowThresholdSourceMatcher(CompositeSourceMatcher):
         :return: list of movie match candidates for a given media item
         """
 
-        tmdb_results = _top5_matches(parsed_media_item, match_source=self.primary_source)
+        tmdb_results = _top5_matches(parsed_media_item, match_source=self.primary_source, cache=self.cache)
         matched = tmdb_results
 
         if len(tmdb_results) == 0 or tmdb_results[0].match < int(app.config.get('BANANA_MATCHER_THRESHOLD', 90)):
-            imdb_results = _top5_matches(parsed_media_item, match_source=self.secondary_source)
+            imdb_results = _top5_matches(parsed_media_item, match_source=self.secondary_source, cache=self.cache)
             matched = self._dedup_matches(tmdb_matches=tmdb_results, imdb_matches=imdb_results)
 
         return matched
 
 
+_cache = match_cache if Config.matcher_cache() else None
+_id_map = id_map if Config.matcher_cache() else None
+
 _matcher_mapping = {
-    'imdb': SourceMatcher(get_media_source('imdb')),
-    'tmdb': SourceMatcher(get_media_source('tmdb')),
-    'parallel': ParallelMatcher(primary=get_media_source('tmdb'), secondary=get_media_source('imdb')),
-    'fallback': FallbackSourceMatcher(primary=get_media_source('tmdb'), secondary=get_media_source('imdb')),
+    'imdb': SourceMatcher(get_media_source('imdb'), cache=_cache),
+    'tmdb': SourceMatcher(get_media_source('tmdb'), cache=_cache),
+    'parallel': ParallelMatcher(primary=get_media_source('tmdb'), secondary=get_media_source('imdb'), cache=_cache,
+                                id_map=_id_map),
+    'fallback': FallbackSourceMatcher(primary=get_media_source('tmdb'), secondary=get_media_source('imdb'),
+                                      cache=_cache),
     'low_threshold_fallback': FallbackLowThresholdSourceMatcher(
-        primary=get_media_source('tmdb'), secondary=get_media_source('imdb'))
+        primary=get_media_source('tmdb'), secondary=get_media_source('imdb'), cache=_cache, id_map=_id_map)
 }
 
 
@@ -188,7 +274,127 @@ def _boost_match_ratio_for_closest_release_year(matches: List[MovieMatchCandidat
     return matches
 
 
-def _top5_matches(parsed_media_item, match_source):
+def _ratio(s1: str, s2: str) -> int:
+    if _levenshtein_ratio is None:
+        return fuzz.ratio(s1, s2)
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+    return utils.intr(100 * _levenshtein_ratio(s1, s2))
+
+
+def ratio_matrix(queries: Sequence[str], choices: Sequence[str]) -> List[List[int]]:
+    """
+    Scores every query against every choice, with the same ratio as fuzz.ratio. Every distinct pair of strings
+    is scored only once, no matter how many times a query or a choice repeats.
+
+    :param queries: N strings to match, e.g. canonical titles of media items
+    :param choices: M strings to match against, e.g. canonical titles of match candidates
+    :return: N x M matrix of match ratios (0 - 100)
+    """
+    unique_choices = list(dict.fromkeys(choices))
+    scored: Dict[str, List[int]] = {query: [_ratio(query, choice) for choice in unique_choices]
+                                    for query in dict.fromkeys(queries)}
+
+    columns = {choice: column for column, choice in enumerate(unique_choices)}
+    return [[scored[query][columns[choice]] for choice in choices] for query in queries]
+
+
+def _candidate_titles(m: MovieMatchCandidate) -> List[str]:
+    """
+    :return: lowercase canonical titles a match candidate can be matched by: its title, original title (if it's
+             different) and alternative titles (AKAs)
+    """
+    titles = [m.canonical_title()]
+    if m.original_title and not m.original_title == m.title:
+        titles.append(canonical_movie_title(m.original_title, m.release_year))
+    if m.akas:
+        titles.extend(canonical_movie_title(aka, m.release_year) for aka in m.akas)
+    return [t.lower() for t in titles]
+
+
+def _score(canonical_title: str, candidates: List[MovieMatchCandidate]):
+    """
+    Sets match ratio of every candidate: the best ratio of its titles against the canonical title.
+
+    Titles of all candidates are scored in one ratio_matrix call (1 x M), so a title shared by several candidates
+    is scored once. Media items are not batched: each is scored on its own, as it is streamed to the matcher.
+    """
+    titles = [_candidate_titles(m) for m in candidates]
+    ratios = iter(ratio_matrix([canonical_title], [t for candidate_titles in titles for t in candidate_titles])[0])
+
+    for m, candidate_titles in zip(candidates, titles):
+        m.match = max(next(ratios) for _ in candidate_titles)
+        logger.debug(f'Matched {canonical_title} against {m} with ratio: {m.match}')
+
+
+def _candidates_needing_akas(candidates: List[MovieMatchCandidate], limit: int) -> List[MovieMatchCandidate]:
+    """
+    Picks scored candidates worth fetching alternative titles (AKAs) for, of those which did not get them with
+    search results (akas is None). AKAs are needed only if no candidate matches perfectly by its title (or original
+    title) yet, and then only for the most promising candidates: up to limit best scored ones, and up to limit most
+    relevant ones according to the source (search results come ordered by relevance).
+
+    :param candidates: scored match candidates, in order of search results
+    :param limit: maximal number of candidates picked by score and by relevance (each)
+    :return: candidates to fetch AKAs for
+    """
+    missing = [m for m in candidates if m.akas is None]
+    if not missing or max(m.match for m in candidates) == 100:
+        return []
+
+    by_score = sorted(missing, key=lambda m: m.match, reverse=True)[:limit]
+    picked = {}
+    for m in missing[:limit] + by_score:
+        picked.setdefault(id(m), m)
+    return list(picked.values())
+
+
+def _search(title: str, match_source, cache: MatchCache = None) -> List[MovieMatchCandidate]:
+    """
+    Searches a source for a title, unless its candidates are cached. Results of a search (or its failure, as
+    a negative entry) are cached right away.
+
+    :return: candidates found by the source, possibly shared by other callers; do not modify them
+    """
+    cached = cache.get(match_source, title) if cache is not None else None
+    if cached is not None:
+        return cached
+
+    match_candidates = []
+    # noinspection PyBroadException
+    try:
+        with metrics.timer(f'{source_name(match_source)}.search'):
+            match_candidates = match_source.match(title=title)
+    except BaseException:
+        logger.warn(f"Exception caught while matching {title} with source: {traceback.format_exc()}. "
+                    f"Media match skipped for this source.")
+
+    if cache is not None:
+        cache.put(match_source, title, match_candidates)
+    return match_candidates
+
+
+def _in_worker(call):
+    """
+    :return: the call, removing the database session of the worker thread it runs on once it is done
+    """
+    def in_worker(*args, **kwargs):
+        try:
+            return call(*args, **kwargs)
+        finally:
+            db.session.remove()
+    return in_worker
+
+
+def _copy_candidate(m: MovieMatchCandidate) -> MovieMatchCandidate:
+    candidate = m.transient_copy()
+    candidate.akas = list(m.akas) if m.akas is not None else None
+    return candidate
+
+
+def _top5_matches(parsed_media_item, match_source, cache: MatchCache = None):
     """
     Matches media item against match source (IMDB, TMDB for movies).
 
@@ -197,58 +403,53 @@ def _top5_matches(parsed_media_item, match_source):
     just title and year: 'Monty Python and the Holy Grail (1975)'. This gives pretty good results
     for decent movie identification.
 
-    It checks original title or alternative titles (if available) for a given source as well.
+    It checks original title or alternative titles (if available) for a given source as well. Titles of all
+    candidates are scored at once (see ratio_matrix), a candidate's match ratio is the best of its titles.
+
+    Sources which do not return AKAs with search results (TMDB) fetch them on demand (fetch_akas), after search
+    results are scored, and only for candidates which can still change the result (see _candidates_needing_akas).
 
-    The it sorts results from best match till the worst one, and returns top 5 entries.
+    If a MatchCache is given, candidates (and AKAs fetched for them) are read from, and written to it; only
+    a cache miss searches the source. Concurrent searches for the same (normalized) title at the same source, from
+    any matcher or job, are coalesced into one (see SingleFlight); every caller scores its own copy of candidates.
+    Read-only (see read_only) and writing searches are coalesced only with their own kind.
+
+    The it sorts results from best match till the worst one, and returns top 5 entries. Sources which return
+    lightweight candidates (IMDB) complete the rest of movie information of just those (complete).
 
     :param parsed_media_item: media item to match
     :param match_source: a source to match against (IMDB, TMDB)
+    :param cache: a cache of source candidate lists, or None
     :return: an array of MovieMatchCandidates
     """
     logger.info(f'Matching {parsed_media_item}...')
 
-    match_candidates = []
-
-    # noinspection PyBroadException
-    try:
-        match_candidates = match_source.match(title=parsed_media_item.title)
-    except BaseException:
-        logger.warn(f"Exception caught while matching {parsed_media_item} with source: {traceback.format_exc()}. "
-                    f"Media match skipped for this source.")
+    # a read-only search (planning) does not fill the cache, so it is not shared with searches which would
+    search = (source_name(match_source), normalized_query(parsed_media_item.title), is_read_only())
+    match_candidates = [_copy_candidate(m) for m in
+                        _searches.do(search, lambda: _search(parsed_media_item.title, match_source, cache))]
 
     canonical_title = canonical_movie_title(parsed_media_item.title, parsed_media_item.year).lower()
 
     logger.info(match_candidates)
 
-    results = []
-    for m in match_candidates:
-
-        match_ratio = fuzz.ratio(canonical_title.lower(), m.canonical_title().lower())
-        candidate_year = m.release_year
-        logger.debug(f'Matched {canonical_title} against {m} with ratio: {match_ratio}')
-
-        # if match ratio is not perfect still try to match against original title, if present
-        # and if it's different from regular title
-        if match_ratio < 100 and m.original_title and not m.original_title == m.title:
-            canonical_original_title = canonical_movie_title(m.original_title, candidate_year).lower()
-            original_title_match = fuzz.ratio(canonical_title, canonical_original_title)
-            if original_title_match > match_ratio:
-                match_ratio = original_title_match
-
-        # Check match against akas if we did not find perfect match yet; this is especially important
-        # for foreign movies
-        if match_ratio < 100 and m.akas:
-            akas = m.akas
-            logger.debug(f'Querying for AKAs for {canonical_title}, got {akas}')
-            for aka in akas:
-                canonical_aka = canonical_movie_title(aka, candidate_year).lower()
-                original_title_match = fuzz.ratio(canonical_title, canonical_aka)
-                if original_title_match > match_ratio:
-                    match_ratio = original_title_match
-
-        # set calculated match ratio for this match candidate
-        m.match = match_ratio
-        results.append(m)
+    results = list(match_candidates)
+    with metrics.timer('matcher.scoring'):
+        _score(canonical_title, results)
+
+    # Check match against akas if we did not find perfect match yet; this is especially important
+    # for foreign movies
+    fetch_akas = getattr(match_source, 'fetch_akas', None)
+    needing_akas = _candidates_needing_akas(results, Config.matcher_aka_candidates()) if fetch_akas else []
+    if needing_akas:
+        logger.debug(f'Fetching AKAs of {len(needing_akas)} of {len(results)} candidates for {canonical_title}')
+        with metrics.timer(f'{source_name(match_source)}.aka_fetch'):
+            fetch_akas(needing_akas)
+        with metrics.timer('matcher.scoring'):
+            _score(canonical_title, needing_akas)
+
+    if cache is not None and needing_akas:
+        cache.put(match_source, parsed_media_item.title, results)
 
     if len(results) < 1:
         logger.info(f'No matching movies found for {canonical_title}.')
@@ -262,6 +463,11 @@ def _top5_matches(parsed_media_item, match_source):
 
     top5_movies = sorted(top5_movies_with_boost, key=lambda m: m.match, reverse=True)[:5]
 
+    complete = getattr(match_source, 'complete', None)
+    if complete:
+        with metrics.timer(f'{source_name(match_source)}.complete'):
+            complete(top5_movies)
+
     logger.debug(f'Top 5 matches for {canonical_title} : {top5_movies}')
 
     return top5_movies
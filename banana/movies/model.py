@@ -118,9 +118,15 @@ class MovieMatchCandidate(db.Model, JsonMixin):
                      external_id=self.external_id,
                      rating=self.rating,
                      poster=self.poster,
-                     genres=self.genres,
+                     genres=self.named_genres(),
                      source=self.source)
 
+    def named_genres(self) -> List[Genre]:
+        """
+        :return: genres of this candidate, but those a source could not name yet (they are not persisted)
+        """
+        return [g for g in self.genres if g.name is not None]
+
     def transient_copy(self):
         return MovieMatchCandidate(
             title=self.title,
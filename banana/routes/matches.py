@@ -2,6 +2,7 @@ from flask import request, jsonify
 
 from ..media.jobs import ManualMovieMatchJob, FixMatchJob
 from ..movies.model import MovieMatchRequest
+from ..movies.matchcache import match_cache
 from ..core import app, ThreadPoolJobExecutor, getLogger
 
 logger = getLogger(__name__)
@@ -22,3 +23,8 @@ def create_match():
     executor.submit(match_job)
 
     return jsonify(job_id=match_job.id())
+
+
+@app.route('/api/matches/cache', methods=['GET'])
+def match_cache_stats():
+    return jsonify(match_cache.stats())
@@ -0,0 +1,13 @@
+from flask import jsonify
+
+from ..core import app
+from ..core.httpcache import response_cache
+from ..core.metrics import metrics, summary
+from ..media.sources.tmdb import tmdb_client
+from ..movies.matchcache import match_cache
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify(**summary(metrics.snapshot()), match_cache=match_cache.stats(),
+                   http_cache=response_cache.stats(), tmdb_http=tmdb_client.stats())
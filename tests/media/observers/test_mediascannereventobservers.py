@@ -3,6 +3,7 @@ import pathlib
 import tempfile
 
 from unittest.mock import MagicMock
+from banana.events import ScanRootProgress
 from banana.media.observers.eventobservers import *
 from banana.media.observables.mediascanner import FileSystemMediaScanner
 
@@ -35,6 +36,23 @@ class MediaScannerEventObserversTest(unittest.TestCase):
             .subscribe(MediaScannerProgressEventObserver(self.job_context, sock))
         sock.emit.assert_called_with(self.job_context.type(), event, namespace=JOB_NAMESPACE)
 
+    def test_emit_roots_progress(self):
+        scanner = FileSystemMediaScanner(media_scan_path=[self.temp_dir],
+                                         job_context=self.job_context, skip_filetype_checks=True)
+
+        sock = MockWebSocket()
+        sock.emit = MagicMock()
+
+        rx.Observable.create(scanner).map(lambda media, index: (index + 1, media))\
+            .subscribe(MediaScannerProgressEventObserver(self.job_context, sock,
+                                                         total_items=scanner.media_items_to_scan,
+                                                         roots_progress=scanner.roots_progress))
+
+        event = JobProgressEvent.from_json(sock.emit.call_args[0][1])
+        self.assertEqual(2, event.current_item)
+        self.assertEqual(2, event.total_items)
+        self.assertEqual([ScanRootProgress(path=self.temp_dir, current_item=2, total_items=2)], event.roots)
+
     def test_emit_finished_events(self):
         scanner = FileSystemMediaScanner(media_scan_path=self.temp_dir,
                                          job_context=self.job_context, skip_filetype_checks=True)
@@ -43,7 +61,8 @@ class MediaScannerEventObserversTest(unittest.TestCase):
         sock = MockWebSocket()
         sock.emit = MagicMock()
 
-        event = JobCompletedEvent(job_id=self.job_context.id(), job_type=self.job_context.type()).to_json()
+        event = JobCompletedEvent(job_id=self.job_context.id(), job_type=self.job_context.type(),
+                                  summary=dict(timers={}, counters={})).to_json()
 
         scanner_observer.subscribe(MediaScannerCompletedOrErrorEventObserver(self.job_context, sock))
         sock.emit.assert_called_once_with(self.job_context.type(), event, namespace=JOB_NAMESPACE)
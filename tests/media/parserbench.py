@@ -0,0 +1,145 @@
+"""
+Accuracy and throughput benchmark of MediaParser on the golden corpus of release names (files/parser_corpus.json).
+
+Every release of the corpus has expected values of some of the corpus fields; a null value means the field
+should not be parsed at all, and a field which is not listed is not checked. Results are compared with the stored
+baseline (files/parser_baseline.json): lower accuracy of any field, or throughput lower by more than a tolerance,
+is a regression.
+
+    python -m tests.media.parserbench             # report and compare with the baseline
+    python -m tests.media.parserbench --update    # store the results as a new baseline
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+from banana.media.p import MediaParser
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'files', 'parser_corpus.json')
+BASELINE = os.path.join(os.path.dirname(__file__), 'files', 'parser_baseline.json')
+
+# throughput depends on the machine, only a drop larger than this is reported as a regression
+THROUGHPUT_TOLERANCE = 0.2
+
+
+def load_corpus(path: str = CORPUS) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_baseline(path: str = BASELINE) -> dict:
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def accuracy(corpus: dict, parser: MediaParser = None) -> Dict[str, dict]:
+    """
+    :return: dict of field: {'correct': int, 'total': int, 'failures': [release names]}
+    """
+    parser = parser if parser is not None else MediaParser()
+    results = {field: {'correct': 0, 'total': 0, 'failures': []} for field in corpus['fields']}
+    for release in corpus['releases']:
+        parsed = parser.parse(release['name'])
+        for field, expected in release['expected'].items():
+            result = results[field]
+            result['total'] += 1
+            if parsed.get(field) == expected:
+                result['correct'] += 1
+            else:
+                result['failures'].append(release['name'])
+    return results
+
+
+def throughput(corpus: dict, parser: MediaParser = None, seconds: float = 2.0) -> float:
+    """
+    :return: parsed release names per second, over (at least) the given number of seconds
+    """
+    parser = parser if parser is not None else MediaParser()
+    names = [release['name'] for release in corpus['releases']]
+    for name in names:
+        parser.parse(name)
+
+    parsed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for name in names:
+            parser.parse(name)
+        parsed += len(names)
+    return parsed / (time.perf_counter() - start)
+
+
+def run(corpus: dict, seconds: float = 2.0) -> dict:
+    """
+    :return: benchmark results, in the format of the baseline
+    """
+    fields = accuracy(corpus)
+    return {
+        'corpus_version': corpus['version'],
+        'accuracy': {field: {'correct': r['correct'], 'total': r['total']} for field, r in fields.items()},
+        'names_per_second': round(throughput(corpus, seconds=seconds)),
+    }
+
+
+def regressions(results: dict, baseline: dict) -> List[str]:
+    """
+    :return: descriptions of regressions of results against the baseline
+    """
+    if baseline is None:
+        return []
+    if baseline['corpus_version'] != results['corpus_version']:
+        return [f"baseline is of corpus version {baseline['corpus_version']}, "
+                f"not {results['corpus_version']}; update the baseline"]
+
+    found = []
+    for field, expected in baseline['accuracy'].items():
+        actual = results['accuracy'].get(field, {'correct': 0})
+        if actual['correct'] < expected['correct']:
+            found.append(f"{field}: {actual['correct']} correct, baseline {expected['correct']}")
+
+    if results['names_per_second'] < baseline['names_per_second'] * (1 - THROUGHPUT_TOLERANCE):
+        found.append(f"throughput: {results['names_per_second']} names/sec, "
+                     f"baseline {baseline['names_per_second']}")
+    return found
+
+
+def main(argv=None) -> int:
+    args = argparse.ArgumentParser(description='MediaParser accuracy and throughput benchmark')
+    args.add_argument('--update', action='store_true', help='store the results as a new baseline')
+    args.add_argument('--seconds', type=float, default=2.0, help='duration of the throughput measurement')
+    args.add_argument('--failures', action='store_true', help='list release names parsed wrong, per field')
+    args = args.parse_args(argv)
+
+    corpus = load_corpus()
+    results = run(corpus, seconds=args.seconds)
+
+    print(f"corpus version {corpus['version']}, {len(corpus['releases'])} releases")
+    for field, result in results['accuracy'].items():
+        percent = 100.0 * result['correct'] / result['total'] if result['total'] else 100.0
+        print(f"  {field:<12} {result['correct']:>5}/{result['total']:<5} {percent:6.1f}%")
+    print(f"  throughput   {results['names_per_second']} names/sec")
+
+    if args.failures:
+        for field, result in accuracy(corpus).items():
+            for name in result['failures']:
+                print(f'  {field}: {name}')
+
+    if args.update:
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'baseline updated: {BASELINE}')
+        return 0
+
+    found = regressions(results, load_baseline())
+    for regression in found:
+        print(f'REGRESSION {regression}')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import unittest
+
+from banana.media.batchparser import BatchMediaParser, ParsedColumns, parse_columns
+from banana.media.p import MediaParser
+
+
+class BatchMediaParserTest(unittest.TestCase):
+
+    _names = ['2001.A.Space.Odyssey.(1968).1080p.UHD.BluRay.DD5.1.HDR.H.264-DON.mkv',
+              'The Walking Dead S05E03 720p HDTV x264-ASAP[ettv]',
+              'Future Boy Conan - 01 - Remnant Island.mkv',
+              'A Foo Bar 1999 1080p BluRay.mkv',
+              'B Quux 720p.mkv']
+
+    def test_parse_columns(self):
+        columns = parse_columns(['A Foo Bar 1999 1080p BluRay.mkv', None])
+
+        self.assertEqual(2, len(columns))
+        self.assertEqual(['A Foo Bar', None], columns.column('title'))
+        self.assertEqual([1999, None], columns.column('year'))
+        self.assertEqual({}, columns.row(1))
+
+    def test_parse_error(self):
+        columns = ParsedColumns(['foo'], {'title': [None]}, errors={0: 'boom'})
+
+        self.assertRaises(ValueError, columns.row, 0)
+
+    def test_in_process(self):
+        parsed = BatchMediaParser(processes=0, chunk_size=2).parse_all(self._names)
+
+        self.assertEqual([MediaParser().parse(name) for name in self._names], list(parsed))
+
+    def test_process_pool(self):
+        names = self._names * 20
+        parser = BatchMediaParser(processes=2, chunk_size=7)
+        chunks = list(parser.parse_chunks(enumerate(names), filename=lambda item: item[1]))
+
+        self.assertEqual(list(enumerate(names)), [item for chunk, _ in chunks for item in chunk])
+        self.assertEqual([MediaParser().parse(name) for name in names],
+                         [row for _, columns in chunks for row in columns])
+
+    def test_process_pool_is_shared(self):
+        self.assertIs(BatchMediaParser(processes=2)._executor, BatchMediaParser(processes=2)._executor)
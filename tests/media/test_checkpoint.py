@@ -0,0 +1,97 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import rx
+
+from banana.core import app, db
+from banana.media.checkpoint import ScanCheckpoint, ScanCheckpointObserver, ScanJobStatus
+from banana.media.item import ParsedMediaItem
+from banana.media.jobs import FileSystemScanJob
+from banana.media.observables.mediascanner import FileSystemMediaScanner
+from banana.media.scanindex import ScanIndex, ScanIndexEntry, ScanOutcome
+from tests.fixtures import MockJobContext
+
+
+class ScanCheckpointTest(unittest.TestCase):
+
+    _files = ['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv']
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.job_context = MockJobContext('1234')
+        self.temp_dir = tempfile.mkdtemp()
+        pathlib.Path(self.temp_dir, self._files[0]).touch()
+        pathlib.Path(self.temp_dir, self._files[1]).touch()
+
+    def _media(self, filename):
+        return ParsedMediaItem(path=self.temp_dir, filename=filename)
+
+    def test_checkpoint_position(self):
+        ScanCheckpoint.start(self.job_context.id(), [self.temp_dir])
+        observer = ScanCheckpointObserver(self.job_context, interval=0)
+
+        observer.on_next((1, self._media(self._files[0])))
+        observer.on_next((2, self._media(self._files[1])))
+
+        checkpoint = ScanCheckpoint.query.filter_by(job_id='1234').one()
+        self.assertEqual(ScanJobStatus.RUNNING, checkpoint.status)
+        self.assertEqual((2, self.temp_dir, self._files[1]),
+                         (checkpoint.current_item, checkpoint.last_path, checkpoint.last_filename))
+        self.assertTrue(checkpoint.is_running())
+        self.assertEqual([], ScanCheckpoint.interrupted())
+
+    def test_checkpoint_interval(self):
+        ScanCheckpoint.start(self.job_context.id(), [self.temp_dir])
+        observer = ScanCheckpointObserver(self.job_context, interval=60)
+
+        observer.on_next((1, self._media(self._files[0])))
+
+        self.assertEqual(0, ScanCheckpoint.query.filter_by(job_id='1234').one().current_item)
+
+    def test_failed_job_can_be_resumed(self):
+        ScanCheckpoint.start(self.job_context.id(), [self.temp_dir])
+        observer = ScanCheckpointObserver(self.job_context, interval=60)
+
+        observer.on_next((1, self._media(self._files[0])))
+        observer.on_error('some error')
+
+        checkpoint = ScanCheckpoint.query.filter_by(job_id='1234').one()
+        self.assertEqual((ScanJobStatus.FAILED, 1), (checkpoint.status, checkpoint.current_item))
+        self.assertEqual(['1234'], [c.job_id for c in ScanCheckpoint.interrupted()])
+
+        job = FileSystemScanJob.resume(checkpoint)
+        self.assertEqual('1234', job.id())
+        self.assertEqual([self.temp_dir], job._media_scan_paths)
+
+    def test_completed_job_removes_checkpoint(self):
+        ScanCheckpoint.start(self.job_context.id(), [self.temp_dir])
+        ScanCheckpointObserver(self.job_context).on_completed()
+
+        self.assertEqual(0, ScanCheckpoint.query.count())
+
+    def test_resumed_scan_skips_processed_files(self):
+        # another job processed the second file, the interrupted one only the first
+        for filename, job_id in zip(self._files, ['1234', '5678']):
+            ScanIndex().record(self.temp_dir, filename, os.stat(os.path.join(self.temp_dir, filename)),
+                               ScanOutcome.UNMATCHED, job_id=job_id)
+        self.db.session.commit()
+
+        scan_index = ScanIndex(job_id='1234')
+        scanner = FileSystemMediaScanner(media_scan_path=self.temp_dir, job_context=self.job_context,
+                                         skip_filetype_checks=True, scan_index=scan_index)
+        processed_items = []
+        rx.Observable.create(scanner).subscribe(on_next=lambda item: processed_items.append(item))
+        self.assertEqual([self._files[1]], [item.filename for item in processed_items])
+
+        # and the outcome of a file known to another job is updated, not duplicated
+        scan_index.record(self.temp_dir, self._files[1], processed_items[0].file_stat, ScanOutcome.MATCHED,
+                          job_id='1234')
+        self.db.session.commit()
+        self.assertEqual(2, ScanIndexEntry.query.filter_by(job_id='1234').count())
+        self.assertEqual(2, ScanIndexEntry.query.count())
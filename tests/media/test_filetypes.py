@@ -0,0 +1,81 @@
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from banana.media import filetypes
+from banana.media.filetypes import FileTypeCache, FileTypeSniffer
+
+
+class FileTypeSnifferTest(unittest.TestCase):
+
+    _fake_mkv_magic_bytes = [
+        0x1A, 0x45,
+        0xDF, 0xA3,
+        0x93, 0x42,
+        0x82, 0x88,
+        0x6D, 0x61,
+        0x74, 0x72,
+        0x6F, 0x73,
+        0x6B, 0x61]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = FileTypeCache()
+        with open(os.path.join(self.temp_dir, 'A Foo Bar 1999.mkv'), 'wb') as f:
+            f.write(bytearray(self._fake_mkv_magic_bytes))
+        pathlib.Path(self.temp_dir, 'B Quux 720p.mkv').touch()
+        pathlib.Path(self.temp_dir, 'A Foo Bar 1999.nfo').touch()
+
+    def _stat(self, filename):
+        return os.stat(os.path.join(self.temp_dir, filename))
+
+    def test_is_supported(self):
+        sniffer = FileTypeSniffer(workers=1, cache=self.cache)
+
+        self.assertTrue(sniffer.is_supported(self.temp_dir, 'A Foo Bar 1999.mkv'))
+        self.assertFalse(sniffer.is_supported(self.temp_dir, 'B Quux 720p.mkv'))
+        self.assertFalse(sniffer.is_supported(self.temp_dir, 'does not exist.mkv'))
+
+    def test_extension_fast_path(self):
+        sniffer = FileTypeSniffer(workers=1, cache=self.cache)
+
+        with mock.patch.object(filetypes, '_read_header') as read_header:
+            self.assertFalse(sniffer.is_supported(self.temp_dir, 'A Foo Bar 1999.nfo'))
+            read_header.assert_not_called()
+
+    def test_sniffed_once(self):
+        sniffer = FileTypeSniffer(workers=1, cache=self.cache)
+        st = self._stat('A Foo Bar 1999.mkv')
+
+        with mock.patch.object(filetypes, '_read_header', wraps=filetypes._read_header) as read_header:
+            self.assertTrue(sniffer.is_supported(self.temp_dir, 'A Foo Bar 1999.mkv', st))
+            self.assertTrue(sniffer.is_supported(self.temp_dir, 'A Foo Bar 1999.mkv', st))
+            self.assertTrue(sniffer.is_supported(self.temp_dir, 'A Foo Bar 1999.mkv'))
+            self.assertEqual(1, read_header.call_count)
+        self.assertEqual(1, len(self.cache))
+
+    def test_modified_file_is_sniffed_again(self):
+        sniffer = FileTypeSniffer(workers=1, cache=self.cache)
+        self.assertFalse(sniffer.is_supported(self.temp_dir, 'B Quux 720p.mkv', self._stat('B Quux 720p.mkv')))
+
+        with open(os.path.join(self.temp_dir, 'B Quux 720p.mkv'), 'wb') as f:
+            f.write(bytearray(self._fake_mkv_magic_bytes))
+
+        self.assertTrue(sniffer.is_supported(self.temp_dir, 'B Quux 720p.mkv', self._stat('B Quux 720p.mkv')))
+
+    def test_sniff_all_keeps_order(self):
+        files = []
+        for i in range(20):
+            filename = f'Movie {i}.mkv'
+            with open(os.path.join(self.temp_dir, filename), 'wb') as f:
+                f.write(bytearray(self._fake_mkv_magic_bytes) if i % 2 == 0 else b'not a video')
+            files.append((self.temp_dir, filename, None))
+        files.append((self.temp_dir, 'A Foo Bar 1999.nfo', None))
+
+        sequential = list(FileTypeSniffer(workers=1, cache=FileTypeCache()).sniff_all(iter(files)))
+        concurrent = list(FileTypeSniffer(workers=4, cache=FileTypeCache()).sniff_all(iter(files)))
+
+        self.assertEqual(sequential, concurrent)
+        self.assertEqual([i % 2 == 0 for i in range(20)] + [False], [supported for *_, supported in concurrent])
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from imdb.Movie import Movie
+
+from banana.media.sources.imdb import IMDBApi, IMDbAccessorPool
+from banana.movies.model import MovieMatchCandidate
+
+
+class IMDbAccessorPoolTest(unittest.TestCase):
+
+    def test_accessors_are_reused_and_bounded(self):
+        pool = IMDbAccessorPool(size=2)
+        borrowed = []
+        lock = threading.Lock()
+
+        def borrow():
+            with pool.accessor() as ia:
+                with lock:
+                    borrowed.append(ia)
+                time.sleep(0.05)
+
+        with patch('banana.media.sources.imdb._imdb', side_effect=lambda: MagicMock()) as create:
+            threads = [threading.Thread(target=borrow) for _ in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(2, create.call_count)
+        self.assertEqual(6, len(borrowed))
+        self.assertEqual(2, len({id(ia) for ia in borrowed}))
+
+
+class IMDBApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.search_result = Movie(movieID='4834762', data={'title': 'These Daughters of Mine', 'year': 2015})
+        self.main = Movie(movieID='4834762', data={'title': 'These Daughters of Mine', 'year': 2015,
+                                                   'plot outline': 'Two sisters...', 'rating': 6.7,
+                                                   'genres': ['Comedy', 'Drama']})
+
+    def test_match_returns_lightweight_candidates(self):
+        accessor = MagicMock()
+        accessor.search_movie.return_value = [self.search_result]
+
+        with patch('banana.media.sources.imdb._imdb', return_value=accessor), \
+                patch('banana.media.sources.imdb._accessors', IMDbAccessorPool(size=1)):
+            candidates = IMDBApi.match('These Daughters of Mine')
+
+        accessor.update.assert_not_called()
+        self.assertEqual(('These Daughters of Mine', 2015, '4834762'),
+                         (candidates[0].title, candidates[0].release_year, candidates[0].external_id))
+        self.assertIsNone(candidates[0].akas)
+        self.assertIsNone(candidates[0].plot)
+
+    def test_complete_fetches_main_information_of_lightweight_candidates(self):
+        lightweight = MovieMatchCandidate(title='These Daughters of Mine', release_year=2015,
+                                          external_id='4834762', source='imdb', genres=[])
+        complete = MovieMatchCandidate(title='Amélie', release_year=2001, plot='Amélie...', external_id='211915',
+                                       source='imdb', genres=[])
+        imdb_main = MagicMock(return_value=self.main)
+
+        with patch('banana.media.sources.imdb._imdb_main', imdb_main):
+            IMDBApi.complete([lightweight, complete])
+
+        imdb_main.assert_called_once_with('4834762')
+        self.assertEqual('Two sisters...', lightweight.plot)
+        self.assertEqual(['Comedy', 'Drama'], [g.name for g in lightweight.genres])
+        self.assertEqual('These Daughters of Mine', lightweight.title)
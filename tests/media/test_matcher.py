@@ -1,12 +1,15 @@
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from dataclasses import replace
 
 from banana.media.sources import TMDBApi, IMDBApi
 from banana.movies.model import Movie, MovieMatchCandidate
 from banana.media.item import ParsedMediaItem
 from banana.movies.matcher import SourceMatcher, FallbackSourceMatcher, FallbackLowThresholdSourceMatcher, \
-    _boost_match_ratio_for_closest_release_year
+    ParallelMatcher, _boost_match_ratio_for_closest_release_year, ratio_matrix
+from fuzzywuzzy import fuzz
 
 
 class MatcherTest(unittest.TestCase):
@@ -83,6 +86,32 @@ class MatcherTest(unittest.TestCase):
         tmdb_source.match.assert_called_with(title='Mine døtre kuene')
         self.assertEqual(100, matches[0].match)
 
+    def test_fetch_akas_lazily(self):
+        tmdb_source = TMDBApi()
+        file_with_foereign_title = replace(self.file, title="Mine døtre kuene")
+        candidates = [replace(self.movie_match_candidate, external_id=str(i), akas=None) for i in range(20)]
+        tmdb_source.match = MagicMock(return_value=candidates)
+        alternative_titles = MagicMock(side_effect=lambda tmdb_id: ["Mine døtre kuene"] if tmdb_id == '0' else ["Foo"])
+
+        with patch.object(TMDBApi, '_alternative_titles', alternative_titles):
+            matches = SourceMatcher(tmdb_source).top5_matches(file_with_foereign_title)
+
+        self.assertEqual(5, alternative_titles.call_count)
+        self.assertEqual('0', matches[0].external_id)
+        self.assertEqual(100, matches[0].match)
+
+    def test_skip_akas_of_perfect_match(self):
+        tmdb_source = TMDBApi()
+        candidates = [replace(self.movie_match_candidate, external_id=str(i), akas=None) for i in range(20)]
+        tmdb_source.match = MagicMock(return_value=candidates)
+        alternative_titles = MagicMock(return_value=[])
+
+        with patch.object(TMDBApi, '_alternative_titles', alternative_titles):
+            matches = SourceMatcher(tmdb_source).top5_matches(self.file)
+
+        alternative_titles.assert_not_called()
+        self.assertEqual(100, matches[0].match)
+
     def test_fallback_matcher(self):
         tmdb_source = TMDBApi()
         tmdb_source.match = MagicMock(return_value=[])
@@ -136,6 +165,42 @@ class MatcherTest(unittest.TestCase):
         tmdb_source.get_by_imdbid_id.assert_called_with(4834762)
         imdb_source.match.assert_called_with(title='THESE daughters of MINE')
 
+    def test_parallel_matcher_queries_sources_at_once(self):
+        # each search waits for the other one to start, so they pass only if they run at the same time
+        both_searching = threading.Barrier(2, timeout=5)
+
+        def searching(result):
+            def match(title):
+                both_searching.wait()
+                return result
+            return match
+
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(side_effect=searching([replace(self.movie_match_candidate,
+                                                                     external_id=123456)]))
+        tmdb_source.get_by_imdbid_id = MagicMock(return_value=replace(self.movie_match_candidate, external_id=123456))
+        imdb_source = IMDBApi()
+        imdb_source.match = MagicMock(side_effect=searching([replace(self.movie_match_candidate, source='imdb')]))
+
+        matches = ParallelMatcher(primary=tmdb_source, secondary=imdb_source, deadline=10).top5_matches(
+            replace(self.file, title='These Daughters of Mine'))
+
+        self.assertFalse(both_searching.broken)
+        self.assertEqual(1, len(matches))
+        self.assertEqual(100, matches[0].match)
+
+    def test_parallel_matcher_skips_source_past_deadline(self):
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(return_value=[self.movie_match_candidate])
+        imdb_source = IMDBApi()
+        imdb_source.match = MagicMock(side_effect=lambda title: time.sleep(1) or [])
+
+        matches = ParallelMatcher(primary=tmdb_source, secondary=imdb_source, deadline=0.1).top5_matches(
+            replace(self.file, title='These Daughters of Mine (deadline)'))
+
+        self.assertEqual(1, len(matches))
+        self.assertEqual('tmdb', matches[0].source)
+
     def test_boost_ratio(self):
         movies = [replace(self.movie_match_candidate, release_year=2013, match=95),
                   replace(self.movie_match_candidate, release_year=2012, match=95),
@@ -165,3 +230,13 @@ class MatcherTest(unittest.TestCase):
         self.assertEqual(97, matches[0].match)
         self.assertEqual(96, matches[1].match)
         self.assertEqual(96, matches[2].match)
+
+    def test_ratio_matrix(self):
+        queries = ['these daughters of mine (2015)', 'foo', 'these daughters of mine (2015)']
+        choices = ['these daughters of mine (2015)', 'moje corki krowy (2015)', '', 'foo', 'moje corki krowy (2015)']
+
+        matrix = ratio_matrix(queries, choices)
+
+        self.assertEqual([[fuzz.ratio(q, c) for c in choices] for q in queries], matrix)
+        self.assertEqual([], ratio_matrix([], choices))
+        self.assertEqual([[]], ratio_matrix(['foo'], []))
@@ -1,7 +1,7 @@
 import unittest
 from banana.core import app, db
 from banana.movies.model import *
-from banana.media.item import ParsedMediaItem
+from banana.media.item import ParsedMediaItem, ProcessedMediaItems
 from banana.media.model import *
 from pathlib import PurePath
 
@@ -41,3 +41,24 @@ class ParsedMediaItemTest(unittest.TestCase):
         self.assertEqual(None, item_abs_path2)
         self.assertEqual('/qoox/Westing Boom.mp4', PurePath(item_abs_path3).as_posix())
 
+
+    def test_processed_media_items(self):
+        movie = Movie(title="Foo")
+        movie.media_items += [ParsedMediaItem(filename="Foo", path="bar")]
+        self.db.session.add(movie)
+        self.db.session.add(ParsedMediaItem(filename="Quux", path="bar"))
+        self.db.session.commit()
+
+        processed = ProcessedMediaItems()
+
+        self.assertTrue(processed.is_processed("bar", "Foo"))
+        self.assertTrue(processed.is_matched("bar", "Foo"))
+        self.assertTrue(processed.is_processed("bar", "Quux"))
+        self.assertFalse(processed.is_matched("bar", "Quux"))
+        self.assertFalse(processed.is_processed("bar", "Baz"))
+
+        processed.add("bar", "Baz", matched=False)
+        processed.discard("bar", "Foo")
+
+        self.assertTrue(processed.is_processed("bar", "Baz"))
+        self.assertFalse(processed.is_processed("bar", "Foo"))
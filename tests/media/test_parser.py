@@ -0,0 +1,64 @@
+import pickle
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from banana.media.p import MediaParser
+from tests.media import parserbench
+
+
+class MediaParserTest(unittest.TestCase):
+
+    _names = ['2001.A.Space.Odyssey.(1968).1080p.UHD.BluRay.DD5.1.HDR.H.264-DON.mkv',
+              'The Walking Dead S05E03 720p HDTV x264-ASAP[ettv]',
+              'Future Boy Conan - 01 - Remnant Island.mkv',
+              'A Foo Bar 1999 1080p BluRay.mkv']
+
+    def test_parse(self):
+        parsed = MediaParser().parse('A Foo Bar 1999 1080p BluRay.mkv')
+
+        self.assertEqual({'year': 1999, 'resolution': '1080p', 'quality': 'BluRay', 'container': 'mkv',
+                          'title': 'A Foo Bar'}, parsed)
+
+    def test_parse_episode(self):
+        parsed = MediaParser().parse('The Walking Dead S05E03 720p HDTV x264-ASAP[ettv]')
+
+        self.assertEqual('The Walking Dead', parsed['title'])
+        self.assertEqual(5, parsed['season'])
+        self.assertEqual(3, parsed['episode'])
+        self.assertEqual('ASAP[ettv]', parsed['group'])
+
+    def test_shared_by_threads(self):
+        parser = MediaParser()
+        expected = [MediaParser().parse(name) for name in self._names]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(parser.parse, self._names * 50))
+
+        self.assertEqual(expected * 50, results)
+
+    def test_pickle(self):
+        parser = pickle.loads(pickle.dumps(MediaParser()))
+
+        self.assertEqual([MediaParser().parse(name) for name in self._names],
+                         [parser.parse(name) for name in self._names])
+
+    def test_corpus_accuracy(self):
+        corpus = parserbench.load_corpus()
+        baseline = parserbench.load_baseline()
+        results = parserbench.accuracy(corpus)
+
+        self.assertEqual(baseline['corpus_version'], corpus['version'])
+        for field, expected in baseline['accuracy'].items():
+            self.assertGreaterEqual(results[field]['correct'], expected['correct'], results[field]['failures'])
+
+    def test_regressions(self):
+        baseline = {'corpus_version': 1, 'accuracy': {'title': {'correct': 2, 'total': 2}}, 'names_per_second': 1000}
+
+        self.assertEqual([], parserbench.regressions(
+            {'corpus_version': 1, 'accuracy': {'title': {'correct': 2, 'total': 2}}, 'names_per_second': 900},
+            baseline))
+        self.assertEqual(2, len(parserbench.regressions(
+            {'corpus_version': 1, 'accuracy': {'title': {'correct': 1, 'total': 2}}, 'names_per_second': 500},
+            baseline)))
+        self.assertEqual(1, len(parserbench.regressions(
+            {'corpus_version': 2, 'accuracy': {}, 'names_per_second': 1000}, baseline)))
@@ -0,0 +1,144 @@
+import io
+import json
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from banana.core import app, db
+from banana.media.item import ParsedMediaItem, ProcessedMediaItems
+from banana.media.jobs import FileSystemScanJob
+from banana.media.nameformatter import NameFormatter
+from banana.media.planning import MatchPlanner, MatchPlanObserver, PlanOutcome, StreamedPlanOutput
+from banana.media.sources import TMDBApi
+from banana.movies.matchcache import MatchCache, MatchCacheEntry
+from banana.movies.matcher import SourceMatcher
+from banana.movies.model import Movie, MovieMatchCandidate
+from tests.fixtures import MockJobContext
+
+
+class _Output(io.StringIO):
+
+    def close(self):
+        self.closed_value = self.getvalue()
+        super().close()
+
+
+class MatchPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+
+        self.target_dir = tempfile.mkdtemp()
+        self.source = TMDBApi()
+        self.source.match = MagicMock(return_value=[MovieMatchCandidate(title="The Goat", release_year=2015,
+                                                                        external_id='1234', source='tmdb')])
+        self.formatter = NameFormatter(template='{{media_movies_target_path}}/{{movie.title}}.{{file.container}}',
+                                       movies_target_path=self.target_dir)
+        self.planner = MatchPlanner(matcher=SourceMatcher(source=self.source), formatter=self.formatter)
+
+    @staticmethod
+    def _media(filename='The Goat 2015.mp4', **kwargs):
+        return ParsedMediaItem(title="The Goat", year="2015", container='mp4', filename=filename,
+                               path="/movies", **kwargs)
+
+    def test_matched_plan(self):
+        plan = self.planner.plan(self._media())
+
+        self.assertEqual(PlanOutcome.MATCHED, plan.outcome)
+        self.assertEqual('The Goat', plan.movie.title)
+        self.assertEqual(f'{self.target_dir}/The Goat.mp4', plan.target)
+        self.assertEqual([], plan.conflicts)
+
+    def test_conflicts(self):
+        pathlib.Path(self.target_dir, 'The Goat.mp4').touch()
+
+        self.planner.plan(self._media())
+        plan = self.planner.plan(self._media(filename='The Goat 2015 (copy).mp4'))
+
+        self.assertEqual(2, len(plan.conflicts))
+        self.assertIn('/movies/The Goat 2015.mp4', plan.conflicts[1])
+
+    def test_unmatched_and_ignored_plans(self):
+        self.source.match = MagicMock(return_value=[MovieMatchCandidate(title="Will Never Match",
+                                                                        release_year=1959)])
+
+        plan = self.planner.plan(self._media())
+        self.assertEqual((PlanOutcome.UNMATCHED, 'LOW_TRESHOLD'), (plan.outcome, plan.reason))
+        self.assertEqual(['Will Never Match'], [c.title for c in plan.candidates])
+
+        self.assertEqual(PlanOutcome.IGNORED, self.planner.plan(self._media(season='1')).outcome)
+
+    def test_already_processed(self):
+        self.db.session.add(self._media())
+        self.db.session.commit()
+        planner = MatchPlanner(matcher=SourceMatcher(source=self.source), formatter=self.formatter,
+                               processed_items=ProcessedMediaItems())
+
+        self.assertEqual(PlanOutcome.ALREADY_PROCESSED, planner.plan(self._media()).outcome)
+        self.source.match.assert_not_called()
+
+    def test_planner_does_not_write_match_cache(self):
+        cache = MatchCache()
+        planner = MatchPlanner(matcher=SourceMatcher(source=self.source, cache=cache), formatter=self.formatter)
+
+        self.assertEqual(PlanOutcome.MATCHED, planner.plan(self._media()).outcome)
+        self.assertEqual(0, MatchCacheEntry.query.count())
+
+        # the matcher the planner was given still caches
+        SourceMatcher(source=self.source, cache=cache).top5_matches(self._media())
+        self.assertEqual(1, MatchCacheEntry.query.count())
+        self.assertEqual(PlanOutcome.MATCHED, planner.plan(self._media()).outcome)
+        # served from the cache
+        self.assertEqual(2, self.source.match.call_count)
+
+    def test_observer_writes_json_lines(self):
+        output = _Output()
+        observer = MatchPlanObserver(MockJobContext(), output, planner=self.planner)
+
+        observer.on_next((1, self._media()))
+        observer.on_next((2, self._media(filename='Other.mp4', season='1')))
+        observer.on_completed()
+
+        lines = [json.loads(line) for line in output.closed_value.splitlines()]
+        self.assertEqual(['MATCHED', 'IGNORED'], [line['outcome'] for line in lines])
+        self.assertEqual('1234', lines[0]['movie']['external_id'])
+
+    def test_plan_job_has_no_side_effects(self):
+        scan_dir = tempfile.mkdtemp()
+        pathlib.Path(scan_dir, 'The Goat 2015.mp4').touch()
+        output = StreamedPlanOutput()
+
+        job = FileSystemScanJob(media_scan_paths=[scan_dir], plan_output=output, planner=self.planner)
+        thread = threading.Thread(target=lambda: job.run(scheduler=None))
+        thread.start()
+        lines = [json.loads(line) for line in output]
+        thread.join()
+
+        self.assertEqual([('The Goat 2015.mp4', 'MATCHED')], [(line['filename'], line['outcome']) for line in lines])
+        self.assertEqual(0, ParsedMediaItem.query.count())
+        self.assertEqual(0, Movie.query.count())
+        self.assertEqual([], list(pathlib.Path(self.target_dir).iterdir()))
+
+    def test_abandoned_plan_stops_the_job(self):
+        scan_dir = tempfile.mkdtemp()
+        for i in range(50):
+            pathlib.Path(scan_dir, f'The Goat {i} 2015.mp4').touch()
+        output = StreamedPlanOutput(maxsize=1)
+
+        job = FileSystemScanJob(media_scan_paths=[scan_dir], plan_output=output, planner=self.planner)
+        thread = threading.Thread(target=lambda: job.run(scheduler=None))
+        thread.start()
+        lines = iter(output)
+        next(lines)
+        lines.close()
+        thread.join(timeout=10)
+
+        self.assertTrue(output.cancelled())
+        self.assertFalse(thread.is_alive())
+        self.assertLess(self.source.match.call_count, 50)
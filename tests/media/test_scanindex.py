@@ -0,0 +1,142 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import rx
+
+from banana.core import app, db
+from banana.media.observables.mediascanner import FileSystemMediaScanner
+from banana.media.scanindex import ScanIndex, ScanIndexEntry, ScanOutcome
+from tests.fixtures import MockJobContext
+
+
+class ScanIndexTest(unittest.TestCase):
+
+    _files = ['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv']
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.job_context = MockJobContext()
+        self.temp_dir = tempfile.mkdtemp()
+        pathlib.Path(self.temp_dir, self._files[0]).touch()
+        pathlib.Path(self.temp_dir, self._files[1]).touch()
+
+    def _scan(self, scan_index: ScanIndex):
+        scanner = FileSystemMediaScanner(media_scan_path=self.temp_dir, job_context=self.job_context,
+                                         skip_filetype_checks=True, scan_index=scan_index)
+        processed_items = []
+        rx.Observable.create(scanner).subscribe(on_next=lambda item: processed_items.append(item))
+        return processed_items
+
+    def _record_all(self, items, outcome=ScanOutcome.MATCHED):
+        scan_index = ScanIndex()
+        for item in items:
+            scan_index.record(item.path, item.filename, item.file_stat, outcome)
+        self.db.session.commit()
+
+    def test_record_and_lookup(self):
+        st = os.stat(os.path.join(self.temp_dir, self._files[0]))
+        scan_index = ScanIndex()
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.UNMATCHED, job_id='1234')
+        self.db.session.commit()
+
+        entry = ScanIndexEntry.query.filter_by(filename=self._files[0]).one()
+        self.assertEqual(ScanOutcome.UNMATCHED, entry.outcome)
+        self.assertEqual(st.st_size, entry.size)
+        self.assertTrue(ScanIndex().is_unchanged(self.temp_dir, self._files[0], st))
+        self.assertFalse(ScanIndex().is_unchanged(self.temp_dir, self._files[1], st))
+
+    def test_rescan_skips_unchanged_files(self):
+        self._record_all(self._scan(ScanIndex()))
+
+        self.assertEqual([], self._scan(ScanIndex()))
+
+    def test_rescan_picks_up_changed_files(self):
+        self._record_all(self._scan(ScanIndex()))
+
+        with open(os.path.join(self.temp_dir, self._files[1]), 'wb') as f:
+            f.write(b'changed')
+
+        rescanned = self._scan(ScanIndex())
+        self.assertEqual([self._files[1]], [item.filename for item in rescanned])
+
+    def test_record_updates_existing_entry(self):
+        items = self._scan(ScanIndex())
+        self._record_all(items, outcome=ScanOutcome.UNMATCHED)
+        self._record_all(items, outcome=ScanOutcome.MATCHED)
+
+        self.assertEqual(2, ScanIndexEntry.query.count())
+        self.assertEqual(2, ScanIndexEntry.query.filter_by(outcome=ScanOutcome.MATCHED).count())
+
+    def test_move_and_forget(self):
+        st = os.stat(os.path.join(self.temp_dir, self._files[0]))
+        scan_index = ScanIndex()
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.MATCHED)
+        self.db.session.commit()
+        scan_index.committed()
+
+        scan_index.move(self.temp_dir, self._files[0], os.path.join(self.temp_dir, 'sub'), 'moved.mkv')
+        self.db.session.rollback()
+        scan_index.rolled_back()
+        self.assertTrue(scan_index.is_unchanged(self.temp_dir, self._files[0], st))
+
+        scan_index.move(self.temp_dir, self._files[0], os.path.join(self.temp_dir, 'sub'), 'moved.mkv')
+        self.db.session.commit()
+        scan_index.committed()
+        self.assertTrue(ScanIndex().is_unchanged(os.path.join(self.temp_dir, 'sub'), 'moved.mkv', st))
+        self.assertTrue(scan_index.is_unchanged(os.path.join(self.temp_dir, 'sub'), 'moved.mkv', st))
+
+        scan_index.forget(self.temp_dir)
+        self.db.session.commit()
+        self.assertEqual(0, ScanIndexEntry.query.count())
+
+    def test_hard_links_of_matched_files_are_skipped(self):
+        self._record_all(self._scan(ScanIndex()), outcome=ScanOutcome.UNMATCHED)
+        target_dir = os.path.join(self.temp_dir, 'target')
+        os.makedirs(target_dir)
+        os.link(os.path.join(self.temp_dir, self._files[0]), os.path.join(target_dir, 'A Foo Bar (1999).mkv'))
+        os.link(os.path.join(self.temp_dir, self._files[1]), os.path.join(target_dir, 'B Quux.mkv'))
+
+        st = os.stat(os.path.join(self.temp_dir, self._files[0]))
+        scan_index = ScanIndex()
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.MATCHED)
+        self.db.session.commit()
+
+        # only a link of the matched file is skipped, a link of the unmatched one is scanned
+        self.assertEqual(['B Quux.mkv'], [item.filename for item in self._scan(ScanIndex())])
+        self.assertEqual(ScanOutcome.LINKED,
+                         ScanIndexEntry.query.filter_by(filename='A Foo Bar (1999).mkv').one().outcome)
+        self.assertEqual((self.temp_dir, self._files[0]),
+                         ScanIndex().linked_to(target_dir, 'A Foo Bar (1999).mkv', st))
+        self.assertIsNone(ScanIndex().linked_to(self.temp_dir, self._files[0], st))
+
+    def test_single_link_is_never_linked(self):
+        st = os.stat(os.path.join(self.temp_dir, self._files[0]))
+        scan_index = ScanIndex()
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.MATCHED)
+
+        self.assertEqual(1, st.st_nlink)
+        self.assertIsNone(scan_index.linked_to(self.temp_dir, 'other.mkv', st))
+
+    def test_rolled_back_outcome_is_not_indexed(self):
+        st = os.stat(os.path.join(self.temp_dir, self._files[0]))
+        scan_index = ScanIndex()
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.MATCHED)
+        self.assertFalse(scan_index.is_unchanged(self.temp_dir, self._files[0], st))
+
+        self.db.session.rollback()
+        scan_index.rolled_back()
+        self.assertFalse(scan_index.is_unchanged(self.temp_dir, self._files[0], st))
+
+        # recorded again, the file is inserted rather than updated
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.UNMATCHED)
+        scan_index.record(self.temp_dir, self._files[0], st, ScanOutcome.MATCHED)
+        self.db.session.commit()
+        scan_index.committed()
+        self.assertTrue(scan_index.is_unchanged(self.temp_dir, self._files[0], st))
+        self.assertEqual(ScanOutcome.MATCHED, ScanIndexEntry.query.one().outcome)
@@ -48,6 +48,54 @@ class ScannerTest(unittest.TestCase):
         self.assertTrue(one(_.filename == 'A Foo Bar 1999 1080p BluRay.mkv', processed_items))
         self.assertTrue(one(_.filename == 'B Quux 720p.mkv', processed_items))
 
+    def test_multiple_roots(self):
+        other_dir = tempfile.mkdtemp()
+        pathlib.Path(other_dir, 'C Baz 2010.avi').touch()
+
+        scanner = FileSystemMediaScanner(media_scan_path=[self.temp_dir, other_dir],
+                                         job_context=self.job_context, skip_filetype_checks=True)
+        processed_items = []
+        rx.Observable.create(scanner).subscribe(on_next=lambda item: processed_items.append(item))
+
+        self.assertEqual(3, len(processed_items))
+        self.assertEqual([other_dir], [i.path for i in processed_items if i.filename == 'C Baz 2010.avi'])
+        self.assertEqual(3, scanner.media_items_to_scan())
+
+        roots = scanner.roots_progress()
+        self.assertEqual([self.temp_dir, other_dir], [r.path for r in roots])
+        self.assertEqual([2, 1], [r.current_item for r in roots])
+        self.assertEqual([2, 1], [r.total_items for r in roots])
+        self.assertTrue(all(r.completed for r in roots))
+
+    def test_parse_failure_skips_only_its_item(self):
+        scanner = FileSystemMediaScanner(media_scan_path=self.temp_dir, job_context=self.job_context,
+                                         skip_filetype_checks=True)
+        parse = scanner.media_parser.parse
+
+        def failing_parse(name):
+            if name.startswith('A '):
+                raise ValueError(name)
+            return parse(name)
+
+        scanner.media_parser.parse = failing_parse
+        processed_items = []
+        errors = []
+        rx.Observable.create(scanner).subscribe(on_next=lambda item: processed_items.append(item),
+                                                on_error=lambda e: errors.append(e))
+
+        self.assertEqual(['B Quux 720p.mkv'], [i.filename for i in processed_items])
+        self.assertEqual([], errors)
+
+    def test_parser_processes(self):
+        scanner = FileSystemMediaScanner(media_scan_path=self.temp_dir, job_context=self.job_context,
+                                         skip_filetype_checks=True, parser_processes=2)
+        processed_items = []
+        rx.Observable.create(scanner).subscribe(on_next=lambda item: processed_items.append(item))
+
+        self.assertEqual(2, len(processed_items))
+        foo = next(i for i in processed_items if i.filename == 'A Foo Bar 1999 1080p BluRay.mkv')
+        self.assertEqual(('A Foo Bar', 1999, 'BluRay'), (foo.title, foo.year, foo.quality))
+
     def test_filetype_scheck(self):
         # Given
         # We have MediaScanner WITH enabled file type check
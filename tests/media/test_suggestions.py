@@ -0,0 +1,47 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from banana.media.sources.imdbsuggestions.suggestions import SuggestionsClient
+
+
+def _response(query, titles):
+    response = MagicMock()
+    response.text = f'imdb${query}(' + json.dumps(
+        {'v': 1, 'q': query, 'd': [{'l': t, 'id': f'tt{i:07d}', 'q': 'feature'} for i, t in enumerate(titles)]}) + ')'
+    return response
+
+
+class SuggestionsClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.http = MagicMock()
+        self.client = SuggestionsClient(self.http)
+
+    def test_queries_are_cached(self):
+        self.http.get.return_value = _response('matrix', ['The Matrix', 'The Matrix Reloaded'])
+
+        self.client.suggestions('Matrix')
+        suggestions = self.client.suggestions(' matrix ')
+
+        self.http.get.assert_called_once()
+        self.assertEqual(2, len(suggestions['d']))
+
+    def test_longer_query_is_answered_from_complete_prefix(self):
+        self.http.get.return_value = _response('the ma', ['The Matrix', 'The Mask', 'The Master'])
+
+        self.client.suggestions('the ma')
+        suggestions = self.client.suggestions('the mat')
+
+        self.http.get.assert_called_once()
+        self.assertEqual(['The Matrix'], [s['l'] for s in suggestions['d']])
+
+    def test_truncated_prefix_is_not_used(self):
+        self.http.get.side_effect = [_response('the', [f'The Movie {i}' for i in range(8)]),
+                                     _response('the m', ['The Matrix'])]
+
+        self.client.suggestions('the')
+        suggestions = self.client.suggestions('the m')
+
+        self.assertEqual(2, self.http.get.call_count)
+        self.assertEqual(['The Matrix'], [s['l'] for s in suggestions['d']])
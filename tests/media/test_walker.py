@@ -0,0 +1,133 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from banana.core.concurrency import DeviceExecutors
+from banana.media.walker import DirectoryWalker, walk_all
+
+
+class DirectoryWalkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        pathlib.Path(self.temp_dir, 'A Foo Bar 1999 1080p BluRay.mkv').touch()
+        os.makedirs(os.path.join(self.temp_dir, 'sub', 'subsub'))
+        pathlib.Path(self.temp_dir, 'sub', 'B Quux 720p.mkv').touch()
+        pathlib.Path(self.temp_dir, 'sub', 'subsub', 'C Baz 2010.avi').touch()
+
+    def test_walk_all_files(self):
+        walker = DirectoryWalker(self.temp_dir)
+        files = sorted(entry.name for _, entry in walker)
+
+        self.assertEqual(['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv', 'C Baz 2010.avi'], files)
+        self.assertTrue(walker.completed())
+        self.assertEqual(3, walker.estimated_total())
+
+    def test_yields_containing_directory(self):
+        walker = DirectoryWalker(self.temp_dir)
+        paths = {entry.name: path for path, entry in walker}
+
+        self.assertEqual(os.path.join(self.temp_dir, 'sub', 'subsub'), paths['C Baz 2010.avi'])
+
+    def test_running_total_is_estimated(self):
+        walker = DirectoryWalker(self.temp_dir)
+        iterator = iter(walker)
+        next(iterator)
+
+        # root directory listed, two more are pending
+        self.assertFalse(walker.completed())
+        self.assertEqual(1, walker.discovered())
+        self.assertEqual(2, walker.estimated_total())
+
+    @unittest.skipIf(not hasattr(os, 'symlink') or os.name == 'nt', 'symlinks not supported')
+    def test_symlink_loop(self):
+        os.symlink(self.temp_dir, os.path.join(self.temp_dir, 'sub', 'subsub', 'loop'))
+        os.symlink(os.path.join(self.temp_dir, 'sub'), os.path.join(self.temp_dir, 'sub-again'))
+
+        files = sorted(entry.name for _, entry in DirectoryWalker(self.temp_dir, follow_symlinks=True))
+
+        self.assertEqual(['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv', 'C Baz 2010.avi'], files)
+
+    @unittest.skipIf(not hasattr(os, 'symlink') or os.name == 'nt', 'symlinks not supported')
+    def test_symlinks_not_followed_by_default(self):
+        other_dir = tempfile.mkdtemp()
+        pathlib.Path(other_dir, 'D Elsewhere 2001.mkv').touch()
+        os.symlink(other_dir, os.path.join(self.temp_dir, 'elsewhere'))
+
+        files = sorted(entry.name for _, entry in DirectoryWalker(self.temp_dir))
+        followed = sorted(entry.name for _, entry in DirectoryWalker(self.temp_dir, follow_symlinks=True))
+
+        self.assertEqual(['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv', 'C Baz 2010.avi'], files)
+        self.assertIn('D Elsewhere 2001.mkv', followed)
+
+    def test_missing_root(self):
+        walker = DirectoryWalker(os.path.join(self.temp_dir, 'does-not-exist'))
+
+        self.assertEqual([], list(walker))
+        self.assertEqual(0, walker.estimated_total())
+
+    def test_concurrent_walk_keeps_order(self):
+        for i in range(20):
+            os.makedirs(os.path.join(self.temp_dir, f'movie {i}'))
+            pathlib.Path(self.temp_dir, f'movie {i}', f'Movie {i}.mkv').touch()
+
+        sequential = [(path, entry.name) for path, entry in DirectoryWalker(self.temp_dir)]
+        concurrent = [(path, entry.name) for path, entry in DirectoryWalker(self.temp_dir, workers=4)]
+
+        self.assertEqual(23, len(sequential))
+        self.assertEqual(sequential, concurrent)
+
+    def test_mount_concurrency(self):
+        walker = DirectoryWalker(self.temp_dir, workers=1, mount_concurrency={self.temp_dir: 3})
+        files = sorted(entry.name for _, entry in walker)
+
+        self.assertEqual(['A Foo Bar 1999 1080p BluRay.mkv', 'B Quux 720p.mkv', 'C Baz 2010.avi'], files)
+
+    def test_device_executors(self):
+        device = os.stat(self.temp_dir).st_dev
+        executors = DeviceExecutors(workers=1, mount_concurrency={self.temp_dir: 3})
+
+        self.assertEqual(3, executors.concurrency(device))
+        self.assertEqual(1, executors.concurrency(None))
+        self.assertIsNone(executors.executor(None))
+        self.assertIs(executors.executor(device), executors.executor(device))
+        executors.shutdown()
+
+    def test_shared_executors(self):
+        executors = DeviceExecutors(workers=2)
+        walker = DirectoryWalker(self.temp_dir, executors=executors)
+
+        for path, _ in walker:
+            self.assertEqual(os.stat(path).st_dev, walker.device_of(path))
+        self.assertEqual(3, walker.discovered())
+        # shared executors are owned by the caller
+        self.assertIsNotNone(executors.executor(os.stat(self.temp_dir).st_dev))
+        executors.shutdown()
+
+    def test_walk_all_roots_concurrently(self):
+        other_dir = tempfile.mkdtemp()
+        for i in range(5):
+            pathlib.Path(other_dir, f'D Other {i}.mkv').touch()
+        executors = DeviceExecutors(workers=2)
+        walkers = [DirectoryWalker(self.temp_dir, executors=executors), DirectoryWalker(other_dir, executors=executors)]
+
+        files = list(walk_all(walkers, executors))
+        executors.shutdown()
+
+        self.assertEqual(8, len(files))
+        # every root keeps the order of its walker
+        self.assertEqual([(p, e.name) for p, e in DirectoryWalker(self.temp_dir)],
+                         [(p, e.name) for index, p, e, _ in files if index == 0])
+        self.assertEqual({os.stat(other_dir).st_dev}, {device for index, _, _, device in files if index == 1})
+        self.assertTrue(all(walker.completed() for walker in walkers))
+
+    def test_walk_all_single_worker_device_in_order(self):
+        other_dir = tempfile.mkdtemp()
+        pathlib.Path(other_dir, 'D Other.mkv').touch()
+        executors = DeviceExecutors(workers=1)
+        walkers = [DirectoryWalker(self.temp_dir, executors=executors), DirectoryWalker(other_dir, executors=executors)]
+
+        indexes = [index for index, _, _, _ in walk_all(walkers, executors)]
+
+        self.assertEqual([0, 0, 0, 1], indexes)
@@ -0,0 +1,200 @@
+import os
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import rx
+
+from banana.core import app, db
+from banana.media.item import ParsedMediaItem
+from banana.media.nameformatter import NameFormatter
+from banana.media.observables.mediawatcher import FileSystemMediaWatcher
+from banana.media.observers import MediaItemChangesObserver
+from banana.media.targets import NoOpMediaTargetBuilder
+from banana.media.watcher import Inotify, InotifyEvent, InotifyUnavailable, WatchEvent, WatchEventType, \
+    IN_MOVED_FROM, IN_MOVED_TO
+from banana.movies.model import Movie
+from tests.fixtures import MockJobContext
+
+
+def _inotify_available():
+    try:
+        Inotify().close()
+        return True
+    except InotifyUnavailable:
+        return False
+
+
+@unittest.skipIf(not _inotify_available(), 'inotify not available')
+class FileSystemMediaWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.events = []
+        self.watcher = FileSystemMediaWatcher(job_context=MockJobContext(), media_watch_path=self.temp_dir,
+                                              debounce=0.2, skip_filetype_checks=True, poll_interval=0.05)
+        self.thread = threading.Thread(
+            target=lambda: rx.Observable.create(self.watcher).subscribe(on_next=self.events.append))
+        self.thread.start()
+        time.sleep(0.2)
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.thread.join()
+
+    def _events(self, event_type: WatchEventType):
+        return [e for e in self.events if e.event_type is event_type]
+
+    def test_rescan_on_start(self):
+        self.assertEqual(1, len(self._events(WatchEventType.RESCAN)))
+
+    def test_created_file_is_debounced(self):
+        with open(os.path.join(self.temp_dir, 'A Foo Bar 1999 1080p BluRay.mkv'), 'wb') as f:
+            f.write(b'part')
+            time.sleep(0.1)
+            f.write(b'more')
+        time.sleep(0.1)
+
+        self.assertEqual([], self._events(WatchEventType.CREATED))
+
+        time.sleep(0.4)
+        created = self._events(WatchEventType.CREATED)
+        self.assertEqual(1, len(created))
+        self.assertEqual('A Foo Bar', created[0].media.title)
+        self.assertEqual(self.temp_dir, created[0].media.path)
+
+    def test_deleted_and_moved_files(self):
+        os.makedirs(os.path.join(self.temp_dir, 'sub'))
+        pathlib.Path(self.temp_dir, 'B Quux 720p.mkv').touch()
+        time.sleep(0.5)
+        os.rename(os.path.join(self.temp_dir, 'B Quux 720p.mkv'), os.path.join(self.temp_dir, 'sub', 'Quux.mkv'))
+        time.sleep(0.2)
+        os.unlink(os.path.join(self.temp_dir, 'sub', 'Quux.mkv'))
+        time.sleep(0.2)
+
+        moved = self._events(WatchEventType.MOVED)
+        self.assertEqual(1, len(moved))
+        self.assertEqual((self.temp_dir, 'B Quux 720p.mkv'), (moved[0].path, moved[0].filename))
+        self.assertEqual((os.path.join(self.temp_dir, 'sub'), 'Quux.mkv'), (moved[0].dest_path, moved[0].dest_filename))
+
+        deleted = self._events(WatchEventType.DELETED)
+        self.assertEqual(1, len(deleted))
+        self.assertEqual('Quux.mkv', deleted[0].filename)
+
+
+class _ReadsInotify(object):
+    """
+    Returns given batches of events, one per read, then nothing.
+    """
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+
+    def read_events(self, timeout):
+        if self.batches:
+            return self.batches.pop(0)
+        time.sleep(timeout)
+        return []
+
+
+class FileSystemMediaWatcherMovesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.watcher = FileSystemMediaWatcher(job_context=MockJobContext(), media_watch_path='/movies',
+                                              skip_filetype_checks=True, poll_interval=0.01, move_timeout=0.1)
+
+    def _watch(self, inotify, seconds):
+        threading.Timer(seconds, self.watcher.stop).start()
+        self.watcher._watch(inotify, MagicMock(on_next=self.events.append))
+        return [(e.event_type, e.filename, e.dest_filename) for e in self.events]
+
+    def test_move_split_across_reads(self):
+        inotify = _ReadsInotify([InotifyEvent('/movies', IN_MOVED_FROM, 7, 'A.mkv')],
+                                [InotifyEvent('/movies', IN_MOVED_TO, 7, 'B.mkv')])
+
+        self.assertEqual([(WatchEventType.MOVED, 'A.mkv', 'B.mkv')], self._watch(inotify, 0.3))
+
+    def test_unpaired_move_is_deleted(self):
+        inotify = _ReadsInotify([InotifyEvent('/movies', IN_MOVED_FROM, 7, 'A.mkv')])
+
+        self.assertEqual([(WatchEventType.DELETED, 'A.mkv', None)], self._watch(inotify, 0.3))
+
+
+class MediaItemChangesObserverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+
+        movie = Movie(title='The Goat', release_year=2015)
+        movie.media_items = [ParsedMediaItem(filename='The Goat 2015.mp4', path='/movies/goat',
+                                             target_filename='The Goat (2015).mp4', target_path='/target')]
+        self.db.session.add(movie)
+        self.db.session.commit()
+
+        self.observer = MediaItemChangesObserver(job_context=MockJobContext(),
+                                                 target_builder=NoOpMediaTargetBuilder(),
+                                                 formatter=NameFormatter())
+
+    def test_deleted_media_item(self):
+        self.observer.on_next(WatchEvent(WatchEventType.DELETED, path='/movies/goat', filename='The Goat 2015.mp4'))
+
+        self.assertEqual(0, ParsedMediaItem.query.count())
+        self.assertEqual(0, Movie.query.count())
+
+    def test_deleted_media_items_of_one_movie(self):
+        movie = Movie.query.one()
+        movie.media_items.append(ParsedMediaItem(filename='The Goat 2015 Extras.mp4', path='/movies/goat'))
+        self.db.session.commit()
+
+        self.observer.on_next(WatchEvent(WatchEventType.DELETED, path='/movies/goat'))
+
+        self.assertEqual(0, ParsedMediaItem.query.count())
+        self.assertEqual(0, Movie.query.count())
+
+    def test_failed_delete_changes_nothing(self):
+        target = MagicMock()
+        self.observer.target_builder = MagicMock(build=MagicMock(return_value=target))
+        self.observer._scan_index = MagicMock()
+        self.observer._processed_items = MagicMock()
+
+        with patch.object(self.db.session, 'commit', side_effect=IOError):
+            self.observer.on_next(WatchEvent(WatchEventType.DELETED, path='/movies/goat',
+                                             filename='The Goat 2015.mp4'))
+
+        target.do_unlink.assert_not_called()
+        self.observer._processed_items.discard.assert_not_called()
+        self.observer._scan_index.committed.assert_not_called()
+        self.observer._scan_index.rolled_back.assert_called_once()
+        self.assertEqual(1, ParsedMediaItem.query.count())
+
+        self.observer.on_next(WatchEvent(WatchEventType.DELETED, path='/movies/goat', filename='The Goat 2015.mp4'))
+
+        target.do_unlink.assert_called_once_with(os.path.join('/target', 'The Goat (2015).mp4'))
+        self.observer._processed_items.discard.assert_called_once_with('/movies/goat', 'The Goat 2015.mp4')
+        self.observer._scan_index.committed.assert_called_once()
+
+    def test_deleted_directory(self):
+        self.observer.on_next(WatchEvent(WatchEventType.DELETED, path='/movies'))
+
+        self.assertEqual(0, ParsedMediaItem.query.count())
+
+    def test_moved_media_item(self):
+        self.observer.on_next(WatchEvent(WatchEventType.MOVED, path='/movies/goat', filename='The Goat 2015.mp4',
+                                         dest_path='/movies/other', dest_filename='Goat.mp4'))
+
+        media = ParsedMediaItem.query.one()
+        self.assertEqual(('/movies/other', 'Goat.mp4'), (media.path, media.filename))
+        self.assertEqual(1, Movie.query.count())
+
+    def test_moved_directory(self):
+        self.observer.on_next(WatchEvent(WatchEventType.MOVED, path='/movies', dest_path='/films'))
+
+        self.assertEqual(os.path.join('/films', 'goat'), ParsedMediaItem.query.one().path)
@@ -0,0 +1,58 @@
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from banana.core import app, db
+from banana.media.sources import TMDBApi, IMDBApi
+from banana.movies.idmapping import ImdbTmdbIdMap, ImdbTmdbMapping
+from banana.movies.matcher import FallbackLowThresholdSourceMatcher
+from banana.movies.model import MovieMatchCandidate
+
+
+class ImdbTmdbIdMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.id_map = ImdbTmdbIdMap(negative_ttl=60)
+        self.candidate = MovieMatchCandidate(title="These Daughters of Mine", original_title="Moje Córki Krowy",
+                                             release_year=2015, external_id='4834762', genres=[], source="imdb")
+
+    def test_put_and_get(self):
+        self.id_map.put_all({'4834762': '358364', 1234: None})
+
+        self.assertEqual({'4834762': '358364', '1234': None}, self.id_map.get_all(['4834762', 1234, '42']))
+
+        self.id_map.put_all({'1234': '99'})
+        self.assertEqual({'1234': '99'}, self.id_map.get_all(['1234']))
+
+    def test_negative_mapping_expires(self):
+        self.id_map.put_all({'4834762': '358364', '1234': None})
+        ImdbTmdbMapping.query.update({'updated_datetime': datetime.utcnow() - timedelta(seconds=61)})
+        self.db.session.commit()
+
+        self.assertEqual({'4834762': '358364'}, self.id_map.get_all(['4834762', '1234']))
+
+    def test_dedup_consults_id_map(self):
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(return_value=[replace(self.candidate, title="DO NOT MATCH",
+                                                            original_title="DO NOT MATCH", external_id='358364',
+                                                            source='tmdb')])
+        tmdb_source.get_by_imdbid_id = MagicMock(return_value=replace(self.candidate, external_id='358364'))
+        imdb_source = IMDBApi()
+        imdb_source.match = MagicMock(side_effect=lambda title: [replace(self.candidate),
+                                                                 replace(self.candidate, external_id='1234')])
+        matcher = FallbackLowThresholdSourceMatcher(primary=tmdb_source, secondary=imdb_source, id_map=self.id_map)
+        media = MagicMock(title='These Daughters of Mine', year=2015)
+
+        first = matcher.top5_matches(media)
+        second = matcher.top5_matches(media)
+
+        self.assertEqual(2, tmdb_source.get_by_imdbid_id.call_count)
+        self.assertEqual(['4834762', '1234'], [m.external_id for m in first])
+        self.assertEqual(['4834762', '1234'], [m.external_id for m in second])
+        self.assertEqual({'4834762': '358364', '1234': '358364'}, self.id_map.get_all(['4834762', '1234']))
@@ -0,0 +1,165 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from banana.core import app, db
+from banana.core.httpcache import read_only
+from banana.media.item import ParsedMediaItem
+from banana.media.sources import TMDBApi
+from banana.movies.matchcache import MatchCache, MatchCacheEntry, normalized_query
+from banana.movies.matcher import SourceMatcher
+from banana.movies.model import MovieMatchCandidate, Genre, Movie
+
+
+class MatchCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.cache = MatchCache(ttl=60, negative_ttl=10)
+        self.candidate = MovieMatchCandidate(title='Amélie', original_title="Le Fabuleux Destin d'Amélie Poulain",
+                                             release_year=2001, external_id='194', source='tmdb',
+                                             genres=[Genre(name='Comedy', genre_id=35)])
+        self.candidate.akas = ['Amelie from Montmartre']
+
+    def test_normalized_query(self):
+        self.assertEqual('amelie the movie', normalized_query('  Amélie: The  Movie '))
+
+    def test_put_and_get(self):
+        self.cache.put(TMDBApi, 'Amélie', [self.candidate])
+
+        cached = self.cache.get(TMDBApi(), 'amelie')
+
+        self.assertEqual(1, len(cached))
+        self.assertIsNot(self.candidate, cached[0])
+        self.assertEqual(('Amélie', 2001, '194'), (cached[0].title, cached[0].release_year, cached[0].external_id))
+        self.assertEqual(['Comedy'], [g.name for g in cached[0].genres])
+        self.assertEqual(['Amelie from Montmartre'], cached[0].akas)
+        self.assertEqual(1, self.cache.stats().hits)
+
+    def test_put_does_not_commit_pending_work(self):
+        self.db.session.add(Movie(title='The Goat', release_year=2015))
+
+        self.cache.put(TMDBApi, 'Amélie', [self.candidate])
+        self.db.session.rollback()
+
+        self.assertEqual(0, Movie.query.count())
+        self.assertEqual(1, len(self.cache.get(TMDBApi, 'Amélie')))
+
+    def test_negative_and_expired(self):
+        self.assertIsNone(self.cache.get(TMDBApi, 'Amélie'))
+
+        self.cache.put(TMDBApi, 'Amélie', [])
+        self.assertEqual([], self.cache.get(TMDBApi, 'Amélie'))
+
+        MatchCacheEntry.query.update({'expires_datetime': datetime.utcnow() - timedelta(seconds=1)})
+        self.db.session.commit()
+        self.assertIsNone(self.cache.get(TMDBApi, 'Amélie'))
+        self.assertEqual(1, self.cache.purge_expired())
+
+        stats = self.cache.stats()
+        self.assertEqual((0, 1, 1, 1), (stats.hits, stats.negative_hits, stats.misses, stats.expired))
+
+    def test_unresolved_genres_are_not_cached(self):
+        self.candidate.genres = [Genre(genre_id=35)]
+
+        self.cache.put(TMDBApi, 'Amélie', [self.candidate])
+
+        self.assertEqual(0, MatchCacheEntry.query.count())
+
+    def test_matcher_does_not_cache_unnamed_genres(self):
+        self.candidate.genres = [Genre(genre_id=35)]
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(return_value=[self.candidate])
+        matcher = SourceMatcher(tmdb_source, cache=self.cache)
+
+        matches = matcher.top5_matches(ParsedMediaItem(filename='Amelie.2001.mkv', path='/', title='Amelie', year=2001))
+
+        self.assertEqual(['194'], [m.external_id for m in matches])
+        self.assertEqual(0, MatchCacheEntry.query.count())
+
+    def test_matcher_reads_through(self):
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(return_value=[self.candidate])
+        matcher = SourceMatcher(tmdb_source, cache=self.cache)
+
+        first = matcher.top5_matches(ParsedMediaItem(filename='Amelie.2001.mkv', path='/', title='Amelie', year=2001))
+        second = matcher.top5_matches(ParsedMediaItem(filename='AMELIE.2001.720p.mkv', path='/', title='AMELIE',
+                                                      year=2001))
+
+        tmdb_source.match.assert_called_once()
+        self.assertEqual(100, first[0].match)
+        self.assertEqual(100, second[0].match)
+        self.assertEqual('194', second[0].external_id)
+
+    def test_matcher_caches_failures(self):
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(side_effect=IOError('TMDB is down'))
+        matcher = SourceMatcher(tmdb_source, cache=self.cache)
+        media = ParsedMediaItem(filename='Amelie.2001.mkv', path='/', title='Amelie', year=2001)
+
+        self.assertEqual([], matcher.top5_matches(media))
+        self.assertEqual([], matcher.top5_matches(media))
+
+        tmdb_source.match.assert_called_once()
+        self.assertEqual(1, self.cache.stats().negative_hits)
+
+    def test_concurrent_searches_are_coalesced(self):
+        release = threading.Event()
+
+        def search(title):
+            release.wait(5)
+            return [self.candidate]
+
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(side_effect=search)
+        matcher = SourceMatcher(tmdb_source)
+        results = {}
+
+        def match(name, title):
+            results[name] = matcher.top5_matches(ParsedMediaItem(filename=name, path='/', title=title, year=2001))
+
+        threads = [threading.Thread(target=match, args=(f'Amelie.2001.CD{i}.mkv', 'Amelie' if i % 2 else 'amélie'))
+                   for i in range(1, 5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+        release.set()
+        for t in threads:
+            t.join()
+
+        tmdb_source.match.assert_called_once()
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(r[0].external_id == '194' and r[0].match == 100 for r in results.values()))
+        self.assertEqual(4, len({id(r[0]) for r in results.values()}))
+
+    def test_read_only_search_is_not_shared_with_writing_one(self):
+        release = threading.Event()
+
+        def search(title):
+            release.wait(5)
+            return [self.candidate]
+
+        tmdb_source = TMDBApi()
+        tmdb_source.match = MagicMock(side_effect=search)
+        matcher = SourceMatcher(tmdb_source, cache=self.cache)
+        media = ParsedMediaItem(filename='Amelie.2001.mkv', path='/', title='Amelie', year=2001)
+
+        def plan():
+            with read_only():
+                matcher.read_only().top5_matches(media)
+
+        planning = threading.Thread(target=plan)
+        planning.start()
+        time.sleep(0.2)
+        threading.Timer(0.2, release.set).start()
+        matcher.top5_matches(media)
+        planning.join()
+
+        self.assertEqual(2, tmdb_source.match.call_count)
+        self.assertEqual(1, len(self.cache.get(TMDBApi, 'Amelie')))
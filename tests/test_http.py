@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+import requests
+
+from banana.core import app, db
+from banana.core.http import HttpClient, TokenBucket
+from banana.core.httpcache import ResponseCache, HttpCacheEntry
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # statuses to respond with, the last one is repeated
+    statuses = [200]
+    served = 0
+
+    def do_GET(self):
+        cls = type(self)
+        status = cls.statuses[min(cls.served, len(cls.statuses) - 1)]
+        cls.served += 1
+        if self.headers.get('If-None-Match') == '"v1"':
+            status = 304
+        body = b'{"id": 194}' if status != 304 else b''
+        self.send_response(status)
+        self.send_header('ETag', '"v1"')
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTest(unittest.TestCase):
+
+    def setUp(self):
+        _Handler.statuses = [200]
+        _Handler.served = 0
+        self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/3/movie/194'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        client = HttpClient('test', pool_size=1)
+
+        for _ in range(5):
+            self.assertEqual(194, client.get(self.url).json()['id'])
+
+        self.assertEqual(dict(requests=5, connections=1, reused=4), client.stats())
+
+    def test_retries_throttled_and_failed_requests(self):
+        _Handler.statuses = [429, 503, 200]
+        client = HttpClient('test', retries=3, backoff=0.01)
+
+        response = client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, _Handler.served)
+
+    def test_gives_up_after_retries(self):
+        _Handler.statuses = [500]
+        client = HttpClient('test', retries=2, backoff=0.01)
+
+        self.assertEqual(500, client.get(self.url).status_code)
+        self.assertEqual(3, _Handler.served)
+
+    def test_honors_retry_after(self):
+        client = HttpClient('test', retries=1, backoff=0.01)
+        response = requests.Response()
+        response.status_code = 429
+        response.headers['Retry-After'] = '7'
+
+        self.assertEqual(7, client._delay(0, response))
+
+
+    def test_responses_are_cached_and_revalidated(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        db.drop_all()
+        db.create_all()
+        cache = ResponseCache(ttls={r'/3/movie/': 60})
+        client = HttpClient('test', cache=cache)
+
+        self.assertEqual(194, client.get(self.url, params=dict(api_key='secret')).json()['id'])
+        self.assertEqual(194, client.get(self.url, params=dict(api_key='other')).json()['id'])
+        self.assertEqual(1, _Handler.served)
+
+        HttpCacheEntry.query.update({'expires_datetime': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        self.assertEqual(194, client.get(self.url).json()['id'])
+        self.assertEqual(2, _Handler.served)
+        self.assertEqual(1, cache.stats().revalidated)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_limits_rate_after_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        with patch('banana.core.http.time.sleep') as sleep:
+            waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual([0, 0], waits[:2])
+        self.assertAlmostEqual(0.1, waits[2], delta=0.02)
+        self.assertAlmostEqual(0.2, waits[3], delta=0.02)
+        self.assertEqual(2, sleep.call_count)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        start = time.monotonic()
+
+        for _ in range(100):
+            self.assertEqual(0, bucket.acquire())
+        self.assertLess(time.monotonic() - start, 0.1)
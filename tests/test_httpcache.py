@@ -0,0 +1,99 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from banana.core import app, db
+from banana.core.httpcache import ResponseCache, HttpCacheEntry, cache_key, carry_read_only, read_only
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.cache = ResponseCache(max_size=10000, ttls={r'/3/search/': 60, r'/3/movie/\d+': 3600})
+        self.body = b'{"results": [' + b', '.join(b'{"id": %d}' % i for i in range(200)) + b']}'
+
+    def test_cache_key(self):
+        self.assertEqual('GET https://api.themoviedb.org/3/search/movie?page=1&query=amelie',
+                         cache_key('get', 'https://api.themoviedb.org/3/search/movie',
+                                   dict(query='amelie', api_key='secret', page=1)))
+
+    def test_ttl(self):
+        self.assertEqual(60, self.cache.ttl('https://api.themoviedb.org/3/search/movie'))
+        self.assertEqual(3600, self.cache.ttl('https://api.themoviedb.org/3/movie/194/alternative_titles'))
+        self.assertIsNone(self.cache.ttl('https://api.themoviedb.org/3/configuration'))
+
+    def test_put_and_get(self):
+        self.cache.put('GET /3/search/movie?query=amelie', 200, {'ETag': '"abc"', 'Set-Cookie': 'x'}, self.body, 60)
+
+        cached = self.cache.get('GET /3/search/movie?query=amelie')
+
+        self.assertTrue(cached.fresh)
+        self.assertEqual(self.body, cached.body)
+        self.assertEqual({'ETag': '"abc"'}, cached.headers)
+        self.assertLess(self.cache.size(), len(self.body))
+        self.assertIsNone(self.cache.get('GET /3/search/movie?query=amelia'))
+
+    def test_put_does_not_commit_pending_work(self):
+        self.db.session.add(HttpCacheEntry(key='pending', status=200, expires_datetime=datetime.utcnow(),
+                                           accessed_datetime=datetime.utcnow()))
+
+        self.cache.put('GET /3/movie/194', 200, {}, self.body, 60)
+        self.db.session.rollback()
+
+        self.assertEqual(['GET /3/movie/194'], [e.key for e in HttpCacheEntry.query.all()])
+
+    def test_size_is_kept_up_to_date(self):
+        self.cache.put('GET /3/movie/194', 200, {}, self.body, 60)
+        self.cache.put('GET /3/movie/195', 200, {}, self.body, 60)
+        self.cache.put('GET /3/movie/194', 200, {}, b'{}', 60)
+
+        self.assertEqual(self.db.session.query(self.db.func.sum(HttpCacheEntry.size)).scalar(), self.cache.size())
+        # other caches sum it up themselves
+        self.assertEqual(self.cache.size(), ResponseCache(max_size=10000, ttls={}).size())
+
+    def test_stale_and_revalidated(self):
+        self.cache.put('GET /3/movie/194', 200, {'ETag': '"abc"'}, self.body, 60)
+        HttpCacheEntry.query.update({'expires_datetime': datetime.utcnow() - timedelta(seconds=1)})
+
+        stale = self.cache.get('GET /3/movie/194')
+        self.assertFalse(stale.fresh)
+        self.assertEqual({'If-None-Match': '"abc"'}, stale.validators())
+
+        self.cache.revalidated('GET /3/movie/194', 60)
+        self.assertTrue(self.cache.get('GET /3/movie/194').fresh)
+
+        stats = self.cache.stats()
+        self.assertEqual((1, 1, 1), (stats.hits, stats.stale, stats.revalidated))
+
+    def test_evicts_least_recently_used(self):
+        for i in range(20):
+            body = os.urandom(1024)
+            self.cache.put(f'GET /3/movie/{i}', 200, {}, body, 60)
+            HttpCacheEntry.query.filter_by(key=f'GET /3/movie/{i}')\
+                .update({'accessed_datetime': datetime.utcnow() - timedelta(minutes=20 - i)})
+            self.db.session.commit()
+
+        self.assertLessEqual(self.cache.size(), 10000)
+        self.assertEqual(self.db.session.query(self.db.func.sum(HttpCacheEntry.size)).scalar(), self.cache.size())
+        self.assertIsNone(self.cache.get('GET /3/movie/0'))
+        self.assertIsNotNone(self.cache.get('GET /3/movie/19'))
+        self.assertGreater(self.cache.stats().evictions, 0)
+
+    def test_read_only_writes_nothing(self):
+        with read_only():
+            self.cache.put('GET /3/movie/194', 200, {}, self.body, 60)
+            # calls handed over to other threads are read-only as well
+            thread = threading.Thread(target=carry_read_only(self.cache.put),
+                                      args=('GET /3/movie/195', 200, {}, self.body, 60))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(0, HttpCacheEntry.query.count())
+        self.cache.put('GET /3/movie/194', 200, {}, self.body, 60)
+        self.assertEqual(1, HttpCacheEntry.query.count())
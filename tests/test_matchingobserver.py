@@ -4,7 +4,7 @@ from banana.core import app, db
 from unittest.mock import MagicMock
 from banana.movies.model import *
 from banana.media.model import UnmatchedItem
-from banana.media.item import ParsedMediaItem
+from banana.media.item import ParsedMediaItem, ProcessedMediaItems
 
 from banana.media.observers import MediaItemMatchingObserver
 from banana.movies.matcher import SourceMatcher
@@ -63,3 +63,24 @@ class MediaItemMatchingObserverTest(unittest.TestCase):
         self.assertIsNotNone(unmatched_item)
         self.assertEqual('2015', unmatched_item.parsed_media_item.year)
         self.assertEqual(0, movies_count)
+
+    def test_skip_processed_item(self):
+        self.db.session.add(ParsedMediaItem(title="The Goat", year="2015", filename="The Goat 2015.mp4",
+                                            path="c:/movies"))
+        self.db.session.commit()
+
+        item = ParsedMediaItem(title="The Goat", year="2015", filename="The Goat 2015.mp4", path="c:/movies")
+        source = TMDBApi()
+        source.match = MagicMock(return_value=[MovieMatchCandidate(title="The Goat", release_year=2015)])
+
+        media_matching_observer = MediaItemMatchingObserver(job_context=MockJobContext(),
+                                                            matcher=SourceMatcher(source=source),
+                                                            resolver=SkipExistingMediaTargetResolver(
+                                                                media_target_builder=NoOpMediaTargetBuilder()
+                                                            ),
+                                                            processed_items=ProcessedMediaItems())
+        media_matching_observer.on_next(index_and_media=(1, item))
+
+        source.match.assert_not_called()
+        self.assertEqual(1, ParsedMediaItem.query.count())
+        self.assertEqual(0, Movie.query.count())
@@ -0,0 +1,43 @@
+import unittest
+
+from banana.core.metrics import Metrics, difference, summary
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_timer_records_errors(self):
+        with self.metrics.timer('TMDBApi.search'):
+            pass
+        with self.assertRaises(IOError):
+            with self.metrics.timer('TMDBApi.search'):
+                raise IOError('TMDB is down')
+
+        timer = self.metrics.snapshot()['timers']['TMDBApi.search']
+        self.assertEqual((2, 1), (timer['count'], timer['errors']))
+
+    def test_summary_of_difference(self):
+        self.metrics.observe('matcher.scoring', 0.002)
+        self.metrics.count('match_cache.hits')
+        before = self.metrics.snapshot()
+
+        for _ in range(98):
+            self.metrics.observe('matcher.scoring', 0.003)
+        self.metrics.observe('matcher.scoring', 0.2)
+        self.metrics.observe('matcher.scoring', 3.0)
+        self.metrics.count('match_cache.misses', 2)
+
+        result = summary(difference(self.metrics.snapshot(), before))
+
+        scoring = result['timers']['matcher.scoring']
+        self.assertEqual(100, scoring['count'])
+        self.assertEqual((0.005, 0.005, 0.25), (scoring['p50'], scoring['p95'], scoring['p99']))
+        self.assertEqual({'match_cache.misses': 2}, result['counters'])
+
+    def test_reset(self):
+        self.metrics.observe('matcher.scoring', 0.1)
+        self.metrics.reset()
+
+        self.assertEqual(dict(timers={}, counters={}), summary(self.metrics.snapshot()))
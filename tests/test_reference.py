@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from banana.core import app, db
+from banana.core.httpcache import read_only
+from banana.core.reference import ReferenceData, ReferenceDataSnapshot
+from banana.media.sources.tmdb import TMDBApi
+from banana.movies.model import Genre, MovieMatchCandidate
+
+
+class ReferenceDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = app
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        self.catalog = {'genres': {'35': 'Comedy', '18': 'Drama'}, 'image_base_url': 'https://images/'}
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_lookups_do_not_wait_for_refresh(self):
+        release = threading.Event()
+        fetch = MagicMock(side_effect=lambda: release.wait(5) and self.catalog)
+        reference = ReferenceData('test', fetch, defaults={'genres': {}})
+
+        self.assertEqual({}, reference.data()['genres'])
+
+        release.set()
+        self._wait_for(lambda: reference.data()['genres'])
+        self.assertEqual('Comedy', reference.data()['genres']['35'])
+        fetch.assert_called_once()
+
+    def test_warmup_from_snapshot(self):
+        ReferenceData('test', MagicMock(return_value=self.catalog)).refresh()
+        self.assertEqual(1, ReferenceDataSnapshot.query.count())
+
+        fetch = MagicMock()
+        reference = ReferenceData('test', fetch)
+        reference.warmup()
+
+        self.assertEqual('Drama', reference.data()['genres']['18'])
+        fetch.assert_not_called()
+
+    def test_stale_snapshot_is_refreshed_in_background(self):
+        ReferenceData('test', MagicMock(return_value={'genres': {}})).refresh()
+
+        fetch = MagicMock(return_value=self.catalog)
+        reference = ReferenceData('test', fetch, refresh_interval=0)
+        reference.warmup()
+
+        self._wait_for(lambda: reference.data()['genres'])
+        self.assertEqual('Comedy', reference.data()['genres']['35'])
+
+    def test_tmdb_genre_lookup(self):
+        reference = ReferenceData('tmdb', MagicMock())
+        reference._data = dict(self.catalog)
+        reference._warm = True
+        reference._updated = time.monotonic()
+
+        with patch('banana.media.sources.tmdb.tmdb_reference', reference):
+            genres = TMDBApi._tmdb_genres([18, 35])
+            poster = TMDBApi._tmdb_poster_url('/poster.jpg')
+
+        self.assertEqual([('Drama', 18), ('Comedy', 35)], [(g.name, g.genre_id) for g in genres])
+        self.assertEqual('https://images/w600_and_h900_bestv2//poster.jpg', poster)
+
+    def test_unknown_tmdb_genre_does_not_wait(self):
+        release = threading.Event()
+        fetch = MagicMock(side_effect=lambda: release.wait(5) and self.catalog)
+        reference = ReferenceData('tmdb', fetch, defaults={'genres': {'18': 'Drama'}})
+        reference._warm = True
+        reference._updated = time.monotonic()
+
+        with patch('banana.media.sources.tmdb.tmdb_reference', reference):
+            genres = TMDBApi._tmdb_genres([18, 35])
+            TMDBApi._tmdb_genres([35])
+        release.set()
+
+        self.assertEqual([('Drama', 18), (None, 35)], [(g.name, g.genre_id) for g in genres])
+        self._wait_for(lambda: '35' in reference.data()['genres'])
+        fetch.assert_called_once()
+
+    def test_missing_data_is_refreshed_once_per_retry_interval(self):
+        fetch = MagicMock(return_value=self.catalog)
+        reference = ReferenceData('test', fetch)
+        reference._warm = True
+        reference._updated = time.monotonic()
+
+        reference.missing()
+        self._wait_for(lambda: reference.data().get('genres'))
+        reference.missing()
+
+        fetch.assert_called_once()
+
+    def test_unnamed_genres_are_not_persisted(self):
+        candidate = MovieMatchCandidate(title='Amélie', genres=[Genre(name='Comedy', genre_id=35), Genre(genre_id=99)])
+
+        self.assertEqual(['Comedy'], [g.name for g in candidate.to_movie().genres])
+
+    def test_read_only_refresh_does_not_store_snapshot(self):
+        reference = ReferenceData('test', MagicMock(return_value=self.catalog))
+
+        with read_only():
+            reference.warmup()
+        self._wait_for(lambda: reference.data().get('genres'))
+
+        self.assertEqual('Comedy', reference.data()['genres']['35'])
+        self.assertEqual(0, ReferenceDataSnapshot.query.count())